@@ -0,0 +1,3 @@
+"""
+Offline benchmark suite: a stub upstream server plus a runner. Run with `python manage.py bench`.
+"""
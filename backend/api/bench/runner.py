@@ -0,0 +1,316 @@
+"""
+Benchmark runner: drives every route in api/urls.py and users/urls.py through the Django test client
+against the stub upstream, cold-cache and warm-cache, under concurrency; reports per-route latency
+percentiles and throughput as JSON.
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import stub_upstream
+
+PHASES = ("cold", "warm")
+PASSWORD = "bench-password-1"
+
+
+class Route:
+    """One benchmarked route: `path(i)`, `data(i)` and `headers(i)` give the i-th request's URL, body and headers."""
+
+    def __init__(self, name, method="get", path=None, data=None, auth=False, setup=None, headers=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.data = data
+        self.auth = auth
+        self.setup = setup
+        self.headers = headers
+
+
+def _verse_key(i):
+    chapter = i % 114 + 1
+    return f"{chapter}:{i // 114 % stub_upstream.VERSE_COUNTS[chapter - 1] + 1}"
+
+
+def _audio_path(i):
+    chapter, number = (int(p) for p in _verse_key(i).split(":"))
+    return f"Alafasy/mp3/{chapter:03d}{number:03d}.mp3"
+
+
+def routes(user):
+    from users.models import Bookmark
+
+    def bookmark(i):
+        key = _verse_key(i)
+        chapter, number = key.split(":")
+        return {"verse_key": key, "chapter_id": int(chapter), "verse_number": int(number), "text_preview": "bench"}
+
+    def ensure_bookmark(i):
+        Bookmark.objects.get_or_create(user=user, verse_key=_verse_key(i), defaults=bookmark(i))
+
+    refresh = {}
+
+    def refresh_token(i):
+        if "token" not in refresh:
+            from rest_framework_simplejwt.tokens import RefreshToken
+
+            refresh["token"] = str(RefreshToken.for_user(user))
+        return {"refresh": refresh["token"]}
+
+    return [
+        Route("oauth/login", path=lambda i: "/api/oauth/login/"),
+        Route("oauth/callback", path=lambda i: f"/api/oauth/callback/?code=c{i}&state=s{i}"),
+        Route("oauth/exchange", path=lambda i: f"/api/oauth/exchange/?code=c{i}"),
+        Route("oauth/me", path=lambda i: "/api/oauth/me/"),
+        Route("oauth/logout", method="post", path=lambda i: "/api/oauth/logout/"),
+        Route("chapters", path=lambda i: f"/api/chapters/?language={('en', 'ar', 'ur', 'fr')[i % 4]}"),
+        Route("chapters/<id>", path=lambda i: f"/api/chapters/{i % 114 + 1}/"),
+        Route("chapters/<id>/verses", path=lambda i: f"/api/chapters/{i % 114 + 1}/verses/?page={i // 114 % 3 + 1}"),
+        Route("chapters/<id>/verses?tajweed", path=lambda i: f"/api/chapters/{i % 114 + 1}/verses/?tajweed=true"),
+        Route("chapters/<id>/verses/stream", path=lambda i: f"/api/chapters/{i % 114 + 1}/verses/stream/"),
+        Route("juzs", path=lambda i: "/api/juzs/"),
+        Route("juzs/<n>/verses", path=lambda i: f"/api/juzs/{i % 30 + 1}/verses/?page={i // 30 % 5 + 1}"),
+        Route("juzs/<n>/verses/stream", path=lambda i: f"/api/juzs/{i % 30 + 1}/verses/stream/"),
+        Route("pages/<n>/verses", path=lambda i: f"/api/pages/{i % 604 + 1}/verses/"),
+        Route("search", path=lambda i: f"/api/search/?q=mercy{i}"),
+        Route("translations", path=lambda i: "/api/translations/"),
+        Route("recitations", path=lambda i: "/api/recitations/"),
+        Route("verses/by_key", path=lambda i: f"/api/verses/by_key/{_verse_key(i)}/"),
+        Route("verses/batch", path=lambda i: f"/api/verses/batch/?keys={i % 114 + 1}:1-{min(7, stub_upstream.VERSE_COUNTS[i % 114])}"),
+        Route("navigation/locate", path=lambda i: f"/api/navigation/locate/?verse_key={_verse_key(i)}"),
+        Route("tafsirs", path=lambda i: "/api/tafsirs/"),
+        Route("tafsirs/<id>", path=lambda i: f"/api/tafsirs/169/?verse_key={_verse_key(i)}"),
+        Route("metrics", path=lambda i: "/api/metrics/"),
+        Route("audio/<path>", path=lambda i: f"/api/audio/{_audio_path(i)}"),
+        Route("audio/<path>?range", path=lambda i: f"/api/audio/{_audio_path(i)}",
+              headers=lambda i: {"HTTP_RANGE": f"bytes={i % 16 * 1024}-{i % 16 * 1024 + 16383}"}),
+        Route("users/token", method="post", path=lambda i: "/api/users/token/",
+              data=lambda i: {"username": user.username, "password": PASSWORD}),
+        Route("users/token/refresh", method="post", path=lambda i: "/api/users/token/refresh/", data=refresh_token),
+        Route("users/bookmarks", path=lambda i: "/api/users/bookmarks/", auth=True),
+        Route("users/bookmarks/create", method="post", path=lambda i: "/api/users/bookmarks/create/", data=bookmark, auth=True),
+        Route("users/bookmarks/bulk", method="post", path=lambda i: "/api/users/bookmarks/bulk/", auth=True,
+              data=lambda i: {"upsert": [bookmark(i * 20 + j) for j in range(20)], "delete": [_verse_key(i * 20 + 20)]}),
+        Route("users/bookmarks/<key>", method="delete", path=lambda i: f"/api/users/bookmarks/{_verse_key(i)}/",
+              auth=True, setup=ensure_bookmark),
+    ]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _summary(latencies, statuses, errors, elapsed):
+    counts = {}
+    for status in statuses:
+        counts[str(status)] = counts.get(str(status), 0) + 1
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "statuses": counts,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def _clear_caches():
+    from django.core.cache import cache
+
+    from api.services import audio_cache, response_cache, tafsir_store
+
+    cache.clear()
+    response_cache.l1.clear()
+    tafsir_store.clear()
+    audio_cache.clear()
+
+
+def _drain_audio_prefetch():
+    """Wait for queued audio prefetches, so none is still downloading when the bench's audio directory goes."""
+    from api.services import audio_cache
+
+    barrier = threading.Barrier(audio_cache.PREFETCH_WORKERS)
+    for future in [audio_cache._prefetcher.submit(barrier.wait, 60) for _ in range(audio_cache.PREFETCH_WORKERS)]:
+        future.result()
+
+
+class Bench:
+    def __init__(self, requests=50, concurrency=8, latency=0.02, jitter=0.0, fixtures_dir=None, only=None):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures_dir = fixtures_dir
+        self.only = only
+        self._local = threading.local()
+
+    def _client(self):
+        from django.test import Client
+
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client(HTTP_HOST="localhost")
+        return client
+
+    def _call(self, route, i, headers):
+        try:
+            if route.setup:
+                route.setup(i)
+            kwargs = {"data": route.data(i), "content_type": "application/json"} if route.data else {}
+            if route.auth:
+                kwargs.update(headers)
+            if route.headers:
+                kwargs.update(route.headers(i))
+            started = time.perf_counter()
+            response = getattr(self._client(), route.method)(route.path(i), **kwargs)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            return time.perf_counter() - started, response.status_code
+        except Exception:
+            return None, "exception"
+
+    def _run(self, route, phase, headers):
+        """Cold: each wave of `concurrency` requests starts from empty caches. Warm: the same requests, primed."""
+        latencies, statuses = [], []
+        busy = 0.0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            if phase == "warm":
+                list(pool.map(lambda i: self._call(route, i, headers), range(self.requests)))
+            for start in range(0, self.requests, self.concurrency):
+                wave = range(start, min(start + self.concurrency, self.requests))
+                if phase == "cold":
+                    _clear_caches()
+                started = time.perf_counter()
+                for seconds, status in pool.map(lambda i: self._call(route, i, headers), wave):
+                    statuses.append(status)
+                    if seconds is not None:
+                        latencies.append(seconds)
+                busy += time.perf_counter() - started
+        errors = sum(1 for s in statuses if s == "exception" or s >= 500)
+        return _summary(latencies, statuses, errors, busy)
+
+    def run(self):
+        import logging
+
+        from django.contrib.auth import get_user_model
+        from django.db import connection
+        from django.test.utils import override_settings
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        from api import qf_oauth
+        from api.services import admission, audio_cache, metrics, quran_client, tafsir_store
+
+        server, base = stub_upstream.start(self.latency, self.jitter, self.fixtures_dir)
+        metrics_dir = tempfile.mkdtemp(prefix="quran-bench-metrics-")
+        store_dir = tempfile.mkdtemp(prefix="quran-bench-tafsir-")
+        audio_dir = tempfile.mkdtemp(prefix="quran-bench-audio-")
+        saved = {
+            "api_base": quran_client.QURAN_API_BASE,
+            "backend": quran_client.QURAN_CLIENT_BACKEND,
+            "qf_id": qf_oauth.QF_CLIENT_ID,
+            "qf_secret": qf_oauth.QF_CLIENT_SECRET,
+            "metrics_dir": metrics.METRICS_DIR,
+            "tafsir_store": tafsir_store.STORE_PATH,
+            "audio": (audio_cache.AUDIO_BASE_URL, audio_cache.AUDIO_CACHE_DIR),
+            "admission": (admission.MAX_CONCURRENCY, admission.RATE),
+            "env": {k: os.environ.get(k) for k in ("QF_CLIENT_ID", "QF_CLIENT_SECRET", "QF_AUTH_BASE_URL", "QF_API_BASE_URL", "METRICS_TOKEN")},
+        }
+        quran_client.QURAN_API_BASE = f"{base}/api/v4"
+        quran_client.QURAN_CLIENT_BACKEND = "upstream"
+        qf_oauth.QF_CLIENT_ID = qf_oauth.QF_CLIENT_SECRET = "bench"
+        metrics.METRICS_DIR = metrics_dir
+        tafsir_store.STORE_PATH = os.path.join(store_dir, "tafsir_store.sqlite3")
+        audio_cache.AUDIO_BASE_URL, audio_cache.AUDIO_CACHE_DIR = f"{base}/", os.path.join(audio_dir, "cache")
+        # One process stands in for the whole deployment against a local stub: measure it unthrottled
+        admission.MAX_CONCURRENCY, admission.RATE = 0, 0
+        admission._limiters.clear()
+        os.environ.update(QF_CLIENT_ID="bench", QF_CLIENT_SECRET="bench", QF_AUTH_BASE_URL=base, QF_API_BASE_URL=base)
+        os.environ.pop("METRICS_TOKEN", None)
+
+        test_db = connection.settings_dict.setdefault("TEST", {})
+        if connection.vendor == "sqlite" and not test_db.get("NAME"):
+            test_db["NAME"] = os.path.join(tempfile.mkdtemp(prefix="quran-bench-db-"), "bench.sqlite3")
+        # 4xx responses are expected for some routes (e.g. oauth/me without a session)
+        request_log = logging.getLogger("django.request")
+        log_level = request_log.level
+        request_log.setLevel(logging.ERROR)
+        # A private in-process cache, so cold phases never flush a shared Redis
+        caches = override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "quran-bench",
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }})
+        caches.enable()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            user = get_user_model().objects.create_user("bench", password=PASSWORD)
+            headers = {"HTTP_AUTHORIZATION": f"Bearer {RefreshToken.for_user(user).access_token}"}
+            results = {}
+            for route in routes(user):
+                if self.only and route.name not in self.only:
+                    continue
+                results[route.name] = {phase: self._run(route, phase, headers) for phase in PHASES}
+        finally:
+            _drain_audio_prefetch()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            server.shutdown()
+            caches.disable()
+            request_log.setLevel(log_level)
+            quran_client.QURAN_API_BASE = saved["api_base"]
+            quran_client.QURAN_CLIENT_BACKEND = saved["backend"]
+            qf_oauth.QF_CLIENT_ID, qf_oauth.QF_CLIENT_SECRET = saved["qf_id"], saved["qf_secret"]
+            metrics.METRICS_DIR = saved["metrics_dir"]
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+            tafsir_store.STORE_PATH = saved["tafsir_store"]
+            admission.MAX_CONCURRENCY, admission.RATE = saved["admission"]
+            admission._limiters.clear()
+            shutil.rmtree(store_dir, ignore_errors=True)
+            audio_cache.clear()  # the bench directory, and its usage count, before switching back
+            audio_cache.AUDIO_BASE_URL, audio_cache.AUDIO_CACHE_DIR = saved["audio"]
+            shutil.rmtree(audio_dir, ignore_errors=True)
+            for key, value in saved["env"].items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        return {
+            "commit": _commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "config": {
+                "requests": self.requests,
+                "concurrency": self.concurrency,
+                "latency_ms": self.latency * 1000,
+                "jitter_ms": self.jitter * 1000,
+                "fixtures": self.fixtures_dir,
+            },
+            "routes": results,
+        }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(old, new):
+    """Rows of (route, phase, old p95, new p95, change %) for routes present in both reports."""
+    rows = []
+    for name, phases in new["routes"].items():
+        for phase, stats in phases.items():
+            before = old.get("routes", {}).get(name, {}).get(phase, {}).get("p95_ms")
+            after = stats.get("p95_ms")
+            change = round((after - before) / before * 100, 1) if before and after is not None else None
+            rows.append((name, phase, before, after, change))
+    return rows
@@ -0,0 +1,250 @@
+"""
+Local stub of api.quran.com v4 and quran.foundation (OAuth2 token + Content API) for offline benchmarks.
+Answers from recorded fixtures when present (FIXTURES_DIR/<path with / as __>.json), otherwise from
+deterministic synthetic payloads in the upstream response shapes; `.mp3` paths stand in for the audio CDN.
+Every response waits `latency` seconds.
+"""
+import json
+import math
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from api.services.navigation import TOTAL_VERSES, VERSE_COUNTS
+
+PAGES = 604
+JUZS = 30
+# Size of a synthetic recitation file (a few seconds of 128 kbit/s MP3)
+AUDIO_BYTES = 64 * 1024
+
+# Flat verse list: (id, chapter, number); pages and juz are spread evenly over it
+_VERSES = [(0, 0, 0)]
+for _chapter, _count in enumerate(VERSE_COUNTS, start=1):
+    for _number in range(1, _count + 1):
+        _VERSES.append((len(_VERSES), _chapter, _number))
+_BY_KEY = {f"{c}:{n}": i for i, c, n in _VERSES[1:]}
+
+ARABIC = "بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ"
+ENGLISH = "In the name of Allah, the Entirely Merciful, the Especially Merciful."
+
+
+def _page_of(verse_id):
+    return min((verse_id - 1) * PAGES // TOTAL_VERSES + 1, PAGES)
+
+
+def _juz_of(verse_id):
+    return min((verse_id - 1) * JUZS // TOTAL_VERSES + 1, JUZS)
+
+
+def _verse(verse_id, query):
+    _, chapter, number = _VERSES[verse_id]
+    fields = (query.get("fields") or [""])[0].split(",")
+    verse = {
+        "id": verse_id,
+        "verse_number": number,
+        "verse_key": f"{chapter}:{number}",
+        "hizb_number": (_juz_of(verse_id) - 1) * 2 + 1,
+        "rub_el_hizb_number": (_juz_of(verse_id) - 1) * 8 + 1,
+        "ruku_number": verse_id // 10 + 1,
+        "manzil_number": (chapter - 1) // 17 + 1,
+        "sajdah_number": None,
+        "page_number": _page_of(verse_id),
+        "juz_number": _juz_of(verse_id),
+    }
+    if "text_uthmani" in fields:
+        verse["text_uthmani"] = ARABIC
+    if "text_uthmani_tajweed" in fields:
+        verse["text_uthmani_tajweed"] = ARABIC
+    translations = (query.get("translations") or [""])[0]
+    if translations:
+        verse["translations"] = [
+            {"id": verse_id * 10 + i, "resource_id": int(t), "text": f"{ENGLISH} ({chapter}:{number})"}
+            for i, t in enumerate(translations.split(","))
+            if t.strip().isdigit()
+        ]
+    audio = (query.get("audio") or ["0"])[0]
+    if audio not in ("", "0"):
+        verse["audio"] = {"url": f"Alafasy/mp3/{chapter:03d}{number:03d}.mp3", "segments": []}
+    if (query.get("words") or ["false"])[0] == "true":
+        verse["words"] = [
+            {"id": verse_id * 100 + w, "position": w, "text_uthmani": word, "translation": {"text": "word"}}
+            for w, word in enumerate(ARABIC.split(), start=1)
+        ]
+    return verse
+
+
+def _paginate(ids, query):
+    per_page = int((query.get("per_page") or ["10"])[0])
+    page = int((query.get("page") or ["1"])[0])
+    total_pages = math.ceil(len(ids) / per_page) if ids else 0
+    chunk = ids[(page - 1) * per_page: page * per_page]
+    return {
+        "verses": [_verse(i, query) for i in chunk],
+        "pagination": {
+            "per_page": per_page,
+            "current_page": page,
+            "next_page": page + 1 if page < total_pages else None,
+            "total_pages": total_pages,
+            "total_records": len(ids),
+        },
+    }
+
+
+def _chapter(chapter_id):
+    first = _BY_KEY[f"{chapter_id}:1"]
+    last = _BY_KEY[f"{chapter_id}:{VERSE_COUNTS[chapter_id - 1]}"]
+    return {
+        "id": chapter_id,
+        "revelation_place": "makkah" if chapter_id % 3 else "madinah",
+        "revelation_order": chapter_id,
+        "bismillah_pre": chapter_id not in (1, 9),
+        "name_simple": f"Surah {chapter_id}",
+        "name_complex": f"Sūrah {chapter_id}",
+        "name_arabic": "سورة",
+        "verses_count": VERSE_COUNTS[chapter_id - 1],
+        "pages": [_page_of(first), _page_of(last)],
+        "translated_name": {"language_name": "english", "name": f"Chapter {chapter_id}"},
+    }
+
+
+def _mp3(path):
+    """Deterministic stand-in for a CDN recitation file: an ID3 header, then MPEG frame headers and filler."""
+    frame = b"\xff\xfb\x90\x64" + path.encode()
+    return (b"ID3\x04\x00\x00\x00\x00\x00\x00" + frame * (AUDIO_BYTES // len(frame) + 1))[:AUDIO_BYTES]
+
+
+def _v4(path, query):
+    """Synthetic api.quran.com v4 payload for `path` (without the /api/v4 prefix), or None for 404."""
+    parts = [p for p in path.split("/") if p]
+    if parts == ["chapters"]:
+        return {"chapters": [_chapter(c) for c in range(1, 115)]}
+    if len(parts) == 2 and parts[0] == "chapters":
+        return {"chapter": _chapter(int(parts[1]))} if 1 <= int(parts[1]) <= 114 else None
+    if len(parts) == 3 and parts[:2] == ["verses", "by_chapter"]:
+        chapter = int(parts[2])
+        if not 1 <= chapter <= 114:
+            return None
+        return _paginate([i for i, c, _ in _VERSES[1:] if c == chapter], query)
+    if len(parts) == 3 and parts[:2] == ["verses", "by_page"]:
+        return _paginate([i for i, _, _ in _VERSES[1:] if _page_of(i) == int(parts[2])], query)
+    if len(parts) == 3 and parts[:2] == ["verses", "by_juz"]:
+        return _paginate([i for i, _, _ in _VERSES[1:] if _juz_of(i) == int(parts[2])], query)
+    if len(parts) == 3 and parts[:2] == ["verses", "by_key"]:
+        verse_id = _BY_KEY.get(parts[2])
+        return {"verse": _verse(verse_id, query)} if verse_id else None
+    if parts == ["juzs"]:
+        juzs = []
+        for juz in range(1, JUZS + 1):
+            ids = [i for i, _, _ in _VERSES[1:] if _juz_of(i) == juz]
+            juzs.append({"id": juz, "juz_number": juz, "first_verse_id": ids[0], "last_verse_id": ids[-1], "verses_count": len(ids)})
+        return {"juzs": juzs}
+    if parts == ["resources", "translations"]:
+        return {"translations": [{"id": i, "name": f"Translation {i}", "author_name": "Author", "language_name": "english"} for i in (20, 85, 131)]}
+    if parts == ["resources", "recitations"]:
+        return {"recitations": [{"id": i, "reciter_name": f"Reciter {i}", "style": None} for i in range(1, 13)]}
+    if parts == ["resources", "tafsirs"]:
+        return {"tafsirs": [{"id": i, "name": f"Tafsir {i}", "language_name": "english"} for i in (169, 168, 817)]}
+    if len(parts) == 3 and parts[:2] == ["quran", "tafsirs"]:
+        key = (query.get("verse_key") or [None])[0]
+        chapter = (query.get("chapter_number") or [None])[0]
+        keys = [key] if key else [f"{chapter}:{n}" for n in range(1, VERSE_COUNTS[int(chapter) - 1] + 1)]
+        return {"tafsirs": [{"resource_id": int(parts[2]), "verse_key": k, "text": "<p>" + ENGLISH * 40 + "</p>"} for k in keys]}
+    if parts == ["quran", "verses", "uthmani_tajweed"]:
+        if query.get("chapter_number"):
+            chapter = int(query["chapter_number"][0])
+            ids = [i for i, c, _ in _VERSES[1:] if c == chapter]
+        elif query.get("page_number"):
+            ids = [i for i, _, _ in _VERSES[1:] if _page_of(i) == int(query["page_number"][0])]
+        else:
+            ids = [_BY_KEY.get((query.get("verse_key") or [""])[0], 1)]
+        return {"verses": [
+            {"id": i, "verse_key": f"{_VERSES[i][1]}:{_VERSES[i][2]}", "text_uthmani_tajweed": f'<tajweed class="ham_wasl">{ARABIC}</tajweed>'}
+            for i in ids
+        ]}
+    if parts == ["search"]:
+        q = (query.get("q") or [""])[0]
+        size = int((query.get("size") or ["20"])[0])
+        return {"search": {"query": q, "total_results": size, "current_page": 1, "total_pages": 1, "results": [
+            {"verse_key": f"1:{n}", "verse_id": n, "text": ARABIC, "translations": [{"text": ENGLISH, "resource_id": 131}]}
+            for n in range(1, min(size, 7) + 1)
+        ]}}
+    return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    jitter = 0.0
+    fixtures_dir = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode() if payload is not None else b"{}"
+        self._send_bytes(status, body, "application/json")
+
+    def _send_bytes(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _fixture(self, path):
+        if not self.fixtures_dir:
+            return None
+        name = os.path.join(self.fixtures_dir, path.strip("/").replace("/", "__") + ".json")
+        if os.path.exists(name):
+            with open(name) as f:
+                return json.load(f)
+        return None
+
+    def _answer(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        path = url.path
+        if path == "/oauth2/token":
+            length = int(self.headers.get("Content-Length") or 0)
+            self.rfile.read(length)
+            return self._send(200, {"access_token": "stub-token", "expires_in": 3600, "token_type": "bearer"})
+        if path.endswith(".mp3"):
+            return self._send_bytes(200, _mp3(path), "audio/mpeg")
+        fixture = self._fixture(path)
+        if fixture is not None:
+            return self._send(200, fixture)
+        for prefix in ("/api/v4", "/content/api/v4"):
+            if path.startswith(prefix):
+                try:
+                    payload = _v4(path[len(prefix):], query)
+                except (ValueError, IndexError, TypeError):
+                    payload = None
+                return self._send(200, payload) if payload is not None else self._send(404, {"error": "not found"})
+        if path.startswith("/auth/v1"):
+            return self._send(200, {"data": []})
+        return self._send(404, {"error": "not found"})
+
+    def do_GET(self):
+        self._answer()
+
+    def do_POST(self):
+        self._answer()
+
+    def do_DELETE(self):
+        self._answer()
+
+
+def start(latency=0.0, jitter=0.0, fixtures_dir=None):
+    """Serve on an ephemeral 127.0.0.1 port in a daemon thread; returns (server, base_url)."""
+    handler = type("Handler", (StubHandler,), {"latency": latency, "jitter": jitter, "fixtures_dir": fixtures_dir})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
@@ -0,0 +1,48 @@
+"""
+HTTP caching for content views: strong ETag from the rendered body, 304 on If-None-Match,
+and a per-resource Cache-Control max-age so browsers, nginx proxy_cache and CDNs can reuse responses.
+Passthrough bodies arrive with the ETag the renderer took from their cached object.
+"""
+import functools
+import os
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, set_response_etag
+from dotenv import load_dotenv  # type: ignore
+
+from .services import metrics
+
+load_dotenv()
+
+# Browser/CDN freshness per resource (seconds); server-side TTLs live in services/response_cache.py
+MAX_AGES = {
+    "text": int(os.getenv("HTTP_MAX_AGE_TEXT", str(60 * 60 * 24))),
+    "resources": int(os.getenv("HTTP_MAX_AGE_RESOURCES", str(60 * 60))),
+    "search": int(os.getenv("HTTP_MAX_AGE_SEARCH", str(60 * 5))),
+}
+
+
+def conditional(resource):
+    """
+    Wrap an @api_view(["GET", "HEAD", ...]): successful GET/HEAD responses get ETag + Cache-Control,
+    and matching If-None-Match gets 304.
+    """
+    max_age = MAX_AGES[resource]
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if request.method not in ("GET", "HEAD") or response.status_code != 200:
+                return response
+            if hasattr(response, "render") and not response.is_rendered:
+                with metrics.timer("quran_render_seconds", view=view.__name__):
+                    response.render()
+            patch_cache_control(response, public=True, max_age=max_age, stale_while_revalidate=max_age)
+            patch_vary_headers(response, ["Accept"])
+            if not response.has_header("ETag"):
+                set_response_etag(response)
+            return get_conditional_response(request, etag=response.get("ETag"), response=response)
+
+        return wrapper
+
+    return decorator
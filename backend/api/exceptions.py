@@ -0,0 +1,30 @@
+"""
+DRF exception handler: upstream failures become 502/503/4xx responses instead of 500s.
+"""
+import requests
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from .services.circuit import OPEN_SECONDS
+from .services.upstream import UpstreamUnavailable
+
+
+def exception_handler(exc, context):
+    response = drf_exception_handler(exc, context)
+    if response is not None:
+        return response
+    if isinstance(exc, UpstreamUnavailable):
+        return Response(
+            {"error": "Quran content is temporarily unavailable"},
+            status=503,
+            headers={"Retry-After": str(int(getattr(exc, "retry_after", OPEN_SECONDS)))},
+        )
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        if 400 <= status < 500:
+            # Upstream rejected the input (e.g. unknown chapter) - pass its status through
+            return Response({"error": "Not found" if status == 404 else "Invalid request"}, status=status)
+        return Response({"error": "Upstream error"}, status=502)
+    if isinstance(exc, requests.RequestException):
+        return Response({"error": "Upstream error"}, status=502)
+    return None
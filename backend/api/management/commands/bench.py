@@ -0,0 +1,65 @@
+"""
+Benchmark every API route offline against a stub upstream; write the results as JSON.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.bench.runner import Bench, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Start a local stub of api.quran.com and quran.foundation, point the app at it and measure "
+        "p50/p95/p99 and throughput for every route, cold-cache and warm-cache. No network access needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Requests per route and phase (default: 50)")
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+        parser.add_argument("--latency-ms", type=float, default=20, help="Stub upstream latency (default: 20)")
+        parser.add_argument("--jitter-ms", type=float, default=0, help="Extra random stub latency, 0..N ms (default: 0)")
+        parser.add_argument("--fixtures", help="Directory of recorded upstream payloads (<path with / as __>.json)")
+        parser.add_argument("--routes", help="Comma-separated route names to run (default: all)")
+        parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+        parser.add_argument("--compare", help="Earlier JSON report to diff p95 against")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["concurrency"] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+        only = {r.strip() for r in options["routes"].split(",")} if options["routes"] else None
+        report = Bench(
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+            latency=options["latency_ms"] / 1000,
+            jitter=options["jitter_ms"] / 1000,
+            fixtures_dir=options["fixtures"],
+            only=only,
+        ).run()
+
+        text = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(text + "\n")
+        else:
+            self.stdout.write(text)
+
+        out = self.stderr if not options["output"] else self.stdout
+        out.write(f"{'route':<34}{'phase':<6}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}{'err':>5}")
+        for name, phases in report["routes"].items():
+            for phase, s in phases.items():
+                out.write(
+                    f"{name:<34}{phase:<6}{s['p50_ms'] or '-':>9}{s['p95_ms'] or '-':>9}"
+                    f"{s['p99_ms'] or '-':>9}{s['rps'] or '-':>9}{s['errors']:>5}"
+                )
+
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    old = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+            out.write(f"\np95 vs {old.get('commit') or options['compare']}:")
+            for name, phase, before, after, change in compare(old, report):
+                delta = f"{change:+.1f}%" if change is not None else "n/a"
+                out.write(f"{name:<34}{phase:<6}{before or '-':>9} -> {after or '-':<9}{delta:>8}")
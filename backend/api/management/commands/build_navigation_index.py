@@ -0,0 +1,56 @@
+"""
+Build the navigation index (first verse of every Mushaf page, hizb and rub el hizb) from the corpus store.
+"""
+import json
+import os
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services import corpus, navigation
+
+COLUMNS = {"page": "page_number", "hizb": "hizb_number", "rub": "rub_el_hizb_number"}
+
+
+class Command(BaseCommand):
+    help = "Write the page/hizb/rub boundaries behind /api/navigation/locate/ and local input validation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=corpus.CORPUS_PATH, help="Corpus store built by ingest_corpus")
+        parser.add_argument("--path", default=navigation.INDEX_PATH, help="Output index file")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options["corpus"]):
+            raise CommandError(f"No corpus store at {options['corpus']}; run `manage.py ingest_corpus` first")
+        source = sqlite3.connect(f"file:{options['corpus']}?mode=ro", uri=True)
+        try:
+            rows = source.execute(
+                f"SELECT verse_key, {', '.join(COLUMNS.values())} FROM verses ORDER BY id"
+            ).fetchall()
+        finally:
+            source.close()
+        if len(rows) != navigation.TOTAL_VERSES:
+            raise CommandError(f"Corpus has {len(rows)} verses, expected {navigation.TOTAL_VERSES}")
+
+        index = {"version": 1}
+        for position, name in enumerate(COLUMNS, start=1):
+            previous, starts = None, []
+            for row in rows:
+                if row[position] is None:
+                    raise CommandError(f"Verse {row[0]} has no {COLUMNS[name]}; re-run ingest_corpus")
+                if row[position] != previous:
+                    starts.append(row[0])
+                    previous = row[position]
+            index[name] = starts
+
+        tmp_path = f"{options['path']}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        if not navigation.load(tmp_path):  # same checks the server applies when loading
+            os.unlink(tmp_path)
+            raise CommandError("Corpus page/hizb/rub numbering does not match the Madani Mushaf")
+        os.replace(tmp_path, options["path"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(index['page'])} pages, {len(index['hizb'])} hizbs and {len(index['rub'])} rubs "
+            f"to {options['path']}"
+        ))
@@ -0,0 +1,33 @@
+"""
+Build the local full-text search index from the corpus store (run ingest_corpus first).
+"""
+import os
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services import corpus, search_index
+
+
+class Command(BaseCommand):
+    help = "Index Arabic text and ingested translations for local /api/search/ (SQLite FTS5)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=corpus.CORPUS_PATH, help="Corpus store built by ingest_corpus")
+        parser.add_argument("--path", default=search_index.INDEX_PATH, help="Output index file")
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options["corpus"]):
+            raise CommandError(f"No corpus store at {options['corpus']}; run `manage.py ingest_corpus` first")
+        started = time.monotonic()
+        tmp_path = f"{options['path']}.tmp"
+        source = sqlite3.connect(f"file:{options['corpus']}?mode=ro", uri=True)
+        try:
+            rows = search_index.build(tmp_path, source)
+        finally:
+            source.close()
+        os.replace(tmp_path, options["path"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {rows} rows into {options['path']} in {time.monotonic() - started:.1f}s"
+        ))
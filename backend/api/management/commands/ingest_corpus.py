@@ -0,0 +1,92 @@
+"""
+Ingest the Quran corpus into the local store used by QURAN_CLIENT_BACKEND=local.
+"""
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services import corpus, upstream
+from api.services.quran_client import QURAN_API_BASE
+
+PER_PAGE = 50
+
+
+class Command(BaseCommand):
+    help = "Download chapters, juz and all 6236 verses (with translations/audio) into the local corpus store."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--translations", default="131", help="Comma-separated translation ids (default: 131)")
+        parser.add_argument("--recitations", default="1", help="Comma-separated recitation ids for verse audio (default: 1)")
+        parser.add_argument("--languages", default="en", help="Comma-separated chapter name languages (default: en)")
+        parser.add_argument("--path", default=corpus.CORPUS_PATH, help="Output SQLite file")
+
+    def _get(self, path, params=None):
+        r = upstream.get(f"{QURAN_API_BASE}{path}", params=params)
+        r.raise_for_status()
+        return r.json()
+
+    def _fetch_chapter(self, chapter_id, params):
+        page = 1
+        while page:
+            data = self._get(f"/verses/by_chapter/{chapter_id}", {**params, "page": page, "per_page": PER_PAGE})
+            yield data.get("verses", [])
+            page = (data.get("pagination") or {}).get("next_page")
+
+    def handle(self, *args, **options):
+        translations = corpus._split_ids(options["translations"])
+        recitations = corpus._split_ids(options["recitations"])
+        languages = [l.strip() for l in options["languages"].split(",") if l.strip()]
+        path = options["path"]
+        tmp_path = f"{path}.tmp"
+        started = time.monotonic()
+
+        conn = corpus.create(tmp_path)
+        try:
+            for language in languages:
+                for chapter in self._get("/chapters", {"language": language}).get("chapters", []):
+                    conn.execute(
+                        "INSERT INTO chapters (language, id, data) VALUES (?, ?, ?)",
+                        (language, chapter["id"], json.dumps(chapter, ensure_ascii=False)),
+                    )
+            conn.execute(
+                "INSERT INTO documents (name, data) VALUES ('juzs', ?)",
+                (json.dumps(self._get("/juzs"), ensure_ascii=False),),
+            )
+
+            for chapter_id in range(1, 115):
+                base = {
+                    "fields": ",".join(corpus.TEXT_COLUMNS),
+                    "translations": ",".join(str(t) for t in translations),
+                    "audio": recitations[0] if recitations else "",
+                    "words": "false",
+                }
+                for verses in self._fetch_chapter(chapter_id, base):
+                    corpus.write_verses(conn, verses, chapter_id, recitation_id=base["audio"] or None)
+                for recitation_id in recitations[1:]:
+                    params = {"fields": "text_uthmani", "audio": recitation_id, "words": "false"}
+                    for verses in self._fetch_chapter(chapter_id, params):
+                        corpus.write_verses(conn, verses, chapter_id, translations=False, recitation_id=recitation_id)
+                conn.commit()
+                self.stdout.write(f"  chapter {chapter_id}/114")
+
+            count = conn.execute("SELECT COUNT(*) FROM verses").fetchone()[0]
+            if count != 6236:
+                raise CommandError(f"Expected 6236 verses, got {count}; store not replaced")
+            for key, value in (
+                ("translations", translations),
+                ("recitations", recitations),
+                ("languages", languages),
+                ("ingested_at", int(time.time())),
+            ):
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            conn.commit()
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {count} verses into {path} in {time.monotonic() - started:.1f}s"
+        ))
@@ -0,0 +1,131 @@
+"""
+Fill the response cache with the whole navigable corpus after a deploy or cache flush.
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from api.services import admission, quran_client, response_cache, upstream
+from api.services.admission import TokenBucket
+from api.services.qf_api_client import _get_config as qf_config
+
+PER_PAGE = 20  # the reader views' page size, so keys match what the SPA requests
+MUSHAF_PAGES = 604
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute chapters, verse pages, Mushaf pages, juz, resource lists and tajweed maps into the cache. "
+        "Entries already cached are skipped, so an interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Parallel upstream fetches (default: 4)")
+        parser.add_argument("--rate", type=float, default=8.0, help="Max upstream fetches per second (default: 8)")
+        parser.add_argument("--translations", default="131", help="Translation ids, as the SPA sends them (default: 131)")
+        parser.add_argument("--recitation", type=int, default=1, help="Recitation id for verse audio (default: 1)")
+        parser.add_argument("--languages", default="en", help="Comma-separated chapter languages (default: en)")
+        parser.add_argument("--tajweed", action="store_true", help="Also warm tajweed=true verse pages")
+
+    def _tasks(self, options):
+        qc = quran_client
+        t, audio = options["translations"], options["recitation"]
+        languages = [l.strip() for l in options["languages"].split(",") if l.strip()]
+        tasks = []
+
+        def add(label, func, key, *args, **kwargs):
+            tasks.append((label, func, key, args, kwargs))
+
+        for language in languages:
+            add(f"chapters {language}", qc.get_chapters, qc.get_chapters.cache_key(language=language), language=language)
+            add(f"translations {language}", qc.get_translations, qc.get_translations.cache_key(language=language), language=language)
+        add("recitations", qc.get_recitations, qc.get_recitations.cache_key())
+        add("tafsirs", qc.get_tafsirs, qc.get_tafsirs.cache_key())
+        add("juzs", qc.get_juzs, qc.get_juzs.cache_key())
+
+        chapters = qc.get_chapters(language="en").get("chapters", [])
+        variants = [False, True] if options["tajweed"] else [False]
+        for chapter in chapters:
+            cid = chapter["id"]
+            for language in languages:
+                add(f"chapter {cid} {language}", qc.get_chapter, qc.get_chapter.cache_key(cid, language=language), cid, language=language)
+            for page in range(1, math.ceil(chapter["verses_count"] / PER_PAGE) + 1):
+                for tajweed in variants:
+                    key = qc._fetch_verses.cache_key(cid, t, audio, False, None, page, PER_PAGE, tajweed)
+                    add(
+                        f"chapter {cid} verses p{page}{' tajweed' if tajweed else ''}",
+                        qc.get_verses, key, cid,
+                        translations=t, audio=audio, words=False, tafsirs=None, page=page, per_page=PER_PAGE, tajweed=tajweed,
+                    )
+            if qf_config():
+                add(f"tajweed map {cid}", qc.get_tajweed_map, qc.get_tajweed_map.cache_key(cid), cid)
+
+        for page_number in range(1, MUSHAF_PAGES + 1):
+            key = qc._fetch_verses_by_page.cache_key(page_number, t, PER_PAGE, audio, False)
+            add(
+                f"mushaf page {page_number}", qc.get_verses_by_page, key, page_number,
+                translations=t, per_page=PER_PAGE, audio=audio, words=False,
+            )
+
+        seen = set()
+        for juz in qc.get_juzs().get("juzs", []):
+            # api.quran.com lists some juz more than once
+            if juz["juz_number"] in seen:
+                continue
+            seen.add(juz["juz_number"])
+            for page in range(1, math.ceil(juz["verses_count"] / PER_PAGE) + 1):
+                for tajweed in variants:
+                    key = qc.get_verses_by_juz.cache_key(juz["juz_number"], translations=t, page=page, per_page=PER_PAGE, tajweed=tajweed)
+                    add(
+                        f"juz {juz['juz_number']} p{page}{' tajweed' if tajweed else ''}",
+                        qc.get_verses_by_juz, key, juz["juz_number"],
+                        translations=t, page=page, per_page=PER_PAGE, tajweed=tajweed,
+                    )
+        return tasks
+
+    def handle(self, *args, **options):
+        if not admission._shared_cache():
+            # A per-process LocMemCache would be filled here and dropped on exit, after ~1,400 upstream calls
+            self.stdout.write(self.style.WARNING("The cache is not shared between processes (set REDIS_URL); nothing to warm"))
+            return
+        started = time.monotonic()
+        # Listing chapters and juz is upstream work too, so it waits for admission like the tasks below
+        with admission.wait_budget(upstream.READ_TIMEOUT):
+            tasks = self._tasks(options)
+        todo = [task for task in tasks if response_cache.lookup(task[2]) is None]
+        self.stdout.write(f"{len(tasks)} entries, {len(tasks) - len(todo)} already cached, {len(todo)} to fetch")
+
+        bucket = TokenBucket(options["rate"])
+        failed = []
+
+        def run(task):
+            label, func, _key, args, kwargs = task
+            bucket.acquire()
+            # A batch job waits for upstream admission instead of being shed like a request
+            with admission.wait_budget(upstream.READ_TIMEOUT):
+                func(*args, **kwargs)
+            return label
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            futures = {pool.submit(run, task): task[0] for task in todo}
+            for future in as_completed(futures):
+                done += 1
+                try:
+                    future.result()
+                except Exception as e:
+                    failed.append(futures[future])
+                    self.stderr.write(f"  failed: {futures[future]} ({e})")
+                if done % 50 == 0 or done == len(todo):
+                    rate = done / max(time.monotonic() - started, 1e-6)
+                    self.stdout.write(f"  [{done}/{len(todo)}] {rate:.1f}/s, {len(failed)} failed")
+
+        elapsed = time.monotonic() - started
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f"Warmed {len(todo) - len(failed)} entries in {elapsed:.1f}s; {len(failed)} failed - rerun to resume"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Warmed {len(todo)} entries in {elapsed:.1f}s"))
@@ -0,0 +1,22 @@
+"""
+Request metrics for API views: latency histogram and status counts per URL route.
+"""
+import time
+
+from .services import metrics
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.monotonic()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        if match is not None and request.path.startswith("/api/"):
+            route = match.route or request.path
+            metrics.observe("quran_http_request_seconds", time.monotonic() - started, route=route, method=request.method)
+            metrics.inc("quran_http_requests_total", route=route, method=request.method, status=response.status_code)
+        metrics.flush()
+        return response
@@ -0,0 +1,15 @@
+"""
+orjson-backed JSON request parser (bookmark and batch bodies).
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .services import fastjson
+
+
+class ORJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return fastjson.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
@@ -0,0 +1,133 @@
+"""
+Field projection for verse endpoints: ?fields= keeps only the named verse attributes, ?exclude= drops them.
+Both take comma-separated names, dotted for nested ones (translations.text, words.text_uthmani);
+?fields= also takes profiles (reader, audio, word-by-word, minimal). Resources nobody asked for are
+not requested upstream, and each verse is pruned before rendering.
+"""
+import re
+
+from .services.quran_client import verse_fields
+
+PROFILES = {
+    "reader": [
+        "id", "verse_key", "verse_number", "page_number", "juz_number", "text_uthmani", "text_uthmani_tajweed",
+        "translations.resource_id", "translations.resource_name", "translations.text",
+    ],
+    "audio": ["id", "verse_key", "verse_number", "audio"],
+    "word-by-word": [
+        "id", "verse_key", "verse_number", "text_uthmani", "translations.resource_id", "translations.text",
+        "words.id", "words.position", "words.text", "words.text_uthmani", "words.char_type_name", "words.audio_url",
+        "words.translation", "words.transliteration",
+    ],
+    "minimal": ["verse_key", "verse_number", "text_uthmani"],
+}
+
+_NAME = re.compile(r"^[a-z_]+(\.[a-z_]+)*$")
+
+
+def _tree(paths):
+    """["words.text", "words.id", "audio"] -> {"words": {"text": None, "id": None}, "audio": None}; None = whole value."""
+    tree = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split(".")
+        for name in parents:
+            child = node.get(name, {})
+            if child is None:
+                break  # an ancestor is already taken whole
+            node = node.setdefault(name, child)
+        else:
+            node[leaf] = None
+    return tree
+
+
+def _names(value, profiles):
+    names = []
+    for name in (n.strip() for n in value.split(",")):
+        if not name:
+            continue
+        if profiles and name in PROFILES:
+            names.extend(PROFILES[name])
+        elif _NAME.match(name):
+            names.append(name)
+        else:
+            raise ValueError(f"Unknown field or profile: {name}")
+    return names
+
+
+def _prune(value, include, exclude):
+    if isinstance(value, list):
+        return [_prune(item, include, exclude) for item in value]
+    if not isinstance(value, dict):
+        return value
+    pruned = {}
+    for name, item in value.items():
+        if include is not None and name not in include:
+            continue
+        if name in exclude and exclude[name] is None:
+            continue
+        sub_include = include[name] if include is not None else None
+        sub_exclude = exclude.get(name) or {}
+        pruned[name] = _prune(item, sub_include, sub_exclude) if sub_include is not None or sub_exclude else item
+    return pruned
+
+
+class Projection:
+    def __init__(self, include=None, exclude=None):
+        self.include = include  # tree of kept names, or None for everything
+        self.exclude = exclude or {}  # tree of dropped names
+
+    def wants(self, name):
+        """Whether top-level verse attribute `name` survives the projection."""
+        if self.include is not None and name not in self.include:
+            return False
+        return not (name in self.exclude and self.exclude[name] is None)
+
+    def narrow(self, base_fields=None, **params):
+        """
+        Fetch kwargs with unwanted resources switched off: translations="", audio=0 and tafsirs=None skip them upstream,
+        tajweed=False skips the QF merge; words=True only when the projection names words. With
+        `base_fields` (the endpoint's default upstream fields) `fields` is narrowed too.
+        """
+        if "translations" in params and not self.wants("translations"):
+            params["translations"] = ""
+        if "audio" in params and not self.wants("audio"):
+            params["audio"] = 0
+        if "tafsirs" in params and not self.wants("tafsirs"):
+            params["tafsirs"] = None
+        if "words" in params:
+            named = self.include is not None and "words" in self.include
+            params["words"] = self.wants("words") and (params["words"] or named)
+        if "tajweed" in params:
+            params["tajweed"] = params["tajweed"] and self.wants("text_uthmani_tajweed")
+        if base_fields is not None:
+            fields = verse_fields(base_fields, params.get("words", False), params.get("tajweed", False))
+            params["fields"] = ",".join(f for f in fields.split(",") if self.wants(f))
+        return params
+
+    def verse(self, verse):
+        """Pruned copy of one verse."""
+        return _prune(verse, self.include, self.exclude)
+
+    def apply(self, data):
+        """Copy of a verses response (`verses` list or single `verse`) with every verse pruned."""
+        if not isinstance(data, dict):
+            return data
+        pruned = dict(data)
+        if isinstance(data.get("verses"), list):
+            pruned["verses"] = [self.verse(v) for v in data["verses"]]
+        if isinstance(data.get("verse"), dict):
+            pruned["verse"] = self.verse(data["verse"])
+        return pruned
+
+
+def from_params(params):
+    """Projection for request params, or None when neither fields= nor exclude= is given. Raises ValueError."""
+    fields, exclude = (params.get(name) or "" for name in ("fields", "exclude"))
+    # POSTed JSON bodies may send lists
+    fields = ",".join(fields) if isinstance(fields, list) else str(fields)
+    exclude = ",".join(exclude) if isinstance(exclude, list) else str(exclude)
+    if not fields.strip() and not exclude.strip():
+        return None
+    include = _tree(_names(fields, profiles=True)) if fields.strip() else None
+    return Projection(include, _tree(_names(exclude, profiles=False)))
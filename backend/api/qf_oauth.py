@@ -36,6 +36,6 @@ def get_qf_config():
         "env": QF_ENV,
         "client_id": QF_CLIENT_ID,
         "client_secret": QF_CLIENT_SECRET,
-        "auth_base_url": env_config["auth_base"],
-        "api_base_url": env_config["api_base"],
+        "auth_base_url": os.getenv("QF_AUTH_BASE_URL") or env_config["auth_base"],
+        "api_base_url": os.getenv("QF_API_BASE_URL") or env_config["api_base"],
     }
@@ -0,0 +1,33 @@
+"""
+orjson-backed JSON renderer. Payloads that carry their encoded bytes (services.fastjson.RawJSON:
+unchanged upstream responses and cached values) are sent as-is, with no encode step at all.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .services import fastjson
+
+_encoder = JSONEncoder()
+
+
+def _escape_separators(body):
+    # Same as DRF: keep the output a strict JavaScript subset
+    if b"\xe2\x80\xa8" in body or b"\xe2\x80\xa9" in body:
+        body = body.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+    return body
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        raw = fastjson.raw_of(data)
+        if raw is not None and not indent:
+            response = renderer_context.get("response")
+            if response is not None and response.status_code == 200:
+                # The bytes' hash is memoized on the shared cached object; conditional() keeps this ETag
+                response["ETag"] = data.etag
+            return _escape_separators(raw)
+        return _escape_separators(fastjson.dumps(data, indent=bool(indent), default=_encoder.default))
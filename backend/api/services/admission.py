@@ -0,0 +1,174 @@
+"""
+Admission control for upstream calls, per host: at most UPSTREAM_MAX_CONCURRENCY calls in flight
+across all workers and UPSTREAM_RATE calls per second. A call that cannot be admitted within
+UPSTREAM_ADMISSION_WAIT seconds is shed instead of queued, and the caller falls back to the mirror,
+the corpus or stale cache - or answers 503 with Retry-After.
+
+In-flight calls are counted in the Django cache with atomic incr/decr, so with Redis all workers
+share the limit; every admission pushes the counter's expiry out by LEASE_SECONDS, so counts left
+behind by a crashed worker are dropped once the host has been idle that long. With the per-process
+LocMemCache each worker gets its share of the limit instead - never fewer slots than the worker has
+threads calling the host, so a batch or stream fanning out never sheds its own sub-fetches. The rate limit is a token bucket per
+worker refilled at UPSTREAM_RATE / workers, drawn from only once a slot is granted.
+"""
+import contextvars
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from dotenv import load_dotenv  # type: ignore
+
+load_dotenv()
+
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "3"))
+# Calls in flight per upstream host, all workers together (0 = unlimited)
+MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+# Calls started per second per upstream host, all workers together (0 = unlimited)
+RATE = float(os.getenv("UPSTREAM_RATE", "40"))
+# Longest a call may wait for admission before it is shed
+MAX_WAIT = float(os.getenv("UPSTREAM_ADMISSION_WAIT", "0.5"))
+# Longer than any single call (connect + read timeouts over every retry)
+LEASE_SECONDS = 60
+# Tries for a shared slot within the wait, so a shed call costs a bounded number of cache round trips
+ATTEMPTS = 4
+KEY_PREFIX = "adm:v2"
+
+_wait_budget = contextvars.ContextVar("admission_wait_budget", default=None)
+
+
+def _shared_cache():
+    return "LocMemCache" not in settings.CACHES["default"]["BACKEND"]
+
+
+class TokenBucket:
+    """At most `rate` tokens per second, bursts up to `burst` (default `rate`)."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        """Take a token, returning how long to wait before using it; None (nothing taken) if that exceeds max_wait."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1  # may go negative: later callers queue behind this reservation
+            return wait
+
+    def acquire(self):
+        """Block until a token is available."""
+        time.sleep(self.reserve())
+
+
+class _Slot:
+    def __init__(self, release=None):
+        self._release = release
+
+    def release(self):
+        if self._release is not None:
+            self._release()
+            self._release = None
+
+
+@contextmanager
+def wait_budget(seconds):
+    """Let upstream calls made in this context (and fan-outs from it) wait up to `seconds` for admission."""
+    token = _wait_budget.set(seconds)
+    try:
+        yield
+    finally:
+        _wait_budget.reset(token)
+
+
+class Limiter:
+    """Admission for one upstream host."""
+
+    def __init__(self, host, threads=0):
+        """`threads`: how many threads of this worker can call the host at once (the LocMemCache share's floor)."""
+        self.host = host
+        self.key = f"{KEY_PREFIX}:{host}:inflight"
+        per_worker_rate = RATE / WORKERS
+        self.bucket = TokenBucket(per_worker_rate, max(1.0, per_worker_rate)) if RATE > 0 else None
+        share = max(math.ceil(MAX_CONCURRENCY / WORKERS), threads)
+        self.semaphore = threading.BoundedSemaphore(share) if MAX_CONCURRENCY else None
+
+    def _incr(self):
+        try:
+            return cache.incr(self.key)
+        except ValueError:  # no counter yet, or it expired
+            cache.add(self.key, 0, timeout=LEASE_SECONDS)
+            return cache.incr(self.key)
+
+    def _decr(self):
+        try:
+            cache.decr(self.key)
+        except ValueError:  # expired with the host idle; nothing left to give back
+            pass
+
+    def _take_shared(self):
+        if self._incr() <= MAX_CONCURRENCY:
+            cache.touch(self.key, LEASE_SECONDS)
+            return True
+        self._decr()
+        return False
+
+    def _slot(self, deadline):
+        if not MAX_CONCURRENCY:
+            return _Slot()
+        if not _shared_cache():
+            if self.semaphore.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                return _Slot(self.semaphore.release)
+            return None
+        pause = max(deadline - time.monotonic(), 0) / ATTEMPTS
+        for attempt in range(ATTEMPTS):
+            if self._take_shared():
+                return _Slot(self._decr)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or attempt == ATTEMPTS - 1:
+                break
+            time.sleep(min(pause, remaining))
+        return None
+
+    def acquire(self, max_wait=None):
+        """
+        A slot to release() after the call, or None when the call should be shed. Returns (slot, seconds waited).
+        Waits up to `max_wait` seconds (default: the wait_budget() in effect, else UPSTREAM_ADMISSION_WAIT).
+        """
+        if max_wait is None:
+            max_wait = _wait_budget.get()
+        if max_wait is None:
+            max_wait = MAX_WAIT
+        started = time.monotonic()
+        deadline = started + max_wait
+        slot = self._slot(deadline)
+        if slot is not None and self.bucket is not None:
+            wait = self.bucket.reserve(max(deadline - time.monotonic(), 0))
+            if wait is None:
+                slot.release()
+                slot = None
+            else:
+                time.sleep(wait)
+        return slot, time.monotonic() - started
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host, threads=0):
+    limiter = _limiters.get(host)
+    if limiter is not None:
+        return limiter
+    with _limiters_lock:
+        return _limiters.setdefault(host, Limiter(host, threads))
@@ -0,0 +1,213 @@
+"""
+On-disk cache of recitation audio from the Quran.com audio CDN (the relative `audio.url` of verses
+and `audio_url` of words). Files are downloaded once, written atomically under AUDIO_CACHE_DIR and
+evicted least-recently-used (by mtime, touched on every hit) once the directory passes
+AUDIO_CACHE_BYTES. Workers share the directory; each worker downloads a given file at most once at a time.
+"""
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv  # type: ignore
+
+from . import metrics, navigation, upstream
+
+load_dotenv()
+
+AUDIO_BASE_URL = os.getenv("AUDIO_BASE_URL", "https://verses.quran.com/")
+AUDIO_CACHE_DIR = os.getenv(
+    "AUDIO_CACHE_DIR",
+    str(Path(__file__).resolve().parent.parent.parent / "data" / "audio_cache"),
+)
+AUDIO_CACHE_BYTES = int(os.getenv("AUDIO_CACHE_BYTES", str(2 * 1024 ** 3)))
+# Larger upstream files are refused rather than cached
+MAX_FILE_BYTES = 64 * 1024 ** 2
+# Verse files fetched ahead of the one being played
+AUDIO_PREFETCH = int(os.getenv("AUDIO_PREFETCH", "3"))
+PREFETCH_WORKERS = 2
+
+# Relative CDN paths only: "Alafasy/mp3/002255.mp3", "wbw/002_255_001.mp3"
+_PATH = re.compile(r"^[A-Za-z0-9_\-]+(/[A-Za-z0-9_\-.]+)*\.(mp3|ogg|opus|m4a)$")
+# Verse files are named <chapter:3><verse:3>.<ext>
+_VERSE_FILE = re.compile(r"^(?P<dir>(?:.*/)?)(?P<chapter>\d{3})(?P<verse>\d{3})\.(?P<ext>\w+)$")
+CONTENT_TYPES = {"mp3": "audio/mpeg", "ogg": "audio/ogg", "opus": "audio/ogg", "m4a": "audio/mp4"}
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_usage = {"bytes": None}
+_usage_lock = threading.Lock()
+_prefetcher = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="audio-prefetch")
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+def is_valid_path(path):
+    return bool(_PATH.match(path)) and ".." not in path.split("/")
+
+
+def content_type(path):
+    return CONTENT_TYPES[path.rsplit(".", 1)[1]]
+
+
+def _local_path(path):
+    return Path(AUDIO_CACHE_DIR) / path
+
+
+def _download(path, target):
+    """Download `path` to `target`; returns the new file open for reading, valid even if it is evicted at once."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    response = upstream.get(AUDIO_BASE_URL + path, stream=True)
+    try:
+        response.raise_for_status()
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".part-")
+        out = os.fdopen(fd, "w+b")
+        size = 0
+        try:
+            for chunk in response.iter_content(64 * 1024):
+                size += len(chunk)
+                if size > MAX_FILE_BYTES:
+                    raise FileTooLarge(path)
+                out.write(chunk)
+            out.flush()
+            os.replace(tmp, target)  # readers see the whole file or none
+        except BaseException:
+            out.close()
+            os.unlink(tmp)
+            raise
+    finally:
+        response.close()
+    _account(size)
+    out.seek(0)
+    return out
+
+
+def _open(target):
+    file = open(target, "rb")
+    try:
+        os.utime(target)  # LRU recency
+    except FileNotFoundError:  # evicted since open(); the handle still reads it
+        pass
+    return file
+
+
+def _fetch_once(path, target):
+    """Download `path`, or wait for the thread of this worker that is already downloading it. Returns an open file."""
+    with _inflight_lock:
+        event = _inflight.get(path)
+        leader = event is None
+        if leader:
+            event = _inflight[path] = threading.Event()
+    if not leader:
+        event.wait(upstream.READ_TIMEOUT * 2)
+        try:
+            return _open(target)
+        except FileNotFoundError:  # the leader failed, or its file was evicted already
+            return _download(path, target)
+    try:
+        return _download(path, target)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(path, None)
+        event.set()
+
+
+def open_file(path):
+    """
+    CDN file `path` from the cache, downloading it on a miss, as an open binary file. The handle keeps
+    reading the data even if eviction unlinks the file meanwhile. Raises requests exceptions (and
+    UpstreamUnavailable) like upstream.get, or FileTooLarge.
+    """
+    target = _local_path(path)
+    try:
+        file = _open(target)
+        metrics.inc("quran_audio_cache_requests_total", result="hit")
+        return file
+    except FileNotFoundError:
+        pass
+    metrics.inc("quran_audio_cache_requests_total", result="miss")
+    return _fetch_once(path, target)
+
+
+def _scan():
+    files = []
+    for root, _dirs, names in os.walk(AUDIO_CACHE_DIR):
+        for name in names:
+            if name.startswith(".part-"):
+                continue
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:  # evicted by another worker
+                continue
+            files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+    return files
+
+
+def _account(size):
+    """Track bytes written; past the budget, evict down to 90% of it (rescanning picks up other workers' files)."""
+    with _usage_lock:
+        if _usage["bytes"] is None:
+            _usage["bytes"] = sum(f[1] for f in _scan())
+        else:
+            _usage["bytes"] += size
+        if _usage["bytes"] <= AUDIO_CACHE_BYTES:
+            return
+        files = sorted(_scan())
+        total = sum(f[1] for f in files)
+        for _mtime, file_size, name in files:
+            if total <= AUDIO_CACHE_BYTES * 0.9:
+                break
+            try:
+                os.unlink(name)
+                total -= file_size
+                metrics.inc("quran_audio_cache_evictions_total")
+            except FileNotFoundError:
+                pass
+        _usage["bytes"] = total
+
+
+def clear():
+    """Drop every cached file (downloads in progress still land)."""
+    with _usage_lock:
+        for _mtime, _size, name in _scan():
+            try:
+                os.unlink(name)
+            except FileNotFoundError:
+                pass
+        _usage["bytes"] = None
+
+
+def next_verse_paths(path, count=AUDIO_PREFETCH):
+    """CDN paths of up to `count` verses after verse file `path` in the same recitation and chapter ([] for other files)."""
+    match = _VERSE_FILE.match(path)
+    if not match:
+        return []
+    chapter, verse = match["chapter"], int(match["verse"])
+    if not 1 <= int(chapter) <= len(navigation.VERSE_COUNTS):
+        return []
+    last = min(verse + count, navigation.VERSE_COUNTS[int(chapter) - 1])
+    return [f"{match['dir']}{chapter}{number:03d}.{match['ext']}" for number in range(verse + 1, last + 1)]
+
+
+def _prefetch(paths):
+    # In order, stopping at the first failure
+    for path in paths:
+        target = _local_path(path)
+        if target.exists():
+            continue
+        try:
+            _fetch_once(path, target).close()
+            metrics.inc("quran_audio_cache_requests_total", result="prefetch")
+        except Exception:
+            return
+
+
+def prefetch_after(path):
+    """Download the next verses' files of the recitation in the background."""
+    paths = next_verse_paths(path)
+    if paths:
+        _prefetcher.submit(_prefetch, paths)
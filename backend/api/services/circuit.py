@@ -0,0 +1,99 @@
+"""
+Per-upstream circuit breakers. A host that keeps failing (errors, 5xx or slow calls) is cut off
+for a cool-down so workers fail fast instead of queueing on it; half-open probes close it again.
+State is per worker process - each worker trips on its own traffic within a few calls.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv  # type: ignore
+
+load_dotenv()
+
+WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+SLOW_CALL_SECONDS = float(os.getenv("CIRCUIT_SLOW_CALL_SECONDS", "5"))
+OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+        self.outcomes = deque(maxlen=WINDOW)  # True = failed or slow
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now. In half-open only one probe is let through at a time."""
+        with self.lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= OPEN_SECONDS:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record(self, failed, seconds):
+        failed = failed or seconds >= SLOW_CALL_SECONDS
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+                if failed:
+                    self._open()
+                else:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                return
+            self.outcomes.append(failed)
+            if (
+                self.state == CLOSED
+                and len(self.outcomes) >= MIN_CALLS
+                and sum(self.outcomes) / len(self.outcomes) >= ERROR_RATE
+            ):
+                self._open()
+
+    def cancel(self):
+        """A call allow() let through was not sent after all: free the half-open probe without an outcome."""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self.outcomes),
+                "recent_failures": sum(self.outcomes),
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def states():
+    return {name: breaker.snapshot() for name, breaker in list(_breakers.items())}
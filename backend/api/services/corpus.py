@@ -0,0 +1,246 @@
+"""
+Local Quran corpus store (SQLite) - chapters, verses, pages and juz served without upstream calls.
+Built by `python manage.py ingest_corpus`; responses mirror the api.quran.com v4 shapes.
+"""
+import json
+import math
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv  # type: ignore
+
+load_dotenv()
+
+CORPUS_PATH = os.getenv(
+    "QURAN_CORPUS_PATH",
+    str(Path(__file__).resolve().parent.parent.parent / "data" / "quran_corpus.sqlite3"),
+)
+
+# Fields api.quran.com returns on every verse regardless of `fields`
+VERSE_COLUMNS = [
+    "id",
+    "verse_number",
+    "verse_key",
+    "hizb_number",
+    "rub_el_hizb_number",
+    "ruku_number",
+    "manzil_number",
+    "sajdah_number",
+    "page_number",
+    "juz_number",
+]
+TEXT_COLUMNS = ["text_uthmani", "text_uthmani_tajweed"]
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE documents (name TEXT PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE chapters (language TEXT NOT NULL, id INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (language, id));
+CREATE TABLE verses (
+    id INTEGER PRIMARY KEY,
+    verse_number INTEGER NOT NULL,
+    verse_key TEXT NOT NULL UNIQUE,
+    chapter_id INTEGER NOT NULL,
+    hizb_number INTEGER,
+    rub_el_hizb_number INTEGER,
+    ruku_number INTEGER,
+    manzil_number INTEGER,
+    sajdah_number INTEGER,
+    page_number INTEGER NOT NULL,
+    juz_number INTEGER NOT NULL,
+    text_uthmani TEXT,
+    text_uthmani_tajweed TEXT
+);
+CREATE INDEX verses_chapter ON verses (chapter_id, verse_number);
+CREATE INDEX verses_page ON verses (page_number, id);
+CREATE INDEX verses_juz ON verses (juz_number, id);
+CREATE TABLE translations (verse_id INTEGER NOT NULL, resource_id INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (verse_id, resource_id));
+CREATE TABLE audio (verse_id INTEGER NOT NULL, recitation_id INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (verse_id, recitation_id));
+"""
+
+_local = threading.local()
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    path = getattr(_local, "path", None)
+    if conn is not None and path == CORPUS_PATH:
+        return conn
+    if not os.path.exists(CORPUS_PATH):
+        return None
+    conn = sqlite3.connect(f"file:{CORPUS_PATH}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    _local.conn = conn
+    _local.path = CORPUS_PATH
+    return conn
+
+
+def is_available():
+    return _connect() is not None
+
+
+def _meta(key):
+    conn = _connect()
+    if conn is None:
+        return None
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row["value"]) if row else None
+
+
+def _split_ids(value):
+    if value in (None, ""):
+        return []
+    return [int(v) for v in str(value).split(",") if v.strip()]
+
+
+def can_serve_verses(translations="131", audio=0, words=False, tafsirs=None):
+    """True when the store holds every resource the request asks for."""
+    if words or tafsirs or not is_available():
+        return False
+    try:
+        wanted = _split_ids(translations)
+        audio = int(audio or 0)
+    except ValueError:
+        return False
+    if not set(wanted) <= set(_meta("translations") or []):
+        return False
+    return not audio or audio in (_meta("recitations") or [])
+
+
+def _build_verses(rows, fields, translations, audio):
+    conn = _connect()
+    ids = [row["id"] for row in rows]
+    if not ids:
+        return []
+    marks = ",".join("?" * len(ids))
+    by_verse = {}
+    resource_ids = _split_ids(translations)
+    if resource_ids:
+        res_marks = ",".join("?" * len(resource_ids))
+        for t in conn.execute(
+            f"SELECT verse_id, data FROM translations WHERE verse_id IN ({marks}) AND resource_id IN ({res_marks})"
+            " ORDER BY verse_id, resource_id",
+            ids + resource_ids,
+        ):
+            by_verse.setdefault(t["verse_id"], []).append(json.loads(t["data"]))
+    audio_by_verse = {}
+    if audio:
+        for a in conn.execute(
+            f"SELECT verse_id, data FROM audio WHERE verse_id IN ({marks}) AND recitation_id = ?",
+            ids + [int(audio)],
+        ):
+            audio_by_verse[a["verse_id"]] = json.loads(a["data"])
+    verses = []
+    for row in rows:
+        verse = {col: row[col] for col in VERSE_COLUMNS}
+        for col in TEXT_COLUMNS:
+            if col in fields:
+                verse[col] = row[col]
+        if resource_ids:
+            verse["translations"] = by_verse.get(row["id"], [])
+        if audio:
+            verse["audio"] = audio_by_verse.get(row["id"])
+        verses.append(verse)
+    return verses
+
+
+def _paginate(where, args, fields, translations, audio, page, per_page):
+    conn = _connect()
+    page = max(int(page), 1)
+    per_page = max(int(per_page), 1)
+    total = conn.execute(f"SELECT COUNT(*) FROM verses WHERE {where}", args).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT * FROM verses WHERE {where} ORDER BY id LIMIT ? OFFSET ?",
+        args + [per_page, (page - 1) * per_page],
+    ).fetchall()
+    total_pages = math.ceil(total / per_page) if total else 0
+    return {
+        "verses": _build_verses(rows, fields, translations, audio),
+        "pagination": {
+            "per_page": per_page,
+            "current_page": page,
+            "next_page": page + 1 if page < total_pages else None,
+            "total_pages": total_pages,
+            "total_records": total,
+        },
+    }
+
+
+def get_chapters(language="en"):
+    conn = _connect()
+    if conn is None:
+        return None
+    rows = conn.execute("SELECT data FROM chapters WHERE language = ? ORDER BY id", (language,)).fetchall()
+    if not rows:
+        return None
+    return {"chapters": [json.loads(r["data"]) for r in rows]}
+
+
+def get_chapter(chapter_id, language="en"):
+    conn = _connect()
+    if conn is None:
+        return None
+    row = conn.execute("SELECT data FROM chapters WHERE language = ? AND id = ?", (language, int(chapter_id))).fetchone()
+    return {"chapter": json.loads(row["data"])} if row else None
+
+
+def get_juzs():
+    conn = _connect()
+    if conn is None:
+        return None
+    row = conn.execute("SELECT data FROM documents WHERE name = 'juzs'").fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+def get_verses(chapter_id, fields, translations="131", audio=0, page=1, per_page=20):
+    return _paginate("chapter_id = ?", [int(chapter_id)], fields, translations, audio, page, per_page)
+
+
+def get_verses_by_page(page_number, fields, translations="131", audio=0, page=1, per_page=20):
+    return _paginate("page_number = ?", [int(page_number)], fields, translations, audio, page, per_page)
+
+
+def get_verses_by_juz(juz_number, fields, translations="131", audio=0, page=1, per_page=20):
+    return _paginate("juz_number = ?", [int(juz_number)], fields, translations, audio, page, per_page)
+
+
+def get_verse_by_key(verse_key, fields, translations="131"):
+    conn = _connect()
+    if conn is None:
+        return None
+    row = conn.execute("SELECT * FROM verses WHERE verse_key = ?", (verse_key,)).fetchone()
+    if row is None:
+        return None
+    return {"verse": _build_verses([row], fields, translations, 0)[0]}
+
+
+def create(path):
+    """Create an empty store at `path` and return a writable connection."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def write_verses(conn, verses, chapter_id, translations=True, recitation_id=None):
+    """Insert one upstream `verses` page (by_chapter response) into a store opened with create()."""
+    for v in verses:
+        if translations:
+            conn.execute(
+                f"INSERT OR REPLACE INTO verses ({', '.join(VERSE_COLUMNS + TEXT_COLUMNS)}, chapter_id)"
+                f" VALUES ({', '.join('?' * (len(VERSE_COLUMNS) + len(TEXT_COLUMNS) + 1))})",
+                [v.get(col) for col in VERSE_COLUMNS + TEXT_COLUMNS] + [int(chapter_id)],
+            )
+            for t in v.get("translations") or []:
+                conn.execute(
+                    "INSERT OR REPLACE INTO translations (verse_id, resource_id, data) VALUES (?, ?, ?)",
+                    (v["id"], t["resource_id"], json.dumps(t, ensure_ascii=False)),
+                )
+        if recitation_id and v.get("audio"):
+            conn.execute(
+                "INSERT OR REPLACE INTO audio (verse_id, recitation_id, data) VALUES (?, ?, ?)",
+                (v["id"], int(recitation_id), json.dumps(v["audio"], ensure_ascii=False)),
+            )
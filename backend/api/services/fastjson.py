@@ -0,0 +1,102 @@
+"""
+JSON encode/decode with orjson (stdlib json when it is not installed), and RawJSON: a decoded
+object that keeps its encoded bytes so the renderer can send them as-is instead of re-encoding.
+"""
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def dumps(value, indent=False, default=str):
+    """Compact (or 2-space indented) UTF-8 JSON bytes; `default` converts objects JSON has no type for."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(value, default=default, option=option)
+    return json.dumps(
+        value, default=default, ensure_ascii=False, indent=2 if indent else None, separators=None if indent else (",", ":")
+    ).encode()
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class RawJSON(dict):
+    """
+    A JSON object plus the bytes it was decoded from (or encoded to). Treated read-only like every
+    cached value; top-level mutation drops the bytes so a changed object is never sent stale.
+    """
+
+    __slots__ = ("raw", "_etag")
+
+    def __init__(self, data, raw):
+        super().__init__(data)
+        self.raw = raw
+        self._etag = None
+
+    def __reduce__(self):
+        return (RawJSON, (dict(self), self.raw))
+
+    @property
+    def etag(self):
+        if self._etag is None and self.raw is not None:
+            self._etag = '"%s"' % hashlib.md5(self.raw, usedforsecurity=False).hexdigest()
+        return self._etag
+
+    def _changed(self):
+        self.raw = None
+        self._etag = None
+
+    def __setitem__(self, key, value):
+        self._changed()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._changed()
+        super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self._changed()
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._changed()
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self._changed()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._changed()
+        return super().popitem()
+
+    def clear(self):
+        self._changed()
+        super().clear()
+
+
+def raw_of(value):
+    """Encoded bytes carried by `value`, or None."""
+    return getattr(value, "raw", None)
+
+
+def with_raw(value, raw):
+    """`value` as a RawJSON carrying `raw` (only JSON objects can carry bytes; anything else is returned as-is)."""
+    if isinstance(value, RawJSON) and value.raw is raw:
+        return value
+    if isinstance(value, dict):
+        return RawJSON(value, raw)
+    return value
+
+
+def decode(raw):
+    """Decode upstream or cached bytes, keeping them for passthrough."""
+    return with_raw(loads(raw), raw)
@@ -0,0 +1,235 @@
+"""
+In-process metrics (counters, latency histograms, gauges) rendered in Prometheus text format.
+Each Gunicorn worker snapshots its metrics to METRICS_DIR/<pid>-<process start time>.json;
+/api/metrics/ sums the snapshots of live workers, so the endpoint reports the whole server whichever
+worker answers it. Snapshots of exited workers are deleted - their counters drop out, which
+Prometheus treats as a counter reset - and the start time keeps a reused pid from adopting one.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv  # type: ignore
+
+load_dotenv()
+
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "quran-academy-metrics"))
+FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HELP = {
+    "quran_upstream_requests_total": ("counter", "Upstream HTTP requests by host, method and status"),
+    "quran_upstream_request_seconds": ("histogram", "Upstream HTTP request latency"),
+    "quran_upstream_admission_wait_seconds": ("histogram", "Time upstream calls waited for admission (rate limit and in-flight slots)"),
+    "quran_cache_requests_total": ("counter", "Response cache lookups by function and result"),
+    "quran_cache_operation_seconds": ("histogram", "Shared (L2) cache get/set latency"),
+    "quran_client_fetch_seconds": ("histogram", "quran_client fetch latency on cache miss, by function"),
+    "quran_http_requests_total": ("counter", "API requests by route, method and status"),
+    "quran_http_request_seconds": ("histogram", "API request latency by route"),
+    "quran_render_seconds": ("histogram", "Response rendering (serialization) latency by view"),
+    "quran_upstream_connections_opened": ("gauge", "Upstream connections opened by the current worker pools"),
+    "quran_upstream_idle_connections": ("gauge", "Idle keep-alive upstream connections"),
+    "quran_circuit_open": ("gauge", "Workers whose circuit breaker for the host is open"),
+    "quran_cache_l1_bytes": ("gauge", "In-process response cache size"),
+    "quran_qf_token_fetches_total": ("counter", "quran.foundation OAuth token fetches by trigger (request = no token yet) and result"),
+    "quran_audio_cache_requests_total": ("counter", "Audio proxy disk cache lookups (hit, miss) and prefetched files"),
+    "quran_audio_cache_evictions_total": ("counter", "Audio files evicted from the disk cache"),
+    "quran_tafsir_store_total": ("counter", "Per-verse tafsir store lookups (lru_hit, hit, miss, no_text) and chapter fetches"),
+    "quran_tafsir_fetches_total": ("counter", "Tafsir fetches by winning source (qf, quran_com, failed) and whether api.quran.com was raced"),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_collectors = []
+_last_flush = 0.0
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+
+
+class timer:
+    """`with metrics.timer("name", label=...):` observes the block's duration."""
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.monotonic() - self.started, **self.labels)
+
+
+def register_collector(func):
+    """`func()` returns [(gauge_name, labels, value)] sampled at snapshot time."""
+    _collectors.append(func)
+    return func
+
+
+def snapshot():
+    with _lock:
+        counters = [[name, dict(labels), value] for (name, labels), value in _counters.items()]
+        histograms = [
+            [name, dict(labels), list(h["buckets"]), h["sum"], h["count"]] for (name, labels), h in _histograms.items()
+        ]
+    gauges = []
+    for collect in _collectors:
+        try:
+            gauges.extend([name, labels, value] for name, labels, value in collect())
+        except Exception:
+            pass
+    return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+
+def _start_time(pid):
+    """Start time of process `pid` in clock ticks since boot (Linux), or None."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name start at field 3; starttime is field 22
+    return stat.rsplit(")", 1)[1].split()[19]
+
+
+_identity = {"pid": None, "name": None}
+
+
+def _snapshot_name():
+    pid = os.getpid()
+    if _identity["pid"] != pid:
+        start = _start_time(pid)
+        _identity.update(pid=pid, name=f"{pid}-{start}.json" if start else f"{pid}.json")
+    return _identity["name"]
+
+
+def flush(force=False):
+    """Write this worker's snapshot (at most every FLUSH_INTERVAL seconds unless forced)."""
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    try:
+        Path(METRICS_DIR).mkdir(parents=True, exist_ok=True)
+        path = os.path.join(METRICS_DIR, _snapshot_name())
+        fd, tmp = tempfile.mkstemp(dir=METRICS_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _is_current(name):
+    """Whether snapshot file `name` (<pid>[-<start time>].json) belongs to a running process."""
+    pid, _, start = name[:-5].partition("-")
+    pid = int(pid)
+    if start and _start_time(pid) is not None:
+        return _start_time(pid) == start
+    return _alive(pid)
+
+
+def _aggregate():
+    counters, histograms, gauges = {}, {}, {}
+    snapshots = []
+    try:
+        names = [n for n in os.listdir(METRICS_DIR) if n.endswith(".json")]
+    except OSError:
+        names = []
+    for name in names:
+        path = os.path.join(METRICS_DIR, name)
+        try:
+            if not _is_current(name):
+                os.unlink(path)
+                continue
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    for snap in snapshots:
+        for name, labels, value in snap["counters"]:
+            key = (name, _labels_key(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snap["histograms"]:
+            key = (name, _labels_key(labels))
+            agg = histograms.setdefault(key, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            agg["buckets"] = [a + b for a, b in zip(agg["buckets"], buckets)]
+            agg["sum"] += total
+            agg["count"] += count
+        for name, labels, value in snap["gauges"]:
+            key = (name, _labels_key(labels))
+            gauges[key] = gauges.get(key, 0) + value
+    return counters, histograms, gauges
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render():
+    """Prometheus text exposition (format 0.0.4) of all workers' metrics."""
+    flush(force=True)
+    counters, histograms, gauges = _aggregate()
+    lines = []
+    by_name = {}
+    for (name, labels), value in sorted(counters.items()):
+        by_name.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        by_name.setdefault(name, []).append(f"{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), h in sorted(histograms.items()):
+        rows = by_name.setdefault(name, [])
+        for bound, count in zip(BUCKETS, h["buckets"]):
+            rows.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {count}")
+        rows.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {h['count']}")
+        rows.append(f"{name}_sum{_fmt_labels(labels)} {h['sum']}")
+        rows.append(f"{name}_count{_fmt_labels(labels)} {h['count']}")
+    for name in sorted(by_name):
+        kind, text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(by_name[name])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,179 @@
+"""
+Mushaf navigation index. Verse counts per chapter and juz boundaries are bundled; page, hizb and
+rub el hizb boundaries come from the file `python manage.py build_navigation_index` writes from the
+corpus store. Everything is expanded into arrays indexed by verse id (1-6236), so views validate
+chapter, juz, page and verse references locally and /api/navigation/locate/ needs no upstream call.
+"""
+import json
+import os
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from dotenv import load_dotenv  # type: ignore
+
+load_dotenv()
+
+INDEX_PATH = os.getenv(
+    "QURAN_NAVIGATION_INDEX_PATH",
+    str(Path(__file__).resolve().parent.parent.parent / "data" / "navigation_index.json"),
+)
+
+VERSE_COUNTS = (
+    7, 286, 200, 176, 120, 165, 206, 75, 129, 109, 123, 111, 43, 52, 99, 128, 111, 110, 98, 135,
+    112, 78, 118, 64, 77, 227, 93, 88, 69, 60, 34, 30, 73, 54, 45, 83, 182, 88, 75, 85,
+    54, 53, 89, 59, 37, 35, 38, 29, 18, 45, 60, 49, 62, 55, 78, 96, 29, 22, 24, 13,
+    14, 11, 11, 18, 12, 12, 30, 52, 52, 44, 28, 28, 20, 56, 40, 31, 50, 40, 46, 42,
+    29, 19, 36, 25, 22, 17, 19, 26, 30, 20, 15, 21, 11, 8, 8, 19, 5, 8, 8, 11,
+    11, 8, 3, 9, 5, 4, 7, 3, 6, 3, 5, 4, 5, 6,
+)
+JUZ_STARTS = (
+    "1:1", "2:142", "2:253", "3:93", "4:24", "4:148", "5:82", "6:111", "7:88", "8:41",
+    "9:93", "11:6", "12:53", "15:1", "17:1", "18:75", "21:1", "23:1", "25:21", "27:56",
+    "29:46", "33:31", "36:28", "39:32", "41:47", "46:1", "51:31", "58:1", "67:1", "78:1",
+)
+TOTAL_VERSES = sum(VERSE_COUNTS)
+# A missing or unreadable index file is looked for again after this long (build_navigation_index may run meanwhile)
+RETRY_SECONDS = 30
+# Divisions of the Madani Mushaf; the index file lists the first verse of each
+SIZES = {"chapter": len(VERSE_COUNTS), "juz": len(JUZ_STARTS), "page": 604, "hizb": 60, "rub": 240}
+# locate() field name per division, as in api.quran.com verse objects
+FIELDS = {"chapter": "chapter_id", "juz": "juz_number", "page": "page_number", "hizb": "hizb_number",
+          "rub": "rub_el_hizb_number"}
+
+# _CHAPTER_START[c] = id of verse c:1, with a sentinel past the last chapter
+_CHAPTER_START = array("H", [0, 1])
+for _count in VERSE_COUNTS:
+    _CHAPTER_START.append(_CHAPTER_START[-1] + _count)
+
+_lock = threading.Lock()
+# Per division: "starts" (first verse id of each, 1-based, plus sentinel) and "of" (division of each verse id)
+_divisions = {}
+_loaded = {"checked_at": None}
+
+
+class IndexUnavailable(Exception):
+    """Page, hizb and rub lookups need the index file (build_navigation_index)."""
+
+
+def _division(starts):
+    starts = array("H", [0, *starts, TOTAL_VERSES + 1])
+    of = array("H", [0]) * (TOTAL_VERSES + 1)
+    for number in range(1, len(starts) - 1):
+        for verse_id in range(starts[number], starts[number + 1]):
+            of[verse_id] = number
+    return {"starts": starts, "of": of}
+
+
+def verse_id(chapter, number):
+    """Global id of verse chapter:number (1:1 = 1), or None when it does not exist."""
+    if not (isinstance(chapter, int) and isinstance(number, int)):
+        return None
+    if not 1 <= chapter <= len(VERSE_COUNTS) or not 1 <= number <= VERSE_COUNTS[chapter - 1]:
+        return None
+    return _CHAPTER_START[chapter] + number - 1
+
+
+def parse_verse_key(key):
+    """"2:255" -> global verse id, or None for malformed keys and verses that do not exist."""
+    chapter, sep, number = str(key).strip().partition(":")
+    if not sep or not chapter.isdigit() or not number.isdigit():
+        return None
+    return verse_id(int(chapter), int(number))
+
+
+def verse_key(verse_id):
+    chapter = _divisions["chapter"]["of"][verse_id]
+    return f"{chapter}:{verse_id - _CHAPTER_START[chapter] + 1}"
+
+
+def is_valid(division, number):
+    """Whether `number` (int or digit string) names an existing chapter, juz, page, hizb or rub."""
+    try:
+        return 1 <= int(number) <= SIZES[division]
+    except (TypeError, ValueError):
+        return False
+
+
+def _from_keys(name, keys):
+    ids = [parse_verse_key(key) for key in keys]
+    if len(ids) != SIZES[name] or None in ids or ids[0] != 1 or ids != sorted(set(ids)):
+        raise ValueError(f"Navigation index: bad {name} boundaries")
+    return _division(ids)
+
+
+def load(path=None):
+    """
+    Read the index file: `path` now, the configured one once per process - or again every RETRY_SECONDS
+    while it is missing or invalid. Returns whether the index is available.
+    """
+    with _lock:
+        if path is None:
+            if "page" in _divisions:
+                return True
+            now = time.monotonic()
+            if _loaded["checked_at"] is not None and now - _loaded["checked_at"] < RETRY_SECONDS:
+                return False
+            _loaded["checked_at"] = now
+        try:
+            with open(path or INDEX_PATH, "rb") as f:
+                data = json.load(f)
+            for name in ("page", "hizb", "rub"):
+                _divisions[name] = _from_keys(name, data[name])
+        except (OSError, ValueError, KeyError):
+            for name in ("page", "hizb", "rub"):
+                _divisions.pop(name, None)
+        return "page" in _divisions
+
+
+def _get(division):
+    if division not in _divisions and not load():
+        raise IndexUnavailable(division)
+    return _divisions[division]
+
+
+def locate_verse(verse_id):
+    """Where verse `verse_id` sits: its key, chapter and juz, plus page, hizb and rub when the index is built."""
+    chapter = _divisions["chapter"]["of"][verse_id]
+    found = {
+        "verse_key": verse_key(verse_id),
+        "verse_id": verse_id,
+        "chapter_id": chapter,
+        "verse_number": verse_id - _CHAPTER_START[chapter] + 1,
+    }
+    for division in ("juz", "page", "hizb", "rub"):
+        try:
+            found[FIELDS[division]] = _get(division)["of"][verse_id]
+        except IndexUnavailable:
+            found[FIELDS[division]] = None
+    return found
+
+
+def chapters_in(division, number):
+    """Chapters that chapter/juz/page/hizb/rub `number` spans, in order. Raises like locate()."""
+    if not is_valid(division, number):
+        raise ValueError(f"Unknown {division}: {number}")
+    starts = _get(division)["starts"]
+    number = int(number)
+    of = _divisions["chapter"]["of"]
+    return list(range(of[starts[number]], of[starts[number + 1] - 1] + 1))
+
+
+def locate(division, number):
+    """First and last verse of chapter/juz/page/hizb/rub `number`. Raises IndexUnavailable, ValueError if out of range."""
+    if not is_valid(division, number):
+        raise ValueError(f"Unknown {division}: {number}")
+    starts = _get(division)["starts"]
+    number = int(number)
+    first, last = starts[number], starts[number + 1] - 1
+    return {
+        FIELDS[division]: number,
+        "verses_count": last - first + 1,
+        "first_verse": locate_verse(first),
+        "last_verse": locate_verse(last),
+    }
+
+
+_divisions["chapter"] = _division(_CHAPTER_START[1:-1])
+_divisions["juz"] = _from_keys("juz", JUZ_STARTS)
@@ -1,9 +1,10 @@
 """
 Quran Foundation User API - collections, bookmarks (requires OAuth2 tokens).
 """
-import requests
 from django.conf import settings
 
+from . import upstream
+
 
 def get_qf_api_headers(access_token):
     """Build headers for QF User API."""
@@ -20,7 +21,7 @@ def qf_get(access_token, path, params=None):
     from api.qf_oauth import get_qf_config
     cfg = get_qf_config()
     url = f"{cfg['api_base_url']}/auth/v1{path}"
-    r = requests.get(url, headers=get_qf_api_headers(access_token), params=params)
+    r = upstream.get(url, headers=get_qf_api_headers(access_token), params=params)
     r.raise_for_status()
     return r.json()
 
@@ -30,7 +31,7 @@ def qf_post(access_token, path, json_data=None):
     from api.qf_oauth import get_qf_config
     cfg = get_qf_config()
     url = f"{cfg['api_base_url']}/auth/v1{path}"
-    r = requests.post(url, headers=get_qf_api_headers(access_token), json=json_data)
+    r = upstream.post(url, headers=get_qf_api_headers(access_token), json=json_data)
     r.raise_for_status()
     return r.json() if r.content else {}
 
@@ -40,6 +41,6 @@ def qf_delete(access_token, path):
     from api.qf_oauth import get_qf_config
     cfg = get_qf_config()
     url = f"{cfg['api_base_url']}/auth/v1{path}"
-    r = requests.delete(url, headers=get_qf_api_headers(access_token))
+    r = upstream.delete(url, headers=get_qf_api_headers(access_token))
     r.raise_for_status()
     return r.json() if r.content else {}
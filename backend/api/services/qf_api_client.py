@@ -3,15 +3,11 @@ Quran Foundation Content API client.
 Uses OAuth2 client_credentials for tafsir and other content.
 """
 import os
-import time
-import threading
-import requests
 from dotenv import load_dotenv  # type: ignore
 
-load_dotenv()
+from . import fastjson, qf_token, upstream
 
-_token_cache = {"token": None, "expires_at": 0}
-_token_lock = threading.Lock()
+load_dotenv()
 
 ENV_CONFIG = {
     "prelive": {
@@ -35,44 +31,16 @@ def _get_config():
     return {
         "client_id": client_id,
         "client_secret": client_secret,
-        "auth_base_url": cfg["auth_base_url"],
-        "api_base_url": cfg["api_base_url"],
+        "auth_base_url": os.getenv("QF_AUTH_BASE_URL") or cfg["auth_base_url"],
+        "api_base_url": os.getenv("QF_API_BASE_URL") or cfg["api_base_url"],
     }
 
 
-def _get_access_token():
-    config = _get_config()
-    if not config:
-        return None
-    buffer_seconds = 30
-    if _token_cache["token"] and time.time() < _token_cache["expires_at"] - buffer_seconds:
-        return _token_cache["token"]
-    with _token_lock:
-        if _token_cache["token"] and time.time() < _token_cache["expires_at"] - buffer_seconds:
-            return _token_cache["token"]
-        try:
-            response = requests.post(
-                f"{config['auth_base_url']}/oauth2/token",
-                auth=(config["client_id"], config["client_secret"]),
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-                data="grant_type=client_credentials&scope=content",
-                timeout=10,
-            )
-            response.raise_for_status()
-            data = response.json()
-            _token_cache["token"] = data["access_token"]
-            _token_cache["expires_at"] = time.time() + data.get("expires_in", 3600)
-            return _token_cache["token"]
-        except Exception:
-            _token_cache["token"] = None
-            return None
-
-
 def _call_qf_api(endpoint, params=None):
     config = _get_config()
     if not config:
         return None
-    token = _get_access_token()
+    token = qf_token.get_token(config)
     if not token:
         return None
     headers = {
@@ -80,25 +48,26 @@ def _call_qf_api(endpoint, params=None):
         "x-client-id": config["client_id"],
     }
     try:
-        response = requests.get(
+        response = upstream.get(
             f"{config['api_base_url']}{endpoint}",
             headers=headers,
             params=params or {},
             timeout=15,
         )
         if response.status_code == 401:
-            _token_cache["token"] = None
-            token = _get_access_token()
+            # Renewal happens in the background; retry only if another worker already has a new token
+            qf_token.invalidate(config, token)
+            token = qf_token.peek_token(config)
             if token:
                 headers["x-auth-token"] = token
-                response = requests.get(
+                response = upstream.get(
                     f"{config['api_base_url']}{endpoint}",
                     headers=headers,
                     params=params or {},
                     timeout=15,
                 )
         response.raise_for_status()
-        return response.json()
+        return fastjson.decode(response.content)
     except Exception:
         return None
 
@@ -127,3 +96,11 @@ def get_tafsir_by_verse(tafsir_id, verse_key=None, chapter_number=None):
     if not params:
         return None
     return _call_qf_api(f"/content/api/v4/quran/tafsirs/{tafsir_id}", params=params)
+
+
+def get_content(path, params=None):
+    """
+    GET an api.quran.com v4 path (e.g. "/chapters") from the QF Content API, which mirrors it.
+    Used as the fallback when api.quran.com is down. Returns None if credentials missing or request fails.
+    """
+    return _call_qf_api(f"/content/api/v4{path}", params=params)
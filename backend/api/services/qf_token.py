@@ -0,0 +1,163 @@
+"""
+Quran Foundation client_credentials token shared by all workers. The token lives in the Django
+cache (Redis in production), so workers fetch one between them under a cross-process lock, and a
+background thread per worker renews it QF_TOKEN_REFRESH_MARGIN seconds before it expires. Requests
+only wait on the OAuth server when no worker holds a token yet (first request after a deploy).
+"""
+import os
+import threading
+import time
+
+from django.core.cache import cache
+from dotenv import load_dotenv  # type: ignore
+
+from . import metrics, upstream
+
+load_dotenv()
+
+# Renew this long before expiry (at most half the token's lifetime)
+REFRESH_MARGIN = int(os.getenv("QF_TOKEN_REFRESH_MARGIN", "300"))
+# A token this close to expiry is not used at all
+EXPIRY_BUFFER = 30
+# Upper bound on one token request, and on a worker holding the fetch lock
+FETCH_TIMEOUT = 10
+# Background retry delays after failed renewals (seconds)
+RETRY_DELAYS = (5, 15, 30, 60)
+
+_lock = threading.Lock()
+_wake = threading.Event()
+_refresher = {"thread": None, "pid": None}
+# This worker's copy of the shared entry, so the hot path needs no cache round trip
+_current = {"key": None, "config": None, "token": None, "expires_at": 0, "lifetime": 0}
+
+
+def _cache_key(config):
+    return f"qf:token:v1:{config['auth_base_url']}:{config['client_id']}"
+
+
+def _usable(entry):
+    return bool(entry and entry["token"]) and time.time() < entry["expires_at"] - EXPIRY_BUFFER
+
+
+def _due(entry):
+    return time.time() >= entry["expires_at"] - min(REFRESH_MARGIN, entry["lifetime"] / 2)
+
+
+def _fetch(config):
+    response = upstream.post(
+        f"{config['auth_base_url']}/oauth2/token",
+        auth=(config["client_id"], config["client_secret"]),
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        data="grant_type=client_credentials&scope=content",
+        timeout=FETCH_TIMEOUT,
+    )
+    response.raise_for_status()
+    data = response.json()
+    lifetime = int(data.get("expires_in", 3600))
+    return {"token": data["access_token"], "expires_at": time.time() + lifetime, "lifetime": lifetime}
+
+
+def _renew(config, trigger):
+    """
+    A fresh shared entry: fetched under the cross-worker lock, or taken from the worker that holds it.
+    Returns None when the fetch fails or the lock holder produces nothing in time.
+    """
+    key = _cache_key(config)
+    lock_key = f"{key}:lock"
+    # cache.add is atomic in Redis, so exactly one worker wins the lock
+    if not cache.add(lock_key, 1, timeout=FETCH_TIMEOUT + 5):
+        deadline = time.monotonic() + FETCH_TIMEOUT + 5
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if _usable(entry) and not _due(entry):
+                return entry
+            if cache.get(lock_key) is None:
+                break
+        return None
+    try:
+        entry = cache.get(key)
+        if _usable(entry) and not _due(entry):  # renewed by another worker meanwhile
+            return entry
+        entry = _fetch(config)
+        cache.set(key, entry, timeout=entry["lifetime"])
+        metrics.inc("quran_qf_token_fetches_total", trigger=trigger, result="ok")
+        return entry
+    except Exception:
+        metrics.inc("quran_qf_token_fetches_total", trigger=trigger, result="error")
+        return None
+    finally:
+        cache.delete(lock_key)
+
+
+def _adopt(config, entry):
+    _current.update(entry, key=_cache_key(config), config=config)
+
+
+def _refresh_loop():
+    failures = 0
+    while True:
+        if failures:
+            delay = RETRY_DELAYS[min(failures, len(RETRY_DELAYS)) - 1]
+        else:
+            delay = _current["expires_at"] - min(REFRESH_MARGIN, _current["lifetime"] / 2) - time.time()
+        _wake.wait(max(delay, 0))
+        _wake.clear()
+        config = _current["config"]
+        entry = cache.get(_cache_key(config))
+        if not (_usable(entry) and not _due(entry)):
+            entry = _renew(config, "refresh")
+        if entry is None:
+            failures += 1
+            continue
+        failures = 0
+        with _lock:
+            if _current["config"] is config:
+                _adopt(config, entry)
+
+
+def _ensure_refresher():
+    # A thread started before a fork (preloaded app) does not exist in the child
+    if _refresher["pid"] != os.getpid():
+        _refresher["pid"] = os.getpid()
+        _refresher["thread"] = threading.Thread(target=_refresh_loop, name="qf-token-refresh", daemon=True)
+        _refresher["thread"].start()
+
+
+def get_token(config):
+    """Access token for `config` (qf_api_client._get_config()), or None if none can be had."""
+    key = _cache_key(config)
+    if _current["key"] == key and _usable(_current):
+        return _current["token"]
+    with _lock:
+        if _current["key"] == key and _usable(_current):
+            return _current["token"]
+        entry = cache.get(key)
+        if not _usable(entry):
+            entry = _renew(config, "request")
+        if entry is None:
+            return None
+        _adopt(config, entry)
+        _ensure_refresher()
+        return entry["token"]
+
+
+def peek_token(config):
+    """A usable token for `config` if one is already held here or in the shared cache; never fetches."""
+    key = _cache_key(config)
+    if _current["key"] == key and _usable(_current):
+        return _current["token"]
+    entry = cache.get(key)
+    return entry["token"] if _usable(entry) else None
+
+
+def invalidate(config, token):
+    """The API rejected `token`: forget it here and in the shared cache (if still there) and renew in the background."""
+    key = _cache_key(config)
+    with _lock:
+        if _current["key"] == key and _current["token"] == token:
+            _current.update(token=None, expires_at=0)
+    entry = cache.get(key)
+    if entry and entry["token"] == token:
+        cache.delete(key)
+    _wake.set()
@@ -1,194 +1,554 @@
 """
 Quran.com API client - proxies requests to api.quran.com
 """
+import functools
 import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, TimeoutError as FutureTimeout, wait
+
 import requests
 from dotenv import load_dotenv
 
+from . import corpus, fastjson, metrics, navigation, search_index, tafsir_store, upstream
+from .response_cache import cached
+
 load_dotenv()
 
 QURAN_API_BASE = os.getenv("QURAN_API_BASE", "https://api.quran.com/api/v4")
+# "upstream" (default) or "local": answer chapter/verse/page/juz lookups from the corpus store
+# built by `manage.py ingest_corpus` (and search from `build_search_index`), falling back to
+# api.quran.com for anything they do not hold
+QURAN_CLIENT_BACKEND = os.getenv("QURAN_CLIENT_BACKEND", "upstream")
+# Upper bound on verses resolved by one get_verses_batch call, after ranges are expanded
+MAX_BATCH_VERSES = int(os.getenv("MAX_BATCH_VERSES", "300"))
+# api.quran.com's per_page ceiling; batch lookups fetch chapters in windows of this size
+BATCH_WINDOW = 50
+# Pages in flight ahead of the one being written by the NDJSON stream views
+STREAM_PREFETCH = int(os.getenv("STREAM_PREFETCH", "4"))
+# Upstream `fields` for chapter/juz verse lists and for Mushaf pages (which always carry tajweed and audio)
+VERSE_FIELDS = "text_uthmani,translations"
+PAGE_FIELDS = "text_uthmani,translations,text_uthmani_tajweed,audio"
+# Seconds a tajweed=true request waits for Quran Foundation before answering without its HTML tajweed
+QF_TAJWEED_DEADLINE = float(os.getenv("QF_TAJWEED_DEADLINE", "2.5"))
+# Seconds to wait for QF tafsir before racing api.quran.com against it; "auto" = recent QF p90
+TAFSIR_HEDGE_DELAY = os.getenv("TAFSIR_HEDGE_DELAY", "0.8")
+# Serve single-verse tafsir from chapters fetched once and stored per verse (services/tafsir_store.py)
+TAFSIR_STORE = os.getenv("TAFSIR_STORE", "1").lower() in ("1", "true", "yes")
+
+_tafsir_stats = {"qf": 0, "quran_com": 0, "hedged": 0, "failed": 0}
+_qf_tafsir_latencies = deque(maxlen=200)
+_tafsir_lock = threading.Lock()
+
+
+def _use_local():
+    return QURAN_CLIENT_BACKEND == "local" and corpus.is_available()
+
+
+def _get_json(path, params=None, local=None):
+    """
+    GET an api.quran.com v4 path. If api.quran.com fails (network, 5xx, open circuit) the same path
+    is tried on the Quran Foundation Content API mirror, then `local()` (the corpus store) when given.
+    Stale cache entries are served before any of this by response_cache. Client errors (4xx) raise
+    as-is; UpstreamUnavailable means every source failed.
+    """
+    shed = None
+    try:
+        r = upstream.get(f"{QURAN_API_BASE}{path}", params=params)
+        r.raise_for_status()
+        return fastjson.decode(r.content)
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code < 500:
+            raise
+    except upstream.Overloaded as e:
+        shed = e
+    except requests.RequestException:
+        pass
+    from .qf_api_client import get_content
+
+    data = get_content(path, params=params)
+    if data is None and local is not None:
+        data = local()
+    if data is None:
+        # Shed calls keep their short Retry-After
+        raise shed or upstream.UpstreamUnavailable(f"No upstream could answer {path}")
+    return data
+
+
+def _is_tajweed_html(html):
+    return bool(html) and ("<tajweed" in html or "<span" in html)
+
+
+def _chapter_of(verse_key):
+    return int(verse_key.split(":", 1)[0])
+
 
+@cached("text")
+def get_tajweed_map(chapter_number):
+    """verse_key -> QF HTML tajweed for a whole chapter. Fetched once, then sliced per page by callers."""
+    from .qf_api_client import get_verses_uthmani_tajweed
 
+    qf_data = get_verses_uthmani_tajweed(chapter_number=chapter_number)
+    if not qf_data or not qf_data.get("verses"):
+        return None
+    return {
+        v["verse_key"]: v["text_uthmani_tajweed"]
+        for v in qf_data["verses"]
+        if _is_tajweed_html(v.get("text_uthmani_tajweed"))
+    }
+
+
+def _merge_tajweed(data, maps):
+    """Copy of `data` with QF HTML tajweed swapped in from per-chapter maps (cached responses are never mutated)."""
+    if not any(maps.values()):
+        return data
+    verses = []
+    for v in data.get("verses", []):
+        key = v.get("verse_key")
+        html = (maps.get(_chapter_of(key)) or {}).get(key) if key else None
+        if html:
+            v = {**v, "text_uthmani_tajweed": html}
+        verses.append(v)
+    return {**data, "verses": verses}
+
+
+def _with_tajweed(fetch_verses, chapters=()):
+    """
+    Merge QF tajweed from per-chapter maps into a verses response, waiting at most QF_TAJWEED_DEADLINE.
+    Maps for `chapters` are fetched concurrently with the verses; chapters of the verses not listed
+    there are read off the verses once they arrive. Late maps finish in the background and land in
+    the cache; meanwhile verses go out with api.quran.com's tajweed text.
+    """
+    started = time.monotonic()
+    futures = {int(chapter): upstream.submit(get_tajweed_map, int(chapter)) for chapter in chapters}
+    data = fetch_verses()
+    for v in data.get("verses", []):
+        if v.get("verse_key"):
+            chapter = _chapter_of(v["verse_key"])
+            if chapter not in futures:
+                futures[chapter] = upstream.submit(get_tajweed_map, chapter)
+    maps = {}
+    for chapter, future in futures.items():
+        try:
+            maps[chapter] = future.result(timeout=max(QF_TAJWEED_DEADLINE - (time.monotonic() - started), 0))
+        except Exception:
+            maps[chapter] = None
+    return _merge_tajweed(data, maps)
+
+
+@cached("text")
 def get_chapters(language="en"):
     """Fetch all 114 chapters (surahs)."""
-    r = requests.get(f"{QURAN_API_BASE}/chapters", params={"language": language})
-    r.raise_for_status()
-    return r.json()
+    if _use_local():
+        data = corpus.get_chapters(language=language)
+        if data is not None:
+            return data
+    return _get_json("/chapters", {"language": language}, local=lambda: corpus.get_chapters(language=language))
 
 
+@cached("text")
 def get_chapter(chapter_id, language="en"):
     """Fetch single chapter metadata."""
-    r = requests.get(f"{QURAN_API_BASE}/chapters/{chapter_id}", params={"language": language})
-    r.raise_for_status()
-    return r.json()
+    if _use_local():
+        data = corpus.get_chapter(chapter_id, language=language)
+        if data is not None:
+            return data
+    return _get_json(
+        f"/chapters/{chapter_id}", {"language": language}, local=lambda: corpus.get_chapter(chapter_id, language=language)
+    )
 
 
-def get_verses(chapter_id, translations="131", audio=1, words=False, tafsirs=None, page=1, per_page=20, tajweed=False):
-    """Fetch verses for a chapter with translations, audio, optional word-by-word, tafsir, and tajweed."""
-    fields = "text_uthmani,translations"
+def verse_fields(base, words=False, tajweed=False):
+    """Upstream `fields` value: `base` plus words and tajweed text when asked for."""
+    fields = base.split(",") if base else []
     if words:
-        fields += ",words"
+        fields.append("words")
     if tajweed:
-        fields += ",text_uthmani_tajweed"
-    params = {
-        "translations": translations,
-        "audio": audio,
-        "words": "true" if words else "false",
-        "page": page,
-        "per_page": per_page,
-        "fields": fields,
-    }
+        fields.append("text_uthmani_tajweed")
+    return ",".join(dict.fromkeys(fields))
+
+
+def _verse_params(translations, audio, words, fields, **extra):
+    params = {"words": "true" if words else "false", "fields": fields, **extra}
+    if translations:
+        params["translations"] = translations
+    if audio:
+        params["audio"] = audio
+    return params
+
+
+@cached("text")
+def _fetch_verses(chapter_id, translations, audio, words, tafsirs, page, per_page, tajweed, fields=None):
+    if fields is None:
+        fields = verse_fields(VERSE_FIELDS, words, tajweed)
+    params = _verse_params(translations, audio, words, fields, page=page, per_page=per_page)
     if tafsirs:
         params["tafsirs"] = tafsirs
-    r = requests.get(
-        f"{QURAN_API_BASE}/verses/by_chapter/{chapter_id}",
-        params=params,
+    local = None
+    if corpus.can_serve_verses(translations, audio, words, tafsirs):
+        local = functools.partial(
+            corpus.get_verses, chapter_id, fields, translations=translations, audio=audio, page=page, per_page=per_page
+        )
+        if _use_local():
+            return local()
+    return _get_json(f"/verses/by_chapter/{chapter_id}", params, local=local)
+
+
+def get_verses(
+    chapter_id, translations="131", audio=1, words=False, tafsirs=None, page=1, per_page=20, tajweed=False, fields=None
+):
+    """
+    Fetch verses for a chapter with translations, audio, optional word-by-word, tafsir, and tajweed.
+    `fields` overrides the upstream field list (see api/projection.py); falsy translations/audio are not requested.
+    """
+    fetch = functools.partial(
+        _fetch_verses, chapter_id, translations, audio, words, tafsirs, page, per_page, tajweed, fields=fields
     )
-    r.raise_for_status()
-    data = r.json()
-
-    if tajweed:
+    if not tajweed:
+        return fetch()
+    return _with_tajweed(fetch, chapters=[chapter_id])
+
+
+def expand_verse_keys(specs):
+    """
+    ["2:255", "1:1-7"] -> ordered, de-duplicated verse keys.
+    Raises ValueError for malformed keys, verses that do not exist, or more than MAX_BATCH_VERSES verses.
+    """
+    keys = []
+    seen = set()
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
         try:
-            from .qf_api_client import get_verses_uthmani_tajweed
-
-            qf_data = get_verses_uthmani_tajweed(chapter_number=chapter_id)
-            if qf_data and qf_data.get("verses"):
-                qf_by_key = {v["verse_key"]: v.get("text_uthmani_tajweed") for v in qf_data["verses"]}
-                for v in data.get("verses", []):
-                    key = v.get("verse_key")
-                    if key and qf_by_key.get(key) and ("<tajweed" in str(qf_by_key[key]) or "<span" in str(qf_by_key[key])):
-                        v["text_uthmani_tajweed"] = qf_by_key[key]
-        except Exception:
-            pass
-
-    return data
+            chapter, numbers = spec.split(":")
+            first, _, last = numbers.partition("-")
+            chapter, first, last = int(chapter), int(first), int(last or first)
+        except ValueError:
+            raise ValueError(f"Invalid verse key: {spec}")
+        if first > last or navigation.verse_id(chapter, first) is None or navigation.verse_id(chapter, last) is None:
+            raise ValueError(f"Invalid verse key: {spec}")
+        if len(keys) + (last - first + 1) > MAX_BATCH_VERSES:
+            raise ValueError(f"At most {MAX_BATCH_VERSES} verses per batch")
+        for number in range(first, last + 1):
+            key = f"{chapter}:{number}"
+            if key not in seen:
+                seen.add(key)
+                keys.append(key)
+    return keys
+
+
+def get_verses_batch(verse_keys, translations="131", audio=1, words=False, fields=None):
+    """
+    Verses for many keys in request order. Keys are grouped into per-chapter windows of
+    BATCH_WINDOW verses, each fetched once (through get_verses and its cache) in parallel.
+    """
+    windows = []
+    for key in verse_keys:
+        chapter, number = (int(p) for p in key.split(":"))
+        window = (chapter, (number - 1) // BATCH_WINDOW + 1)
+        if window not in windows:
+            windows.append(window)
+    futures = [
+        upstream.submit(
+            get_verses,
+            chapter,
+            translations=translations,
+            audio=audio,
+            words=words,
+            page=page,
+            per_page=BATCH_WINDOW,
+            fields=fields,
+        )
+        for chapter, page in windows
+    ]
+    by_key = {}
+    for future in futures:
+        for v in future.result().get("verses", []):
+            by_key[v["verse_key"]] = v
+    return {
+        "verses": [by_key[k] for k in verse_keys if k in by_key],
+        "missing": [k for k in verse_keys if k not in by_key],
+    }
 
 
-def get_verses_by_juz(juz_number, translations="131", page=1, per_page=20, tajweed=False):
+def _stream_pages(fetch_page):
+    """
+    Every page of a paginated verses listing, in order. Page 1 comes first (its pagination gives the
+    page count); then up to STREAM_PREFETCH later pages are fetched concurrently while earlier ones
+    are consumed, so memory stays at a few pages however long the listing is.
+    """
+    first = fetch_page(1)
+    yield first
+    total = (first.get("pagination") or {}).get("total_pages") or 1
+    pending = deque()
+    next_page = 2
+    try:
+        while next_page <= total or pending:
+            while next_page <= total and len(pending) < STREAM_PREFETCH:
+                pending.append(upstream.submit(fetch_page, next_page))
+                next_page += 1
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def stream_verses(chapter_id, translations="131", audio=1, words=False, tajweed=False, fields=None):
+    """
+    Yield every verse of a chapter in order, BATCH_WINDOW verses per (cached) upstream page.
+    QF tajweed is merged from one chapter map fetched alongside page 1, waited for at most QF_TAJWEED_DEADLINE.
+    """
+    tajweed_map = upstream.submit(get_tajweed_map, int(chapter_id)) if tajweed else None
+    deadline = time.monotonic() + QF_TAJWEED_DEADLINE
+
+    def fetch_page(page):
+        return _fetch_verses(chapter_id, translations, audio, words, None, page, BATCH_WINDOW, tajweed, fields=fields)
+
+    for data in _stream_pages(fetch_page):
+        if tajweed_map is not None:
+            try:
+                chapter_map = tajweed_map.result(timeout=max(deadline - time.monotonic(), 0))
+            except Exception:
+                chapter_map = None  # late or failed: api.quran.com's tajweed text
+            data = _merge_tajweed(data, {int(chapter_id): chapter_map})
+        yield from data.get("verses", [])
+
+
+def stream_verses_by_juz(juz_number, translations="131", tajweed=False, fields=None):
+    """Yield every verse of a juz in order, BATCH_WINDOW verses per (cached) upstream page."""
+
+    def fetch_page(page):
+        return get_verses_by_juz(
+            juz_number, translations=translations, page=page, per_page=BATCH_WINDOW, tajweed=tajweed, fields=fields
+        )
+
+    for data in _stream_pages(fetch_page):
+        yield from data.get("verses", [])
+
+
+@cached("text")
+def get_verses_by_juz(juz_number, translations="131", page=1, per_page=20, tajweed=False, fields=None):
     """Fetch verses by Juz number."""
-    fields = "text_uthmani,translations"
-    if tajweed:
-        fields += ",text_uthmani_tajweed"
-    params = {
-        "translations": translations,
-        "page": page,
-        "per_page": per_page,
-        "fields": fields,
-    }
-    r = requests.get(
-        f"{QURAN_API_BASE}/verses/by_juz/{juz_number}",
-        params=params,
-    )
-    r.raise_for_status()
-    data = r.json()
+    if fields is None:
+        fields = verse_fields(VERSE_FIELDS, tajweed=tajweed)
+    params = {"page": page, "per_page": per_page, "fields": fields}
+    if translations:
+        params["translations"] = translations
+    local = None
+    if corpus.can_serve_verses(translations):
+        local = functools.partial(
+            corpus.get_verses_by_juz, juz_number, fields, translations=translations, page=page, per_page=per_page
+        )
+        if _use_local():
+            return local()
+    data = _get_json(f"/verses/by_juz/{juz_number}", params, local=local)
 
     # QF API does not support juz_number; uses api.quran.com tajweed for juz view
 
     return data
 
 
+@cached("resources")
 def get_translations(language="en"):
     """Fetch available translations."""
-    r = requests.get(f"{QURAN_API_BASE}/resources/translations", params={"language": language})
-    r.raise_for_status()
-    return r.json()
+    return _get_json("/resources/translations", {"language": language})
 
 
+@cached("resources")
 def get_recitations():
     """Fetch available reciters."""
-    r = requests.get(f"{QURAN_API_BASE}/resources/recitations")
-    r.raise_for_status()
-    return r.json()
+    return _get_json("/resources/recitations")
 
 
+@cached("text")
 def get_juzs():
     """Fetch 30 Juz list."""
-    r = requests.get(f"{QURAN_API_BASE}/juzs")
-    r.raise_for_status()
-    return r.json()
+    if _use_local():
+        data = corpus.get_juzs()
+        if data is not None:
+            return data
+    return _get_json("/juzs", local=corpus.get_juzs)
+
+
+@cached("text")
+def get_verse_by_key(verse_key, translations="131", fields=None):
+    """Fetch single verse by key (e.g. 1:1), with the same upstream fields as the other verse endpoints."""
+    if fields is None:
+        fields = verse_fields(VERSE_FIELDS)
+    params = {"fields": fields}
+    if translations:
+        params["translations"] = translations
+    if _use_local() and corpus.can_serve_verses(translations):
+        data = corpus.get_verse_by_key(verse_key, fields, translations=translations)
+        if data is not None:
+            return data
+    local = None
+    if corpus.can_serve_verses(translations):
+        local = functools.partial(corpus.get_verse_by_key, verse_key, fields, translations=translations)
+    return _get_json(f"/verses/by_key/{verse_key}", params, local=local)
+
+
+@cached("resources")
+def get_tafsirs():
+    """Fetch available tafsirs."""
+    return _get_json("/resources/tafsirs")
+
+
+@cached("text")
+def _fetch_verses_by_page(page_number, translations, per_page, audio, words, fields=None):
+    if fields is None:
+        fields = verse_fields(PAGE_FIELDS, words)
+    params = _verse_params(translations, audio, words, fields, per_page=per_page)
+    local = None
+    if corpus.can_serve_verses(translations, audio, words):
+        local = functools.partial(
+            corpus.get_verses_by_page, page_number, fields, translations=translations, audio=audio, per_page=per_page
+        )
+        if _use_local():
+            return local()
+    return _get_json(f"/verses/by_page/{page_number}", params, local=local)
+
+
+def get_verses_by_page(page_number, translations="131", per_page=20, audio=1, words=False, tajweed=True, fields=None):
+    """Fetch verses by Mushaf page number (1-604); QF tajweed is merged in unless `tajweed` is off."""
+    fetch = functools.partial(_fetch_verses_by_page, page_number, translations, per_page, audio, words, fields=fields)
+    if not tajweed:
+        return fetch()
+    try:
+        chapters = navigation.chapters_in("page", page_number)
+    except (navigation.IndexUnavailable, ValueError):
+        chapters = ()  # no index built: read the chapters off the verses
+    return _with_tajweed(fetch, chapters=chapters)
 
 
-def get_verse_by_key(verse_key, translations="131"):
-    """Fetch single verse by key (e.g. 1:1)."""
-    r = requests.get(
-        f"{QURAN_API_BASE}/verses/by_key/{verse_key}",
-        params={"translations": translations},
-    )
-    r.raise_for_status()
-    return r.json()
+@cached("search")
+def search_verses(query, page=1, size=20, language="en"):
+    """Full-text search across the Quran; with QURAN_CLIENT_BACKEND=local a built search index answers on its own."""
+    local = functools.partial(search_index.search, query, page=page, size=size)
+    if QURAN_CLIENT_BACKEND == "local" and search_index.is_available():
+        return local()
+    return _get_json("/search", {"q": query, "page": page, "size": size, "language": language}, local=local)
 
 
-def get_tafsirs():
-    """Fetch available tafsirs."""
-    r = requests.get(f"{QURAN_API_BASE}/resources/tafsirs")
-    r.raise_for_status()
-    return r.json()
+def _qf_tafsir(tafsir_id, verse_key, chapter_number):
+    from .qf_api_client import get_tafsir_by_verse as qf_get_tafsir
 
+    started = time.monotonic()
+    data = qf_get_tafsir(tafsir_id, verse_key=verse_key, chapter_number=chapter_number)
+    if data and data.get("tafsirs"):
+        with _tafsir_lock:
+            _qf_tafsir_latencies.append(time.monotonic() - started)
+        return data
+    return None
 
-def get_verses_by_page(page_number, translations="131", per_page=20, audio=1, words=False):
-    """Fetch verses by Mushaf page number (1-604)."""
-    fields = "text_uthmani,translations,text_uthmani_tajweed,audio"
-    if words:
-        fields += ",words"
-    params = {
-        "translations": translations,
-        "audio": audio,
-        "per_page": per_page,
-        "fields": fields,
-    }
-    r = requests.get(
-        f"{QURAN_API_BASE}/verses/by_page/{page_number}",
-        params=params,
-    )
+
+def _quran_com_tafsir(tafsir_id, verse_key, chapter_number):
+    params = {}
+    if verse_key:
+        params["verse_key"] = verse_key
+    if chapter_number:
+        params["chapter_number"] = chapter_number
+    r = upstream.get(f"{QURAN_API_BASE}/quran/tafsirs/{tafsir_id}", params=params)
     r.raise_for_status()
-    data = r.json()
+    return fastjson.decode(r.content)
 
-    try:
-        from .qf_api_client import get_verses_uthmani_tajweed
-
-        qf_data = get_verses_uthmani_tajweed(page_number=page_number)
-        if qf_data and qf_data.get("verses"):
-            qf_by_key = {v["verse_key"]: v.get("text_uthmani_tajweed") for v in qf_data["verses"]}
-            for v in data.get("verses", []):
-                key = v.get("verse_key")
-                if key and qf_by_key.get(key) and ("<tajweed" in str(qf_by_key[key]) or "<span" in str(qf_by_key[key])):
-                    v["text_uthmani_tajweed"] = qf_by_key[key]
-    except Exception:
-        pass
 
-    return data
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)] if ordered else None
 
 
-def search_verses(query, page=1, size=20, language="en"):
-    """Full-text search across the Quran."""
-    r = requests.get(
-        f"{QURAN_API_BASE}/search",
-        params={"q": query, "page": page, "size": size, "language": language},
-    )
-    r.raise_for_status()
-    return r.json()
+def _tafsir_hedge_delay():
+    if TAFSIR_HEDGE_DELAY != "auto":
+        return float(TAFSIR_HEDGE_DELAY)
+    with _tafsir_lock:
+        p90 = _percentile(_qf_tafsir_latencies, 0.9)
+    # Until there is enough history, hedge after a conservative second
+    if p90 is None or len(_qf_tafsir_latencies) < 20:
+        return 1.0
+    return min(max(p90, 0.1), 5.0)
+
+
+def _record_tafsir(source, hedged):
+    with _tafsir_lock:
+        _tafsir_stats[source] += 1
+        if hedged:
+            _tafsir_stats["hedged"] += 1
+    metrics.inc("quran_tafsir_fetches_total", source=source, hedged=str(bool(hedged)).lower())
+
+
+def get_tafsir_hedge_stats():
+    """Winner counts, how often the api.quran.com hedge fired, and recent QF latency to tune TAFSIR_HEDGE_DELAY."""
+    with _tafsir_lock:
+        stats = dict(_tafsir_stats)
+        latencies = list(_qf_tafsir_latencies)
+    stats["delay_seconds"] = _tafsir_hedge_delay()
+    stats["qf_latency_p50"] = _percentile(latencies, 0.5)
+    stats["qf_latency_p90"] = _percentile(latencies, 0.9)
+    return stats
 
 
+@cached("text")
 def get_tafsir_by_verse(tafsir_id, verse_key=None, chapter_number=None):
-    """Fetch tafsir for verse(s). Tries Quran Foundation API first (when credentials exist), then api.quran.com."""
+    """
+    Fetch tafsir for verse(s). A single verse comes from the tafsir store once its chapter has been
+    fetched (see services/tafsir_store.py); everything else goes upstream through _fetch_tafsir.
+    """
+    if verse_key and not chapter_number and TAFSIR_STORE:
+        try:
+            data = tafsir_store.get(tafsir_id, verse_key, functools.partial(_fetch_tafsir, tafsir_id, None))
+        except sqlite3.Error:
+            data = None
+        if data is not None:
+            return data
+    return _fetch_tafsir(tafsir_id, verse_key, chapter_number)
+
+
+def _fetch_tafsir(tafsir_id, verse_key, chapter_number):
+    """
+    Tafsir from upstream, hedged: Quran Foundation first (when credentials exist); if it has not
+    answered within the hedge delay (or fails) api.quran.com is raced against it and the first valid
+    `tafsirs` payload wins. The loser is abandoned - cancelled if it has not started.
+    """
+    args = (tafsir_id, verse_key, chapter_number)
+    qf = upstream.submit(_qf_tafsir, *args)
+    hedged = False
     try:
-        from .qf_api_client import get_tafsir_by_verse as qf_get_tafsir
-
-        qf_data = qf_get_tafsir(tafsir_id, verse_key=verse_key, chapter_number=chapter_number)
-        if qf_data and qf_data.get("tafsirs"):
-            return qf_data
+        data = qf.result(timeout=_tafsir_hedge_delay())
+        if data:
+            _record_tafsir("qf", hedged)
+            return data
+    except FutureTimeout:
+        hedged = True
     except Exception:
         pass
 
-    params = {}
-    if verse_key:
-        params["verse_key"] = verse_key
-    if chapter_number:
-        params["chapter_number"] = chapter_number
-    r = requests.get(
-        f"{QURAN_API_BASE}/quran/tafsirs/{tafsir_id}",
-        params=params,
-    )
-    r.raise_for_status()
-    return r.json()
+    pending = {upstream.submit(_quran_com_tafsir, *args): "quran_com"}
+    if hedged:
+        pending[qf] = "qf"
+    error = None
+    deadline = time.monotonic() + upstream.CONNECT_TIMEOUT + upstream.READ_TIMEOUT
+    while pending:
+        done, _ = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            source = pending.pop(future)
+            try:
+                data = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if data and data.get("tafsirs") is not None:
+                for loser in pending:
+                    loser.cancel()
+                _record_tafsir(source, hedged)
+                return data
+    _record_tafsir("failed", hedged)
+    # A 4xx (unknown tafsir or verse) is the client's error; anything else is an outage
+    if isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code < 500:
+        raise error
+    raise upstream.UpstreamUnavailable("No tafsir source answered")
@@ -0,0 +1,274 @@
+"""
+Two-tier response cache for quran_client: in-process LRU (L1) in front of the Django cache (L2).
+Misses are single-flight (one fetch per key across threads and workers); expired entries
+are served stale while one background refresh runs. Cached values are shared - treat them as read-only.
+L2 holds the encoded JSON; JSON objects come back as fastjson.RawJSON, so views send those bytes as-is.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from dotenv import load_dotenv  # type: ignore
+
+from . import fastjson, metrics
+
+load_dotenv()
+
+L1_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_L1_BYTES", str(32 * 1024 * 1024)))
+KEY_PREFIX = "qc:v3"
+# Expired entries stay servable this long while a background refresh replaces them
+STALE_TTL = int(os.getenv("RESPONSE_CACHE_STALE_TTL", str(60 * 60 * 24)))
+# Upper bound on one upstream fetch holding the single-flight lock
+LOCK_TIMEOUT = int(os.getenv("RESPONSE_CACHE_LOCK_TIMEOUT", "30"))
+
+DAY = 60 * 60 * 24
+HOUR = 60 * 60
+# Quran text and metadata never change; resource lists and search results do, occasionally
+RESOURCE_TTLS = {
+    "text": int(os.getenv("RESPONSE_CACHE_TEXT_TTL", str(7 * DAY))),
+    "resources": int(os.getenv("RESPONSE_CACHE_RESOURCES_TTL", str(6 * HOUR))),
+    "search": int(os.getenv("RESPONSE_CACHE_SEARCH_TTL", str(HOUR))),
+}
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by the approximate encoded size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                self.size -= size
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._data[key] = (time.time() + timeout, size, value)
+            self.size += size
+            while self.size > self.max_bytes and self._data:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self.size -= evicted_size
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+l1 = LRUCache(L1_MAX_BYTES)
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _canonical(value):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        if "," in value:
+            return ",".join(part.strip() for part in value.split(",") if part.strip())
+        return value.lower() if value.lower() in ("true", "false") else value
+    return value
+
+
+def make_key(name, func, args, kwargs):
+    """Cache key from the fully-bound call: defaults applied, values canonicalized, names sorted."""
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    params = {k: _canonical(v) for k, v in bound.arguments.items()}
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{name}:{digest}"
+
+
+def _function_of(key):
+    return key.split(":")[2] if key.count(":") >= 3 else "other"
+
+
+def _read(key, count=False):
+    """Envelope from L1, else L2 (promoted into L1 for its remaining lifetime)."""
+    entry = l1.get(key)
+    if entry is not None:
+        if count:
+            stale = entry["fresh_until"] <= time.time()
+            metrics.inc("quran_cache_requests_total", function=_function_of(key), result="stale" if stale else "l1_hit")
+        return entry
+    with metrics.timer("quran_cache_operation_seconds", op="get"):
+        entry = cache.get(key)
+    if count:
+        if entry is None:
+            result = "miss"
+        else:
+            result = "stale" if entry["fresh_until"] <= time.time() else "l2_hit"
+        metrics.inc("quran_cache_requests_total", function=_function_of(key), result=result)
+    if entry is not None:
+        return _promote(key, entry)
+    return None
+
+
+def _promote(key, stored):
+    """L1 envelope (decoded value) from an L2 one (JSON bytes), kept in L1 for its remaining lifetime."""
+    entry = {"value": fastjson.decode(stored["body"]), "fresh_until": stored["fresh_until"], "size": stored["size"]}
+    remaining = entry["fresh_until"] + STALE_TTL - time.time()
+    if remaining > 0:
+        l1.set(key, entry, remaining, entry["size"])
+    return entry
+
+
+def _write(key, value, timeout):
+    # Encoded once here: the bytes size the L1 entry, go to L2, and are what views send
+    body = fastjson.raw_of(value) or fastjson.dumps(value)
+    value = fastjson.with_raw(value, body)
+    fresh_until = time.time() + timeout
+    entry = {"value": value, "fresh_until": fresh_until, "size": len(body)}
+    l1.set(key, entry, timeout + STALE_TTL, len(body))
+    with metrics.timer("quran_cache_operation_seconds", op="set"):
+        cache.set(key, {"body": body, "fresh_until": fresh_until, "size": len(body)}, timeout=timeout + STALE_TTL)
+    return entry
+
+
+def lookup(key):
+    """Cached value for `key`, fresh or stale, or None."""
+    entry = _read(key)
+    return entry["value"] if entry is not None else None
+
+
+def store(key, value, timeout):
+    _write(key, value, timeout)
+
+
+def _acquire(key):
+    # cache.add is atomic in Redis, so exactly one worker wins the lock
+    return cache.add(f"{key}:lock", 1, timeout=LOCK_TIMEOUT)
+
+
+def _release(key):
+    cache.delete(f"{key}:lock")
+
+
+def _fetch_and_store(key, fetch, timeout):
+    with metrics.timer("quran_client_fetch_seconds", function=_function_of(key)):
+        value = fetch()
+    if value is not None:
+        return _write(key, value, timeout)["value"]
+    return value
+
+
+def _refresh(key, fetch, timeout):
+    try:
+        _fetch_and_store(key, fetch, timeout)
+    except Exception:
+        pass  # keep serving the stale copy; the next hit retries
+    finally:
+        _release(key)
+
+
+def _fetch_across_workers(key, fetch, timeout):
+    """Only the lock holder goes upstream; other workers poll L2 until it lands."""
+    if _acquire(key):
+        try:
+            return _fetch_and_store(key, fetch, timeout)
+        finally:
+            _release(key)
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    delay = 0.02
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.25)
+        stored = cache.get(key)
+        if stored is not None:
+            return _promote(key, stored)["value"]
+        if cache.get(f"{key}:lock") is None:
+            break  # holder failed without storing a value
+    return _fetch_and_store(key, fetch, timeout)
+
+
+def _fetch_once(key, fetch, timeout):
+    """Threads in this process share one in-flight fetch per key."""
+    with _inflight_lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait(LOCK_TIMEOUT)
+        entry = _read(key)
+        if entry is not None:
+            return entry["value"]
+        return _fetch_and_store(key, fetch, timeout)
+    try:
+        return _fetch_across_workers(key, fetch, timeout)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+def get_or_fetch(key, fetch, timeout):
+    """
+    Serve `key` from cache, calling `fetch()` at most once per key across threads and workers.
+    Expired entries are served stale for up to STALE_TTL while one background refresh runs.
+    """
+    entry = _read(key, count=True)
+    if entry is not None:
+        if entry["fresh_until"] <= time.time() and _acquire(key):
+            threading.Thread(target=_refresh, args=(key, fetch, timeout), daemon=True).start()
+        return entry["value"]
+    return _fetch_once(key, fetch, timeout)
+
+
+def cached(resource):
+    """Cache a client function's return value under `resource`'s TTL (None results are not cached)."""
+    timeout = RESOURCE_TTLS[resource]
+
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(name, func, args, kwargs)
+            return get_or_fetch(key, functools.partial(func, *args, **kwargs), timeout)
+
+        wrapper.cache_key = lambda *a, **kw: make_key(name, func, a, kw)
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+@metrics.register_collector
+def _l1_gauges():
+    return [("quran_cache_l1_bytes", {}, l1.size)]
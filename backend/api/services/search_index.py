@@ -0,0 +1,245 @@
+"""
+Local full-text search over the Arabic text and ingested translations (SQLite FTS5, BM25 ranking).
+Built by `python manage.py build_search_index` from the corpus store; answers in the api.quran.com /search shape.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv  # type: ignore
+
+load_dotenv()
+
+INDEX_PATH = os.getenv(
+    "QURAN_SEARCH_INDEX_PATH",
+    str(Path(__file__).resolve().parent.parent.parent / "data" / "quran_search.sqlite3"),
+)
+
+# resource_id 0 marks the Arabic row of a verse
+ARABIC = 0
+
+# Harakat, superscript alef, Quranic annotation marks, small high letters, tatweel
+_DIACRITICS = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u08d3-\u08ff\u0640]")
+_LETTERS = str.maketrans({
+    "\u0622": "\u0627",  # alef madda -> alef
+    "\u0623": "\u0627",  # alef hamza above -> alef
+    "\u0625": "\u0627",  # alef hamza below -> alef
+    "\u0671": "\u0627",  # alef wasla -> alef
+    "\u0624": "\u0648",  # waw hamza -> waw
+    "\u0626": "\u064a",  # ya hamza -> ya
+    "\u0649": "\u064a",  # alef maqsura -> ya
+    "\u0629": "\u0647",  # ta marbuta -> ha
+})
+_TAGS = re.compile(r"<sup[^>]*>.*?</sup>|<[^>]+>", re.S)
+_QUERY = re.compile(r'"([^"]+)"|(\S+)')
+_TOKEN = re.compile(r"\w+")
+_EM = re.compile("(</?em>)")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE verse_index USING fts5(
+    verse_id UNINDEXED,
+    verse_key UNINDEXED,
+    resource_id UNINDEXED,
+    display UNINDEXED,
+    text,
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+-- Prefix terms match here instead: FTS5 stems a query prefix too, so "mercif*" would look for "merci*"
+CREATE VIRTUAL TABLE verse_prefix USING fts5(
+    text,
+    content = 'verse_index',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+_local = threading.local()
+
+
+def normalize_arabic(text):
+    """Strip diacritics and unify alef/hamza forms, ta marbuta and alef maqsura."""
+    return _DIACRITICS.sub("", text or "").translate(_LETTERS)
+
+
+def strip_tags(text):
+    """Translation HTML (footnote markers, spans) to plain text."""
+    return _TAGS.sub("", text or "").strip()
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == INDEX_PATH:
+        return conn
+    if not os.path.exists(INDEX_PATH):
+        return None
+    conn = sqlite3.connect(f"file:{INDEX_PATH}?mode=ro", uri=True, check_same_thread=False)
+    _local.conn = conn
+    _local.path = INDEX_PATH
+    # Indexes built before verse_prefix existed match prefixes against the stemmed table
+    _local.prefixes = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'verse_prefix'").fetchone() is not None
+    return conn
+
+
+def is_available():
+    return _connect() is not None
+
+
+def build_match(query, prefix_table=True):
+    """
+    User query -> [(terms, prefixes)] FTS5 MATCH expressions; a row matching any pair matches.
+    "Quoted text" is a phrase and a trailing * is a prefix. The last bare term matches as a whole
+    (stemmed) word or as a prefix (search-as-you-type). Terms are ANDed; prefixes go to the unstemmed
+    verse_prefix table, everything else to the stemmed verse_index. Without `prefix_table` (indexes built
+    before verse_prefix) everything is one stemmed expression.
+    """
+    parts, prefixes, last = [], [], []
+    matches = list(_QUERY.finditer(normalize_arabic(query)))
+    for i, m in enumerate(matches):
+        phrase, word = m.group(1), m.group(2)
+        if phrase:
+            tokens = _TOKEN.findall(phrase)
+            if tokens:
+                parts.append('"' + " ".join(tokens) + '"')
+            continue
+        tokens = [f'"{token}"' for token in _TOKEN.findall(word)]
+        if word.endswith("*"):
+            prefixes += [token + "*" for token in tokens]
+        elif i == len(matches) - 1:
+            last = tokens
+        else:
+            parts += tokens
+    if not prefix_table:
+        return [(" AND ".join(parts + [token + "*" for token in prefixes + last]), "")]
+    if not last:
+        return [(" AND ".join(parts), " AND ".join(prefixes))]
+    return [
+        (" AND ".join(parts + last), " AND ".join(prefixes)),
+        (" AND ".join(parts), " AND ".join(prefixes + [token + "*" for token in last])),
+    ]
+
+
+def _source(terms, prefixes):
+    """FROM ... WHERE for the matching verse_index rows, with its params, rank and highlight() expressions."""
+    if not prefixes:
+        return "verse_index WHERE verse_index MATCH ?", [terms], "verse_index.rank", [
+            "highlight(verse_index, 4, '<em>', '</em>')"
+        ]
+    joined = "verse_index JOIN verse_prefix ON verse_prefix.rowid = verse_index.rowid"
+    if not terms:
+        return f"{joined} WHERE verse_prefix MATCH ?", [prefixes], "verse_prefix.rank", [
+            "highlight(verse_prefix, 0, '<em>', '</em>')"
+        ]
+    return f"{joined} WHERE verse_index MATCH ? AND verse_prefix MATCH ?", [terms, prefixes], (
+        "verse_index.rank + verse_prefix.rank"
+    ), ["highlight(verse_index, 4, '<em>', '</em>')", "highlight(verse_prefix, 0, '<em>', '</em>')"]
+
+
+def _merge_highlights(*highlighted):
+    """One string carrying the <em> spans of several highlight() calls over the same text."""
+    if len(highlighted) == 1:
+        return highlighted[0]
+    marked, text = set(), ""
+    for value in highlighted:
+        text, inside = "", False
+        for part in _EM.split(value or ""):
+            if part in ("<em>", "</em>"):
+                inside = part == "<em>"
+                continue
+            if inside:
+                marked.update(range(len(text), len(text) + len(part)))
+            text += part
+    out = []
+    for i, char in enumerate(text):
+        if i in marked and i - 1 not in marked:
+            out.append("<em>")
+        out.append(char)
+        if i in marked and i + 1 not in marked:
+            out.append("</em>")
+    return "".join(out)
+
+
+def search(query, page=1, size=20):
+    """BM25-ranked verses matching `query`; a verse's best-scoring row (Arabic or translation) ranks it."""
+    conn = _connect()
+    if conn is None:
+        return None
+    page = max(int(page), 1)
+    size = max(int(size), 1)
+    sources = [_source(terms, prefixes) for terms, prefixes in build_match(query, _local.prefixes) if terms or prefixes]
+    if not sources:
+        return {"search": {"query": query, "total_results": 0, "current_page": page, "total_pages": 0, "results": []}}
+    params = [param for _, source_params, _, _ in sources for param in source_params]
+    hits = " UNION ALL ".join(
+        f"SELECT verse_index.verse_id AS verse_id, verse_index.verse_key AS verse_key, {rank} AS rank FROM {source}"
+        for source, _, rank, _ in sources
+    )
+    total = conn.execute(f"WITH hits AS ({hits}) SELECT COUNT(DISTINCT verse_id) FROM hits", params).fetchone()[0]
+    ranked = conn.execute(
+        f"WITH hits AS MATERIALIZED ({hits})"
+        " SELECT verse_id, verse_key FROM hits GROUP BY verse_id ORDER BY MIN(rank), verse_id LIMIT ? OFFSET ?",
+        params + [size, (page - 1) * size],
+    ).fetchall()
+    ids = [row[0] for row in ranked]
+    results = {row[0]: {"verse_key": row[1], "verse_id": row[0], "text": "", "highlighted": None, "words": [], "translations": []} for row in ranked}
+    if ids:
+        marks = ",".join("?" * len(ids))
+        for verse_id, resource_id, display in conn.execute(
+            f"SELECT verse_id, resource_id, display FROM verse_index WHERE resource_id = {ARABIC} AND verse_id IN ({marks})",
+            ids,
+        ):
+            results[verse_id]["text"] = display
+        # A translation row can match several pairs; its highlights are merged
+        translations = {}
+        for source, source_params, _, highlights in sources:
+            for rowid, verse_id, resource_id, *texts in conn.execute(
+                f"SELECT verse_index.rowid, verse_index.verse_id, verse_index.resource_id, {', '.join(highlights)}"
+                f" FROM {source} AND verse_index.resource_id != {ARABIC} AND verse_index.verse_id IN ({marks})",
+                source_params + ids,
+            ):
+                translations.setdefault(rowid, (verse_id, resource_id, []))[2].extend(texts)
+        for rowid in sorted(translations):
+            verse_id, resource_id, texts = translations[rowid]
+            results[verse_id]["translations"].append({"text": _merge_highlights(*texts), "resource_id": resource_id})
+    return {
+        "search": {
+            "query": query,
+            "total_results": total,
+            "current_page": page,
+            "total_pages": math.ceil(total / size),
+            "results": [results[i] for i in ids],
+        }
+    }
+
+
+def build(path, corpus_conn):
+    """Write a fresh index at `path` from an open corpus store connection."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    rows = 0
+    for verse_id, verse_key, text in corpus_conn.execute("SELECT id, verse_key, text_uthmani FROM verses ORDER BY id"):
+        conn.execute(
+            "INSERT INTO verse_index (verse_id, verse_key, resource_id, display, text) VALUES (?, ?, ?, ?, ?)",
+            (verse_id, verse_key, ARABIC, text, normalize_arabic(text)),
+        )
+        rows += 1
+    for verse_id, verse_key, resource_id, data in corpus_conn.execute(
+        "SELECT t.verse_id, v.verse_key, t.resource_id, json_extract(t.data, '$.text')"
+        " FROM translations t JOIN verses v ON v.id = t.verse_id ORDER BY t.verse_id, t.resource_id"
+    ):
+        conn.execute(
+            "INSERT INTO verse_index (verse_id, verse_key, resource_id, display, text) VALUES (?, ?, ?, ?, ?)",
+            (verse_id, verse_key, resource_id, None, strip_tags(data)),
+        )
+        rows += 1
+    # External content: only the unstemmed tokens are stored ('rebuild' can't read an FTS5 content table)
+    conn.execute("INSERT INTO verse_prefix (rowid, text) SELECT rowid, text FROM verse_index")
+    conn.execute("INSERT INTO verse_index (verse_index) VALUES ('optimize')")
+    conn.execute("INSERT INTO verse_prefix (verse_prefix) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    return rows
@@ -0,0 +1,161 @@
+"""
+Per-verse tafsir store. The first request for a verse of a (tafsir, chapter) not yet stored triggers one
+background fetch of the whole chapter, which is split per verse and written zlib-compressed to a SQLite
+file keyed by (tafsir_id, verse_key); later verses of that chapter are read locally, and hot entries
+stay decompressed in an in-process LRU. Each worker fetches a given chapter at most once at a time.
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from dotenv import load_dotenv  # type: ignore
+
+from . import fastjson, metrics, navigation
+from .response_cache import RESOURCE_TTLS, LRUCache
+
+load_dotenv()
+
+STORE_PATH = os.getenv(
+    "QURAN_TAFSIR_STORE_PATH",
+    str(Path(__file__).resolve().parent.parent.parent / "data" / "tafsir_store.sqlite3"),
+)
+LRU_BYTES = int(os.getenv("TAFSIR_LRU_BYTES", str(16 * 1024 * 1024)))
+# Stored chapters are fetched again after this long, like cached text responses
+MAX_AGE = RESOURCE_TTLS["text"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chapters (
+    tafsir_id INTEGER NOT NULL,
+    chapter_id INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    meta BLOB NOT NULL,
+    PRIMARY KEY (tafsir_id, chapter_id)
+);
+CREATE TABLE IF NOT EXISTS entries (
+    tafsir_id INTEGER NOT NULL,
+    verse_key TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (tafsir_id, verse_key)
+) WITHOUT ROWID;
+"""
+
+lru = LRUCache(LRU_BYTES)
+_local = threading.local()
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == STORE_PATH:
+        return conn
+    Path(STORE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(STORE_PATH, timeout=5, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")  # readers in other workers never wait on a chapter write
+    conn.executescript(SCHEMA)
+    _local.conn = conn
+    _local.path = STORE_PATH
+    return conn
+
+
+def _compress(value):
+    return zlib.compress(fastjson.dumps(value), 6)
+
+
+def _decompress(blob):
+    return fastjson.loads(zlib.decompress(blob))
+
+
+def _response(entry, meta, verse_key):
+    # The per-verse upstream shape: meta filters name the verse, not the chapter it was fetched with
+    if not meta:
+        return {"tafsirs": [entry]}
+    meta = dict(meta)
+    if "filters" in meta:
+        meta["filters"] = {"verse_key": verse_key}
+    return {"tafsirs": [entry], "meta": meta}
+
+
+def _read(tafsir_id, chapter_id, verse_key):
+    """(stored, entry, meta): whether the chapter is stored and fresh, and the verse's entry if it has one."""
+    row = _connect().execute(
+        "SELECT c.fetched_at, c.meta, e.data FROM chapters c"
+        " LEFT JOIN entries e ON e.tafsir_id = c.tafsir_id AND e.verse_key = ?"
+        " WHERE c.tafsir_id = ? AND c.chapter_id = ?",
+        (verse_key, tafsir_id, chapter_id),
+    ).fetchone()
+    if row is None or row[0] + MAX_AGE < time.time():
+        return False, None, None
+    return True, _decompress(row[2]) if row[2] is not None else None, _decompress(row[1])
+
+
+def store_chapter(tafsir_id, chapter_id, data):
+    """Split an upstream chapter payload per verse and store it; verses without text are left out."""
+    entries = [t for t in data.get("tafsirs") or [] if t.get("verse_key") and t.get("text")]
+    conn = _connect()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO entries (tafsir_id, verse_key, data) VALUES (?, ?, ?)",
+            [(tafsir_id, t["verse_key"], _compress(t)) for t in entries],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO chapters (tafsir_id, chapter_id, fetched_at, meta) VALUES (?, ?, ?, ?)",
+            (tafsir_id, chapter_id, time.time(), _compress(data.get("meta") or {})),
+        )
+    return len(entries)
+
+
+def clear():
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM chapters")
+    lru.clear()
+
+
+def _fetch_chapter(tafsir_id, chapter_id, fetch_chapter):
+    try:
+        store_chapter(tafsir_id, chapter_id, fetch_chapter(chapter_id))
+        metrics.inc("quran_tafsir_store_total", result="chapter_stored")
+    except Exception:
+        metrics.inc("quran_tafsir_store_total", result="chapter_failed")
+    finally:
+        with _inflight_lock:
+            _inflight.discard((tafsir_id, chapter_id))
+
+
+def get(tafsir_id, verse_key, fetch_chapter):
+    """
+    `{"tafsirs": [entry], "meta": ...}` for one verse from the store, or None when the caller must fetch
+    the verse itself: its chapter is not stored yet (a background `fetch_chapter(chapter_id)` then stores it)
+    or the chapter payload had no text for it.
+    """
+    tafsir_id = int(tafsir_id)
+    verse_id = navigation.parse_verse_key(verse_key)
+    if verse_id is None:
+        return None
+    verse_key = navigation.verse_key(verse_id)
+    value = lru.get((tafsir_id, verse_key))
+    if value is not None:
+        metrics.inc("quran_tafsir_store_total", result="lru_hit")
+        return value
+    chapter_id = int(verse_key.split(":")[0])
+    stored, entry, meta = _read(tafsir_id, chapter_id, verse_key)
+    if entry is not None:
+        metrics.inc("quran_tafsir_store_total", result="hit")
+        value = _response(entry, meta, verse_key)
+        lru.set((tafsir_id, verse_key), value, MAX_AGE, len(entry.get("text", "")))
+        return value
+    if stored:
+        metrics.inc("quran_tafsir_store_total", result="no_text")
+        return None
+    metrics.inc("quran_tafsir_store_total", result="miss")
+    with _inflight_lock:
+        if (tafsir_id, chapter_id) in _inflight:
+            return None
+        _inflight.add((tafsir_id, chapter_id))
+    threading.Thread(target=_fetch_chapter, args=(tafsir_id, chapter_id, fetch_chapter), daemon=True).start()
+    return None
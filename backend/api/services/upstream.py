@@ -0,0 +1,202 @@
+"""
+Shared upstream HTTP transport for api.quran.com and Quran Foundation.
+One pooled requests.Session per host: keep-alive, default timeouts, GET retries.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv  # type: ignore
+
+from . import admission, circuit, metrics
+
+load_dotenv()
+
+# Each Gunicorn worker keeps its own pools and fan-out threads
+# Threads per worker for fetches issued concurrently (compound and batch requests)
+FANOUT_WORKERS = int(os.getenv("UPSTREAM_FANOUT_WORKERS", "8"))
+# Threads per worker that can call a host at once besides the fan-out pool: the request thread
+# (Gunicorn --threads) plus background cache refreshes, tafsir chapter fetches and audio prefetch
+OTHER_THREADS = int(os.getenv("UPSTREAM_OTHER_THREADS", "4"))
+# Connections kept per host; below the number of calling threads, pool_block=False makes urllib3
+# open (and TLS-handshake) extra connections and throw them away instead of reusing them
+POOL_MAXSIZE = int(os.getenv("UPSTREAM_POOL_MAXSIZE", str(FANOUT_WORKERS + OTHER_THREADS)))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", "15"))
+RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.3"))
+
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_counters = {}
+_counters_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="upstream-fanout")
+
+
+class UpstreamUnavailable(requests.RequestException):
+    """The upstream (and every fallback) could not answer; views turn this into a 503."""
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """The host's circuit breaker is open; the request was not sent."""
+
+
+class Overloaded(UpstreamUnavailable):
+    """Admission control shed the call (too many in flight or over the rate limit); it was not sent."""
+
+    retry_after = 1
+
+
+def _host_of(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _build_session():
+    # Only idempotent methods are retried; POST/DELETE fail straight through. Read timeouts are not
+    # retried: a slow upstream would hold the worker (and the cache's single-flight lock) for
+    # (RETRIES + 1) * READ_TIMEOUT instead of failing over to the mirror or stale cache
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=0,
+        status=RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(429, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, pool_block=False, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url):
+    """Return the pooled session for the host of `url` (created on first use)."""
+    host = _host_of(url)
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _build_session()
+            _sessions[host] = session
+        return session
+
+
+def _count(host, key):
+    with _counters_lock:
+        counters = _counters.setdefault(host, {"requests": 0, "errors": 0, "rejected": 0, "shed": 0})
+        counters[key] += 1
+
+
+def request(method, url, timeout=None, **kwargs):
+    """
+    Send a request through the host's pool. Raises requests exceptions like requests.request,
+    CircuitOpen without sending when the host's breaker is open (5xx, errors and slow calls trip it),
+    or Overloaded when admission control sheds the call.
+    """
+    host = _host_of(url)
+    breaker = circuit.get_breaker(host)
+    if not breaker.allow():
+        _count(host, "rejected")
+        metrics.inc("quran_upstream_requests_total", host=host, method=method, status="circuit_open")
+        raise CircuitOpen(f"Circuit open for {host}")
+    slot, waited = admission.get_limiter(host, FANOUT_WORKERS + OTHER_THREADS).acquire()
+    metrics.observe("quran_upstream_admission_wait_seconds", waited, host=host)
+    if slot is None:
+        breaker.cancel()
+        _count(host, "shed")
+        metrics.inc("quran_upstream_requests_total", host=host, method=method, status="shed")
+        raise Overloaded(f"Upstream call to {host} shed by admission control")
+    _count(host, "requests")
+    started = time.monotonic()
+    failed = True
+    status = "error"
+    try:
+        response = get_session(url).request(method, url, timeout=timeout or DEFAULT_TIMEOUT, **kwargs)
+        failed = response.status_code >= 500
+        status = response.status_code
+        return response
+    except requests.RequestException:
+        _count(host, "errors")
+        raise
+    finally:
+        slot.release()
+        elapsed = time.monotonic() - started
+        breaker.record(failed, elapsed)
+        metrics.inc("quran_upstream_requests_total", host=host, method=method, status=status)
+        metrics.observe("quran_upstream_request_seconds", elapsed, host=host, method=method)
+
+
+def get(url, params=None, **kwargs):
+    return request("GET", url, params=params, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return request("POST", url, data=data, json=json, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+def submit(fn, *args, **kwargs):
+    """Run `fn` on the shared fan-out pool in the caller's context; returns a concurrent.futures.Future."""
+    return _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def pool_stats():
+    """Per-host pool usage: requests sent, new connections opened, idle keep-alive connections."""
+    with _counters_lock:
+        counters = {host: dict(c) for host, c in _counters.items()}
+    with _sessions_lock:
+        sessions = dict(_sessions)
+    stats = {}
+    for host, session in sessions.items():
+        adapter = session.get_adapter(host)
+        connections = 0
+        idle = 0
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            if pool.pool is not None:
+                # The LIFO queue is pre-filled with None placeholders for unopened slots
+                idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        c = counters.get(host, {"requests": 0, "errors": 0, "rejected": 0, "shed": 0})
+        stats[host] = {
+            "requests": c["requests"],
+            "errors": c["errors"],
+            "rejected": c["rejected"],
+            "shed": c["shed"],
+            "connections_opened": connections,
+            "idle_connections": idle,
+            "pool_maxsize": POOL_MAXSIZE,
+            "reuse_ratio": round(1 - connections / c["requests"], 3) if c["requests"] else 0.0,
+        }
+    return stats
+
+
+@metrics.register_collector
+def _pool_gauges():
+    gauges = []
+    for host, stats in pool_stats().items():
+        gauges.append(("quran_upstream_connections_opened", {"host": host}, stats["connections_opened"]))
+        gauges.append(("quran_upstream_idle_connections", {"host": host}, stats["idle_connections"]))
+    for host, state in circuit.states().items():
+        gauges.append(("quran_circuit_open", {"host": host}, int(state["state"] != circuit.CLOSED)))
+    return gauges
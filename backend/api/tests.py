@@ -1,3 +1,990 @@
-from django.test import TestCase
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from api.conditional import MAX_AGES
+from api.services import (
+    admission, audio_cache, circuit, fastjson, metrics, navigation, qf_token, quran_client, response_cache, search_index,
+    tafsir_store, upstream,
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        admission._limiters.clear()
+        self.addCleanup(admission._limiters.clear)
+
+    def _limiter(self, concurrency=2, rate=0, shared=False):
+        patches = [
+            mock.patch.object(admission, "MAX_CONCURRENCY", concurrency),
+            mock.patch.object(admission, "RATE", rate),
+            mock.patch.object(admission, "WORKERS", 1),
+            mock.patch.object(admission, "_shared_cache", return_value=shared),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return admission.Limiter("https://upstream.test")
+
+    def test_sheds_when_slots_are_taken_and_admits_after_release(self):
+        for shared in (False, True):
+            with self.subTest(shared=shared):
+                cache.clear()
+                limiter = self._limiter(concurrency=2, shared=shared)
+                first, _ = limiter.acquire(max_wait=0)
+                second, _ = limiter.acquire(max_wait=0)
+                third, _ = limiter.acquire(max_wait=0.02)
+                self.assertIsNotNone(first)
+                self.assertIsNotNone(second)
+                self.assertIsNone(third)
+                first.release()
+                again, _ = limiter.acquire(max_wait=0)
+                self.assertIsNotNone(again)
+                again.release()
+                second.release()
+
+    def test_shared_counter_returns_to_zero_and_release_is_idempotent(self):
+        limiter = self._limiter(concurrency=3, shared=True)
+        slot, _ = limiter.acquire(max_wait=0)
+        self.assertEqual(cache.get(limiter.key), 1)
+        slot.release()
+        slot.release()
+        self.assertEqual(cache.get(limiter.key), 0)
+
+    def test_shed_call_makes_a_bounded_number_of_attempts(self):
+        limiter = self._limiter(concurrency=1, shared=True)
+        held, _ = limiter.acquire(max_wait=0)
+        with mock.patch.object(cache, "incr", wraps=cache.incr) as incr:
+            slot, _ = limiter.acquire(max_wait=0.04)
+        self.assertIsNone(slot)
+        # One incr and its undoing decr (an incr(-1) in LocMemCache) per attempt
+        self.assertLessEqual(incr.call_count, 2 * admission.ATTEMPTS)
+        self.assertEqual(cache.get(limiter.key), 1)
+        held.release()
+
+    def test_shed_call_does_not_spend_a_rate_token(self):
+        limiter = self._limiter(concurrency=1, rate=1)
+        held, _ = limiter.acquire(max_wait=0)
+        self.assertIsNone(limiter.acquire(max_wait=0)[0])
+        held.release()
+        # The single token was spent by `held`; a shed call in between must not have queued behind it
+        self.assertAlmostEqual(limiter.bucket.tokens, 0, delta=0.1)
+
+    def test_wait_budget_applies_within_its_context(self):
+        seen = []
+        with mock.patch.object(admission.Limiter, "_slot", side_effect=lambda deadline: seen.append(deadline) or None):
+            limiter = self._limiter()
+            with mock.patch("time.monotonic", return_value=0.0):
+                limiter.acquire()
+                with admission.wait_budget(15):
+                    limiter.acquire()
+        self.assertEqual(seen, [admission.MAX_WAIT, 15])
+
+    def test_batch_with_more_windows_than_the_worker_share_is_not_shed(self):
+        self._limiter(concurrency=16)
+        response_cache.l1.clear()
+        patch = mock.patch.object(admission, "WORKERS", 3)  # a 6-call share, below the 8 fan-out threads
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        def request(method, url, **kwargs):
+            time.sleep(0.1)  # longer than the admission wait: queued calls would be shed
+            chapter = url.rsplit("/", 1)[1]
+            return mock.Mock(status_code=200, content=json.dumps({"verses": [{"verse_key": f"{chapter}:1"}]}).encode())
+
+        keys = [f"{chapter}:1" for chapter in range(1, 12)]
+        with mock.patch.object(admission, "MAX_WAIT", 0.02), \
+                mock.patch.object(quran_client, "_use_local", return_value=False), \
+                mock.patch.object(upstream, "get_session") as session:
+            session.return_value.request.side_effect = request
+            response = self.client.get("/api/verses/batch/", {"keys": ",".join(keys)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([v["verse_key"] for v in response.json()["verses"]], keys)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for patch in (
+            mock.patch("api.services.circuit.time.monotonic", self.clock),
+            mock.patch.object(circuit, "MIN_CALLS", 4),
+            mock.patch.object(circuit, "ERROR_RATE", 0.5),
+            mock.patch.object(circuit, "SLOW_CALL_SECONDS", 5),
+            mock.patch.object(circuit, "OPEN_SECONDS", 30),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.breaker = circuit.CircuitBreaker("https://breaker.test")
+
+    def _trip(self):
+        for _ in range(circuit.MIN_CALLS):
+            self.assertTrue(self.breaker.allow())
+            self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+
+    def test_stays_closed_below_min_calls_and_error_rate(self):
+        for failed in (True, True, True):  # every call failed, but fewer than MIN_CALLS
+            self.breaker.record(failed, 0.1)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self.breaker = circuit.CircuitBreaker("https://breaker.test")
+        for failed in (True, False, False, False, True, False, False, False):  # 25% failed
+            self.breaker.record(failed, 0.1)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+
+    def test_opens_on_error_rate_and_rejects_until_cool_down(self):
+        self._trip()
+        self.assertFalse(self.breaker.allow())
+        self.clock.advance(29.9)
+        self.assertFalse(self.breaker.allow())
+        self.clock.advance(0.1)
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+
+    def test_slow_successes_count_as_failures(self):
+        for _ in range(circuit.MIN_CALLS):
+            self.breaker.record(False, 5.0)
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+
+    def test_half_open_lets_one_probe_through(self):
+        self._trip()
+        self.clock.advance(30)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes(self):
+        self._trip()
+        self.clock.advance(30)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record(False, 0.2)
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self.assertEqual(self.breaker.snapshot()["recent_calls"], 0)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_or_slow_probe_reopens_for_a_new_cool_down(self):
+        for failed, seconds in ((True, 0.1), (False, 6.0)):
+            with self.subTest(failed=failed, seconds=seconds):
+                self.breaker = circuit.CircuitBreaker("https://breaker.test")
+                self._trip()
+                self.clock.advance(30)
+                self.assertTrue(self.breaker.allow())
+                self.breaker.record(failed, seconds)
+                self.assertEqual(self.breaker.state, circuit.OPEN)
+                self.clock.advance(29)
+                self.assertFalse(self.breaker.allow())
+                self.clock.advance(1)
+                self.assertTrue(self.breaker.allow())
+
+    def test_cancelled_probe_lets_the_next_call_probe(self):
+        self._trip()
+        self.clock.advance(30)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.cancel()
+        self.assertEqual(self.breaker.state, circuit.HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_cancel_outside_half_open_changes_nothing(self):
+        self.breaker.cancel()
+        self.assertEqual(self.breaker.state, circuit.CLOSED)
+        self._trip()
+        self.breaker.cancel()
+        self.assertEqual(self.breaker.state, circuit.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+
+class UpstreamRetryTests(SimpleTestCase):
+    def test_read_timeouts_are_not_retried(self):
+        hits = []
+
+        class Slow(BaseHTTPRequestHandler):
+            def do_GET(self):
+                hits.append(self.path)
+                time.sleep(0.3)
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Slow)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        started = time.monotonic()
+        with self.assertRaises(requests.RequestException):
+            upstream.get(f"http://127.0.0.1:{server.server_port}/slow", timeout=(1, 0.05))
+        self.assertLess(time.monotonic() - started, 0.25)
+        self.assertEqual(hits, ["/slow"])
+
+
+class ShedDuringHalfOpenTests(SimpleTestCase):
+    host = "https://half-open.test"
+
+    def setUp(self):
+        circuit._breakers.pop(self.host, None)
+        self.addCleanup(circuit._breakers.pop, self.host, None)
+
+    def test_shed_probe_frees_the_half_open_breaker(self):
+        clock = FakeClock()
+        breaker = circuit.get_breaker(self.host)
+        with mock.patch("api.services.circuit.time.monotonic", clock):
+            breaker._open()
+            clock.advance(circuit.OPEN_SECONDS)
+            with mock.patch.object(admission.Limiter, "acquire", return_value=(None, 0.0)):
+                with self.assertRaises(upstream.Overloaded):
+                    upstream.get(f"{self.host}/x")
+            self.assertEqual(breaker.state, circuit.HALF_OPEN)
+            self.assertFalse(breaker.probing)
+            self.assertTrue(breaker.allow())
+
+
+class PageTajweedTests(SimpleTestCase):
+    def test_chapters_in_spans_division_boundaries(self):
+        self.assertEqual(navigation.chapters_in("juz", 1), [1, 2])
+        self.assertEqual(navigation.chapters_in("juz", 30), list(range(78, 115)))
+        self.assertEqual(navigation.chapters_in("chapter", 2), [2])
+
+    def test_page_maps_are_fetched_concurrently_with_the_verses(self):
+        map_started = threading.Event()
+
+        def tajweed_map(chapter):
+            map_started.set()
+            return {"2:1": "<rule>alif</rule>"}
+
+        def fetch_page(*args, **kwargs):
+            # Only returns once a map fetch is under way, i.e. it was not waiting for the verses
+            self.assertTrue(map_started.wait(2))
+            return {"verses": [{"verse_key": "2:1", "text_uthmani_tajweed": "plain"}]}
+
+        with mock.patch.object(navigation, "chapters_in", return_value=[2]), \
+                mock.patch.object(quran_client, "get_tajweed_map", side_effect=tajweed_map), \
+                mock.patch.object(quran_client, "_fetch_verses_by_page", side_effect=fetch_page):
+            data = quran_client.get_verses_by_page(2)
+        self.assertEqual(data["verses"][0]["text_uthmani_tajweed"], "<rule>alif</rule>")
+
+    def test_page_without_index_reads_chapters_off_the_verses(self):
+        with mock.patch.object(navigation, "chapters_in", side_effect=navigation.IndexUnavailable("page")), \
+                mock.patch.object(quran_client, "get_tajweed_map", return_value={"3:1": "<rule>m</rule>"}) as maps, \
+                mock.patch.object(quran_client, "_fetch_verses_by_page", return_value={"verses": [{"verse_key": "3:1"}]}):
+            data = quran_client.get_verses_by_page(50)
+        maps.assert_called_once_with(3)
+        self.assertEqual(data["verses"][0]["text_uthmani_tajweed"], "<rule>m</rule>")
+
+
+class MetricsSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = mock.patch.object(metrics, "METRICS_DIR", directory.name)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.dir = directory.name
+
+    def _write(self, name, value):
+        snap = {"counters": [["quran_test_total", {}, value]], "histograms": [], "gauges": []}
+        with open(os.path.join(self.dir, name), "w") as f:
+            json.dump(snap, f)
+
+    def _total(self):
+        counters, _histograms, _gauges = metrics._aggregate()
+        return counters.get(("quran_test_total", ()), 0)
+
+    def test_snapshots_of_exited_and_replaced_processes_are_removed(self):
+        exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        dead_pid = int(exited.stdout)
+        own = metrics._snapshot_name()
+        self._write(own, 5)
+        self._write(f"{dead_pid}-1.json", 100)
+        # Same pid as a running process, but started at another time: the pid was reused
+        self._write(f"{os.getpid()}-1.json", 1000)
+        self.assertEqual(self._total(), 5)
+        self.assertEqual(os.listdir(self.dir), [own])
+
+    def test_tafsir_fetches_are_a_counter(self):
+        metrics.flush(force=True)
+        before = metrics._aggregate()[0]
+        quran_client._record_tafsir("qf", hedged=True)
+        metrics.flush(force=True)
+        after = metrics._aggregate()[0]
+        key = ("quran_tafsir_fetches_total", (("hedged", "true"), ("source", "qf")))
+        self.assertEqual(after.get(key, 0) - before.get(key, 0), 1)
+        self.assertEqual(metrics.HELP["quran_tafsir_fetches_total"][0], "counter")
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    def test_closed_without_a_token_unless_debug(self):
+        with mock.patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("METRICS_TOKEN", None)
+            with override_settings(DEBUG=False):
+                self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get("/api/metrics/").status_code, 200)
+
+    def test_token_is_required_when_set(self):
+        with mock.patch.dict(os.environ, {"METRICS_TOKEN": "scrape-me"}):
+            self.assertEqual(self.client.get("/api/metrics/").status_code, 401)
+            response = self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer scrape-me")
+        self.assertEqual(response.status_code, 200)
+
+
+class VersesBatchTests(SimpleTestCase):
+    def test_bad_audio_is_a_client_error(self):
+        with mock.patch("api.views.get_verses_batch") as fetch:
+            response = self.client.get("/api/verses/batch/", {"keys": "1:1", "audio": "x"})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post("/api/verses/batch/", {"keys": ["1:1"], "audio": None}, content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+        fetch.assert_not_called()
+
+    def test_malformed_bodies_are_client_errors(self):
+        with mock.patch("api.views.get_verses_batch") as fetch:
+            for body in ({"keys": [1]}, {"keys": {"1:1": True}}, ["1:1"], "1:1"):
+                with self.subTest(body=body):
+                    response = self.client.post("/api/verses/batch/", body, content_type="application/json")
+                    self.assertEqual(response.status_code, 400)
+        fetch.assert_not_called()
+
+    def test_verses_come_back_in_request_order_with_missing_keys(self):
+        def get_verses(chapter, page=1, **kwargs):
+            # Chapter 1's window lacks 1:2
+            keys = {1: ["1:1", "1:3"], 2: ["2:255", "2:256"]}[chapter]
+            return {"verses": [{"verse_key": key} for key in keys]}
+
+        with mock.patch.object(quran_client, "get_verses", side_effect=get_verses):
+            response = self.client.post(
+                "/api/verses/batch/", {"keys": ["2:256", "1:1-3", "2:255"]}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([v["verse_key"] for v in data["verses"]], ["2:256", "1:1", "1:3", "2:255"])
+        self.assertEqual(data["missing"], ["1:2"])
+
+
+class AudioCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for patch in (
+            mock.patch.object(audio_cache, "AUDIO_CACHE_DIR", directory.name),
+            mock.patch.dict(audio_cache._usage, {"bytes": None}),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.dir = directory.name
+
+    def _upstream(self, body):
+        response = mock.Mock(status_code=200)
+        response.iter_content.return_value = [body]
+        return mock.patch.object(upstream, "get", return_value=response)
+
+    def test_prefetch_stops_at_the_chapters_last_verse(self):
+        self.assertEqual(audio_cache.next_verse_paths("Alafasy/mp3/001005.mp3", 3),
+                         ["Alafasy/mp3/001006.mp3", "Alafasy/mp3/001007.mp3"])
+        self.assertEqual(audio_cache.next_verse_paths("Alafasy/mp3/001007.mp3", 3), [])
+        self.assertEqual(audio_cache.next_verse_paths("Alafasy/mp3/115001.mp3", 3), [])
+
+    def test_audio_is_served_when_the_file_is_evicted_after_lookup(self):
+        path = "Alafasy/mp3/002255.mp3"
+        with self._upstream(b"ID3 audio"):
+            audio_cache.open_file(path).close()
+        opened = audio_cache.open_file
+
+        def open_then_evict(p):
+            file = opened(p)
+            os.unlink(audio_cache._local_path(p))
+            return file
+
+        with mock.patch.object(audio_cache, "open_file", side_effect=open_then_evict), \
+                mock.patch.object(audio_cache, "prefetch_after"):
+            response = self.client.get(f"/api/audio/{path}", HTTP_RANGE="bytes=4-")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"audio")
+
+    def test_download_is_readable_when_evicted_at_once(self):
+        with self._upstream(b"fresh"), mock.patch.object(audio_cache, "AUDIO_CACHE_BYTES", 0):
+            file = audio_cache.open_file("Alafasy/mp3/001001.mp3")
+        with file:
+            self.assertFalse(audio_cache._local_path("Alafasy/mp3/001001.mp3").exists())
+            self.assertEqual(file.read(), b"fresh")
+
+
+class NavigationIndexTests(SimpleTestCase):
+    def setUp(self):
+        saved = {name: navigation._divisions.get(name) for name in ("page", "hizb", "rub")}
+
+        def restore():
+            for name, division in saved.items():
+                if division is None:
+                    navigation._divisions.pop(name, None)
+                else:
+                    navigation._divisions[name] = division
+
+        self.addCleanup(restore)
+        self.addCleanup(navigation._loaded.update, dict(navigation._loaded))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "navigation_index.json")
+        patch = mock.patch.object(navigation, "INDEX_PATH", self.path)
+        patch.start()
+        self.addCleanup(patch.stop)
+        for name in ("page", "hizb", "rub"):
+            navigation._divisions.pop(name, None)
+        navigation._loaded["checked_at"] = None
+
+    def _build(self):
+        index = {
+            name: [navigation.verse_key(1 + i * (navigation.TOTAL_VERSES // size)) for i in range(size)]
+            for name, size in (("page", 604), ("hizb", 60), ("rub", 240))
+        }
+        with open(self.path, "w") as f:
+            json.dump(index, f)
+
+    def test_index_built_after_startup_is_picked_up(self):
+        clock = FakeClock()
+        with mock.patch("api.services.navigation.time.monotonic", clock):
+            with self.assertRaises(navigation.IndexUnavailable):
+                navigation.locate("page", 1)
+            self._build()
+            # Not looked for again on every request
+            self.assertFalse(navigation.load())
+            clock.advance(navigation.RETRY_SECONDS)
+            self.assertEqual(navigation.locate("page", 1)["first_verse"]["verse_key"], "1:1")
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used_by_bytes(self):
+        lru = response_cache.LRUCache(100)
+        lru.set("a", 1, 60, 40)
+        lru.set("b", 2, 60, 40)
+        self.assertEqual(lru.get("a"), 1)  # "b" is now the least recently used
+        lru.set("c", 3, 60, 40)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual((lru.get("a"), lru.get("c"), lru.size), (1, 3, 80))
+
+    def test_values_larger_than_the_cache_are_not_kept(self):
+        lru = response_cache.LRUCache(100)
+        lru.set("a", 1, 60, 40)
+        lru.set("huge", 2, 60, 101)
+        self.assertIsNone(lru.get("huge"))
+        self.assertEqual(lru.get("a"), 1)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    key = f"{response_cache.KEY_PREFIX}:test:key"
+
+    def setUp(self):
+        cache.clear()
+        response_cache.l1.clear()
+
+    def test_concurrent_misses_make_one_upstream_call(self):
+        calls = []
+        start = threading.Barrier(8)
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"verses": [1, 2, 3]}
+
+        results = []
+
+        def reader():
+            start.wait()
+            results.append(response_cache.get_or_fetch(self.key, fetch, 60))
+
+        threads = [threading.Thread(target=reader) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"verses": [1, 2, 3]}] * 8)
+
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        response_cache.store(self.key, {"version": 1}, 60)
+        refreshing = threading.Event()
+        proceed = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            refreshing.set()
+            proceed.wait(2)
+            return {"version": 2}
+
+        later = time.time() + 61
+        with mock.patch("api.services.response_cache.time.time", return_value=later):
+            self.assertEqual(response_cache.get_or_fetch(self.key, fetch, 60), {"version": 1})
+            self.assertTrue(refreshing.wait(2))
+            # A second hit during the refresh is served stale too and starts no other fetch
+            self.assertEqual(response_cache.get_or_fetch(self.key, fetch, 60), {"version": 1})
+            proceed.set()
+            deadline = time.monotonic() + 2
+            while response_cache.lookup(self.key) != {"version": 2} and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(response_cache.lookup(self.key), {"version": 2})
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_refresh_keeps_the_stale_entry(self):
+        response_cache.store(self.key, {"version": 1}, 60)
+        with mock.patch("api.services.response_cache.time.time", return_value=time.time() + 61):
+            response_cache._acquire(self.key)
+            response_cache._refresh(self.key, mock.Mock(side_effect=upstream.UpstreamUnavailable()), 60)
+            self.assertEqual(response_cache.get_or_fetch(self.key, mock.Mock(return_value=None), 60), {"version": 1})
+
+
+class VerseByKeyTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.l1.clear()
+
+    def test_profiles_get_the_verse_text(self):
+        calls = []
+
+        def get_json(path, params=None, local=None):
+            calls.append(params)
+            verse = {"id": 262, "verse_key": "2:255", "verse_number": 255, "juz_number": 3}
+            if "text_uthmani" in params["fields"].split(","):
+                verse["text_uthmani"] = "ٱللَّهُ لَآ إِلَٰهَ إِلَّا هُوَ"
+            return {"verse": verse}
+
+        with mock.patch.object(quran_client, "_get_json", side_effect=get_json):
+            response = self.client.get("/api/verses/by_key/2:255/", {"fields": "minimal"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["verse"],
+            {"verse_key": "2:255", "verse_number": 255, "text_uthmani": "ٱللَّهُ لَآ إِلَٰهَ إِلَّا هُوَ"},
+        )
+        # Translations were not asked for, so they are not fetched
+        self.assertEqual(calls, [{"fields": "text_uthmani"}])
+
+    def test_default_request_asks_for_text_and_translations(self):
+        with mock.patch.object(quran_client, "_get_json", return_value={"verse": {}}) as get_json:
+            self.client.get("/api/verses/by_key/1:1/")
+        self.assertEqual(get_json.call_args.args[1], {"fields": "text_uthmani,translations", "translations": "131"})
+
+
+class SearchIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        corpus = sqlite3.connect(":memory:")
+        corpus.executescript("""
+            CREATE TABLE verses (id INTEGER PRIMARY KEY, verse_key TEXT, text_uthmani TEXT);
+            CREATE TABLE translations (verse_id INTEGER, resource_id INTEGER, data TEXT);
+        """)
+        for verse_id, verse_key, text in [
+            (1, "1:1", "In the name of Allah, the Entirely Merciful, the Especially Merciful."),
+            (3, "1:3", "The Entirely Merciful, the Especially Merciful,"),
+            (5, "1:5", "It is You we worship and You we ask for help."),
+            (8, "2:1", "Those who believe in the unseen."),
+            (9, "2:2", "As for those who disbelieve, it is the same to them."),
+            (10, "2:3", "Those who believed and did righteous deeds."),
+        ]:
+            corpus.execute("INSERT INTO verses VALUES (?, ?, ?)", (verse_id, verse_key, ""))
+            corpus.execute("INSERT INTO translations VALUES (?, 131, ?)", (verse_id, json.dumps({"text": text})))
+        path = os.path.join(directory.name, "search.sqlite3")
+        search_index.build(path, corpus)
+        patch = mock.patch.object(search_index, "INDEX_PATH", path)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _keys(self, query):
+        return [r["verse_key"] for r in search_index.search(query)["search"]["results"]]
+
+    def test_prefixes_are_not_stemmed(self):
+        # Porter stems "merciful" to "merci", which a stemmed "mercif*" would never match
+        self.assertEqual(self._keys("mercif"), ["1:3", "1:1"])
+        self.assertEqual(self._keys("mercif* name"), ["1:1"])
+        # Whole words are still stemmed
+        self.assertEqual(self._keys("worshipping hel"), ["1:5"])
+
+    def test_last_term_also_matches_as_a_stemmed_word(self):
+        self.assertEqual(sorted(self._keys("believers")), ["2:1", "2:3"])
+        self.assertEqual(sorted(self._keys("those believers")), ["2:1", "2:3"])
+        # An explicit * is only ever a prefix
+        self.assertEqual(self._keys("believers*"), [])
+        [result] = search_index.search("righteous believer")["search"]["results"]
+        self.assertEqual(result["translations"][0]["text"], "Those who <em>believed</em> and did <em>righteous</em> deeds.")
+
+    def test_index_serves_search_without_the_corpus(self):
+        with mock.patch.object(quran_client, "QURAN_CLIENT_BACKEND", "local"), \
+                mock.patch.object(quran_client.corpus, "is_available", return_value=False), \
+                mock.patch.object(quran_client, "_get_json") as get_json:
+            data = quran_client.search_verses.__wrapped__("mercif")
+        get_json.assert_not_called()
+        self.assertEqual(data["search"]["total_results"], 2)
+
+    def test_terms_and_prefixes_are_both_highlighted(self):
+        [result] = search_index.search("named especial")["search"]["results"]
+        self.assertEqual(
+            result["translations"][0]["text"],
+            "In the <em>name</em> of Allah, the Entirely Merciful, the <em>Especially</em> Merciful.",
+        )
+
+
+class WarmCacheTests(SimpleTestCase):
+    def test_exits_without_a_shared_cache(self):
+        out = io.StringIO()
+        with mock.patch.object(quran_client, "get_chapters") as get_chapters:
+            call_command("warm_cache", stdout=out)
+        get_chapters.assert_not_called()
+        self.assertIn("REDIS_URL", out.getvalue())
+
+    def test_listing_waits_for_admission(self):
+        budgets = []
+
+        def listing(name):
+            return lambda **kwargs: budgets.append(admission._wait_budget.get()) or {name: []}
+
+        with mock.patch.object(admission, "_shared_cache", return_value=True), \
+                mock.patch.object(quran_client, "get_chapters", side_effect=listing("chapters")) as get_chapters, \
+                mock.patch.object(quran_client, "get_juzs", side_effect=listing("juzs")) as get_juzs, \
+                mock.patch.object(response_cache, "lookup", return_value={}):
+            get_chapters.cache_key = get_juzs.cache_key = lambda *a, **kw: "key"
+            call_command("warm_cache", stdout=io.StringIO())
+        self.assertEqual(budgets, [upstream.READ_TIMEOUT, upstream.READ_TIMEOUT])
+
+
+class QFTokenTests(SimpleTestCase):
+    config = {"auth_base_url": "https://auth.test", "client_id": "reader", "client_secret": "secret"}
+
+    def setUp(self):
+        cache.clear()
+        self.clock = FakeClock()
+        self.time = mock.Mock(time=self.clock, monotonic=self.clock, sleep=self.clock.advance)
+        for patch in (
+            mock.patch.object(qf_token, "time", self.time),
+            mock.patch.dict(qf_token._current, key=None, config=None, token=None, expires_at=0, lifetime=0),
+            mock.patch.object(qf_token, "_ensure_refresher"),
+            mock.patch.object(qf_token, "_wake"),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.key = qf_token._cache_key(self.config)
+
+    def _entry(self, token, lifetime=3600):
+        return {"token": token, "expires_at": self.clock() + lifetime, "lifetime": lifetime}
+
+    def _hold(self, token, lifetime=3600):
+        entry = self._entry(token, lifetime)
+        cache.set(self.key, entry)
+        qf_token._adopt(self.config, entry)
+
+    def test_contended_lock_fetches_once(self):
+        # Real waits: the other workers poll while the lock holder is fetching
+        self.time.monotonic, self.time.sleep = time.monotonic, time.sleep
+
+        def fetch(config):
+            time.sleep(0.1)
+            return self._entry("fresh")
+
+        tokens = []
+        with mock.patch.object(qf_token, "_fetch", side_effect=fetch) as _fetch:
+            workers = [threading.Thread(target=lambda: tokens.append(qf_token._renew(self.config, "request")["token"]))
+                       for _ in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(_fetch.call_count, 1)
+        self.assertEqual(tokens, ["fresh"] * 4)
+
+    def test_waiter_takes_the_holders_token(self):
+        cache.add(f"{self.key}:lock", 1)
+        polls = []
+
+        def sleep(seconds):
+            polls.append(seconds)
+            self.clock.advance(seconds)
+            if len(polls) == 3:
+                cache.set(self.key, self._entry("from-holder"))
+
+        self.time.sleep = sleep
+        with mock.patch.object(qf_token, "_fetch") as _fetch:
+            self.assertEqual(qf_token.get_token(self.config), "from-holder")
+        _fetch.assert_not_called()
+
+    def test_refresher_renews_at_the_margin_or_half_the_lifetime(self):
+        class Stop(Exception):
+            pass
+
+        for lifetime, delay in ((3600, 3600 - qf_token.REFRESH_MARGIN), (400, 200)):
+            with self.subTest(lifetime=lifetime):
+                cache.clear()
+                self._hold("old", lifetime)
+                waits = []
+
+                def wait(seconds):
+                    waits.append(seconds)
+                    if len(waits) == 2:
+                        raise Stop
+                    self.clock.advance(seconds)
+
+                qf_token._wake.wait.side_effect = wait
+                with mock.patch.object(qf_token, "_fetch", side_effect=lambda config: self._entry("renewed", lifetime)) as _fetch, \
+                        self.assertRaises(Stop):
+                    qf_token._refresh_loop()
+                self.assertEqual(waits, [delay, delay])
+                self.assertEqual(_fetch.call_count, 1)
+                self.assertEqual(qf_token._current["token"], "renewed")
+
+    def test_invalidate_drops_only_the_matching_token(self):
+        self._hold("old")
+        qf_token.invalidate(self.config, "someone-elses")
+        self.assertEqual(qf_token._current["token"], "old")
+        self.assertEqual(cache.get(self.key)["token"], "old")
+
+        # Another worker already renewed the shared entry: only this worker's copy goes
+        cache.set(self.key, self._entry("new"))
+        qf_token.invalidate(self.config, "old")
+        self.assertIsNone(qf_token._current["token"])
+        self.assertEqual(cache.get(self.key)["token"], "new")
+
+        qf_token.invalidate(self.config, "new")
+        self.assertIsNone(cache.get(self.key))
+        qf_token._wake.set.assert_called()
+
+    def test_peek_never_fetches(self):
+        with mock.patch.object(qf_token, "_fetch") as _fetch:
+            self.assertIsNone(qf_token.peek_token(self.config))
+            cache.set(self.key, self._entry("shared", lifetime=600))
+            self.assertEqual(qf_token.peek_token(self.config), "shared")
+            self.clock.advance(600 - qf_token.EXPIRY_BUFFER)
+            self.assertIsNone(qf_token.peek_token(self.config))
+        _fetch.assert_not_called()
+
+
+class TafsirHedgeTests(SimpleTestCase):
+    def setUp(self):
+        for patch in (
+            mock.patch.object(quran_client, "TAFSIR_HEDGE_DELAY", "0.05"),
+            mock.patch.object(quran_client, "_record_tafsir"),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    @staticmethod
+    def _answer(source, after=0):
+        def fetch(*args):
+            time.sleep(after)
+            return {"tafsirs": [{"text": source}]}
+        return fetch
+
+    def _fetch(self, qf, quran_com):
+        with mock.patch.object(quran_client, "_qf_tafsir", side_effect=qf), \
+                mock.patch.object(quran_client, "_quran_com_tafsir", side_effect=quran_com) as fallback:
+            data = quran_client._fetch_tafsir(169, "2:255", None)
+        return data["tafsirs"][0]["text"], fallback
+
+    def test_qf_within_the_delay_wins_without_a_hedge(self):
+        source, fallback = self._fetch(self._answer("qf"), self._answer("quran_com"))
+        self.assertEqual(source, "qf")
+        fallback.assert_not_called()
+        quran_client._record_tafsir.assert_called_once_with("qf", False)
+
+    def test_slow_qf_starts_the_hedge_and_the_first_answer_wins(self):
+        source, _ = self._fetch(self._answer("qf", after=0.5), self._answer("quran_com"))
+        self.assertEqual(source, "quran_com")
+        quran_client._record_tafsir.assert_called_once_with("quran_com", True)
+
+        quran_client._record_tafsir.reset_mock()
+        source, _ = self._fetch(self._answer("qf", after=0.1), self._answer("quran_com", after=0.5))
+        self.assertEqual(source, "qf")
+        quran_client._record_tafsir.assert_called_once_with("qf", True)
+
+    def test_both_failing_raises_client_errors_as_is_and_otherwise_unavailable(self):
+        def failing(error):
+            def fetch(*args):
+                raise error
+            return fetch
+
+        not_found = requests.HTTPError(response=mock.Mock(status_code=404))
+        with self.assertRaises(requests.HTTPError) as raised:
+            self._fetch(lambda *args: None, failing(not_found))
+        self.assertIs(raised.exception, not_found)
+        for error in (requests.HTTPError(response=mock.Mock(status_code=502)), requests.ConnectionError()):
+            with self.subTest(error=error), self.assertRaises(upstream.UpstreamUnavailable):
+                self._fetch(failing(requests.ConnectionError()), failing(error))
+        quran_client._record_tafsir.assert_called_with("failed", False)
+
+    def test_auto_delay_needs_twenty_samples(self):
+        with mock.patch.object(quran_client, "TAFSIR_HEDGE_DELAY", "auto"), \
+                mock.patch.object(quran_client, "_qf_tafsir_latencies", deque([0.3] * 19, maxlen=200)):
+            self.assertEqual(quran_client._tafsir_hedge_delay(), 1.0)
+            quran_client._qf_tafsir_latencies.append(0.3)
+            self.assertAlmostEqual(quran_client._tafsir_hedge_delay(), 0.3)
+            quran_client._qf_tafsir_latencies.extend([9.0] * 20)
+            self.assertEqual(quran_client._tafsir_hedge_delay(), 5.0)
+
+
+class TafsirStoreTests(SimpleTestCase):
+    chapter = {
+        "tafsirs": [
+            {"verse_key": "1:1", "text": "<p>In the name</p>"},
+            {"verse_key": "1:2", "text": ""},
+            {"verse_key": "1:3", "text": "<p>The Merciful</p>"},
+        ],
+        "meta": {"tafsir_name": "Ibn Kathir", "filters": {"chapter_number": "1"}},
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patch = mock.patch.object(tafsir_store, "STORE_PATH", os.path.join(directory.name, "tafsir.sqlite3"))
+        patch.start()
+        self.addCleanup(patch.stop)
+        tafsir_store.lru.clear()
+        self.addCleanup(tafsir_store.lru.clear)
+
+    def _wait_for_fetches(self):
+        deadline = time.monotonic() + 5
+        while tafsir_store._inflight and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_chapter_is_split_per_verse_with_the_verse_in_meta(self):
+        self.assertEqual(tafsir_store.store_chapter(169, 1, self.chapter), 2)
+        fetch = mock.Mock()
+        self.assertEqual(tafsir_store.get(169, "1:3", fetch), {
+            "tafsirs": [{"verse_key": "1:3", "text": "<p>The Merciful</p>"}],
+            "meta": {"tafsir_name": "Ibn Kathir", "filters": {"verse_key": "1:3"}},
+        })
+        # Stored without text: the caller fetches the verse itself, the chapter is not fetched again
+        self.assertIsNone(tafsir_store.get(169, "1:2", fetch))
+        fetch.assert_not_called()
+
+    def test_missing_chapter_is_fetched_once_in_the_background(self):
+        release = threading.Event()
+
+        def fetch_chapter(chapter_id):
+            release.wait(5)
+            return self.chapter
+
+        fetch = mock.Mock(side_effect=fetch_chapter)
+        self.assertIsNone(tafsir_store.get(169, "1:1", fetch))
+        self.assertIsNone(tafsir_store.get(169, "1:3", fetch))
+        release.set()
+        self._wait_for_fetches()
+        fetch.assert_called_once_with(1)
+        self.assertEqual(tafsir_store.get(169, "1:1", fetch)["tafsirs"][0]["text"], "<p>In the name</p>")
+
+    def test_expired_chapter_is_fetched_again(self):
+        tafsir_store.store_chapter(169, 1, self.chapter)
+        fetch = mock.Mock(return_value=self.chapter)
+        with mock.patch.object(tafsir_store, "MAX_AGE", -1):
+            self.assertIsNone(tafsir_store.get(169, "1:1", fetch))
+            self._wait_for_fetches()
+        fetch.assert_called_once_with(1)
+
+    def test_unknown_verses_are_not_looked_up(self):
+        fetch = mock.Mock()
+        self.assertIsNone(tafsir_store.get(169, "1:8", fetch))
+        fetch.assert_not_called()
+
+
+class ConditionalTests(SimpleTestCase):
+    def _chapters(self, data):
+        return mock.patch("api.views.get_chapters", return_value=data)
+
+    def test_etag_cache_control_and_304(self):
+        with self._chapters({"chapters": [{"id": 1}]}):
+            response = self.client.get("/api/chapters/")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("public", response["Cache-Control"])
+            self.assertIn(f"max-age={MAX_AGES['text']}", response["Cache-Control"])
+            self.assertIn("Accept", response["Vary"])
+            cached = self.client.get("/api/chapters/", HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(cached.status_code, 304)
+            self.assertEqual(cached.content, b"")
+            self.assertEqual(self.client.get("/api/chapters/", HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_passthrough_body_keeps_the_cached_objects_etag(self):
+        data = fastjson.decode(b'{"chapters":[{"id":1}]}')
+        with self._chapters(data):
+            response = self.client.get("/api/chapters/")
+        self.assertEqual(response.content, data.raw)
+        self.assertEqual(response["ETag"], data.etag)
+
+    def test_head_gets_the_same_headers(self):
+        with self._chapters({"chapters": [{"id": 1}]}):
+            get = self.client.get("/api/chapters/")
+            head = self.client.head("/api/chapters/")
+        self.assertEqual(head.status_code, 200)
+        self.assertEqual(head["ETag"], get["ETag"])
+        self.assertEqual(head["Cache-Control"], get["Cache-Control"])
+
+    def test_errors_are_not_cacheable(self):
+        response = self.client.get("/api/chapters/115/")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Cache-Control"))
+
+
+class VerseStreamTests(SimpleTestCase):
+    pages = 4
+
+    def _fetcher(self, fail_on=None, error=None):
+        def fetch_page(chapter_id, translations, audio, words, tafsirs, page, per_page, tajweed, fields=None):
+            # Later pages answer first
+            time.sleep((self.pages - page) * 0.05)
+            if page == fail_on:
+                raise error
+            return {
+                "verses": [{"verse_key": f"2:{(page - 1) * per_page + i}"} for i in (1, 2)],
+                "pagination": {"total_pages": self.pages},
+            }
+        return mock.patch.object(quran_client, "_fetch_verses", side_effect=fetch_page)
+
+    def _lines(self, response):
+        return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+    def test_verses_are_written_in_page_order(self):
+        with self._fetcher():
+            response = self.client.get("/api/chapters/2/verses/stream/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["Content-Type"], "application/x-ndjson")
+            keys = [line["verse_key"] for line in self._lines(response)]
+        per_page = quran_client.BATCH_WINDOW
+        self.assertEqual(keys, [f"2:{(page - 1) * per_page + i}" for page in range(1, self.pages + 1) for i in (1, 2)])
+
+    def test_failure_mid_stream_ends_with_an_error_line(self):
+        with self._fetcher(fail_on=3, error=upstream.UpstreamUnavailable()):
+            lines = self._lines(self.client.get("/api/chapters/2/verses/stream/"))
+        self.assertEqual(len(lines), 5)  # pages 1 and 2, then the error
+        self.assertEqual(set(lines[-1]), {"error"})
+
+    def test_bad_first_page_gets_a_status(self):
+        for error, status in (
+            (upstream.UpstreamUnavailable(), 503),
+            (requests.HTTPError(response=mock.Mock(status_code=404)), 404),
+        ):
+            with self.subTest(status=status), self._fetcher(fail_on=1, error=error):
+                response = self.client.get("/api/chapters/2/verses/stream/")
+                self.assertEqual(response.status_code, status)
+                self.assertFalse(response.streaming)
@@ -14,13 +14,19 @@ urlpatterns = [
     path("chapters/", views.chapters),
     path("chapters/<int:chapter_id>/", views.chapter_detail),
     path("chapters/<int:chapter_id>/verses/", views.verses),
+    path("chapters/<int:chapter_id>/verses/stream/", views.verses_stream),
     path("juzs/", views.juzs),
     path("juzs/<int:juz_number>/verses/", views.verses_by_juz),
+    path("juzs/<int:juz_number>/verses/stream/", views.verses_by_juz_stream),
     path("pages/<int:page_number>/verses/", views.verses_by_page),
     path("search/", views.search),
     path("translations/", views.translations),
     path("recitations/", views.recitations),
     path("verses/by_key/<str:verse_key>/", views.verse_by_key),
+    path("verses/batch/", views.verses_batch),
     path("tafsirs/", views.tafsirs),
     path("tafsirs/<int:tafsir_id>/", views.tafsir_verse),
+    path("navigation/locate/", views.navigation_locate),
+    path("audio/<path:path>", views.audio),
+    path("metrics/", views.metrics),
 ]
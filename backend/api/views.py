@@ -1,10 +1,24 @@
 """
 API proxy views - forward requests to Quran.com API
+Content views skip authentication (no session read), so shared caches never see Vary: Cookie.
 """
-from django.core.cache import cache
-from rest_framework.decorators import api_view
+import functools
+import hmac
+import itertools
+import os
+import re
+
+import requests
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from rest_framework.decorators import api_view, authentication_classes
 from rest_framework.response import Response
 
+from .conditional import MAX_AGES, conditional
+from .projection import from_params as projection_from
+from .services import audio_cache, fastjson, metrics as metrics_registry, navigation
 from .services.quran_client import (
     get_chapters,
     get_chapter,
@@ -15,25 +29,69 @@ from .services.quran_client import (
     get_recitations,
     get_juzs,
     get_verse_by_key,
+    get_verses_batch,
+    expand_verse_keys,
     get_tafsirs,
     get_tafsir_by_verse,
     search_verses,
+    stream_verses,
+    stream_verses_by_juz,
+    PAGE_FIELDS,
+    VERSE_FIELDS,
 )
 
 
-@api_view(["GET"])
+def _known(**divisions):
+    """
+    Reject path parameters outside the Mushaf (chapter_id=115, page_number=605, verse_key=1:8) with a 404
+    before anything is fetched. `divisions` maps parameter name to "verse" or a navigation division.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            for name, division in divisions.items():
+                if division == "verse":
+                    known = navigation.parse_verse_key(kwargs[name]) is not None
+                else:
+                    known = navigation.is_valid(division, kwargs[name])
+                if not known:
+                    return Response({"error": "Not found"}, status=404)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _project(params, fetch, base_fields=None, **fetch_kwargs):
+    """
+    Run `fetch` narrowed by the fields=/exclude= projection in `params` and prune its result.
+    Returns (data, None), or (None, 400 response) for an unknown field or profile.
+    """
+    try:
+        projection = projection_from(params)
+    except ValueError as e:
+        return None, Response({"error": str(e)}, status=400)
+    if projection is None:
+        return fetch(**fetch_kwargs), None
+    return projection.apply(fetch(**projection.narrow(base_fields, **fetch_kwargs))), None
+
+
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
 def chapters(request):
-    """List all 114 chapters (cached 24h)."""
+    """List all 114 chapters."""
     language = request.GET.get("language", "en")
-    cache_key = f"chapters_{language}"
-    data = cache.get(cache_key)
-    if data is None:
-        data = get_chapters(language=language)
-        cache.set(cache_key, data, timeout=60 * 60 * 24)  # 24 hours
+    data = get_chapters(language=language)
     return Response(data)
 
 
-@api_view(["GET"])
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
+@_known(chapter_id="chapter")
 def chapter_detail(request, chapter_id):
     """Get single chapter metadata."""
     language = request.GET.get("language", "en")
@@ -41,12 +99,17 @@ def chapter_detail(request, chapter_id):
     return Response(data)
 
 
-@api_view(["GET"])
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
+@_known(chapter_id="chapter")
 def verses(request, chapter_id):
-    """Get verses for a chapter."""
+    """Get verses for a chapter. fields=/exclude= project each verse (see api/projection.py)."""
     tafsirs = request.GET.get("tafsirs")
-    data = get_verses(
-        chapter_id,
+    data, error = _project(
+        request.GET,
+        functools.partial(get_verses, chapter_id),
+        VERSE_FIELDS,
         translations=request.GET.get("translations", "131"),
         audio=int(request.GET.get("audio", 1)),
         words=request.GET.get("words", "false").lower() == "true",
@@ -55,23 +118,89 @@ def verses(request, chapter_id):
         per_page=int(request.GET.get("per_page", 20)),
         tajweed=request.GET.get("tajweed", "false").lower() == "true",
     )
-    return Response(data)
+    return error or Response(data)
 
 
-@api_view(["GET"])
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
+@_known(juz_number="juz")
 def verses_by_juz(request, juz_number):
     """Get verses by Juz number."""
-    data = get_verses_by_juz(
-        juz_number,
+    data, error = _project(
+        request.GET,
+        functools.partial(get_verses_by_juz, juz_number),
+        VERSE_FIELDS,
         translations=request.GET.get("translations", "131"),
         page=int(request.GET.get("page", 1)),
         per_page=int(request.GET.get("per_page", 20)),
         tajweed=request.GET.get("tajweed", "false").lower() == "true",
     )
-    return Response(data)
+    return error or Response(data)
+
+
+def _ndjson(verses, projection):
+    try:
+        for verse in verses:
+            yield fastjson.dumps(projection.verse(verse) if projection else verse) + b"\n"
+    except Exception:
+        # Headers are long gone; a final error line tells the client the listing is incomplete
+        yield fastjson.dumps({"error": "Upstream unavailable, stream incomplete"}) + b"\n"
+
+
+def _stream(stream, params, base_fields, **fetch_kwargs):
+    """
+    NDJSON response of `stream(**fetch_kwargs)`, one verse per line, narrowed/pruned by fields=/exclude=.
+    The first verse is fetched before responding, so a bad id or a down upstream still gets a proper status.
+    """
+    try:
+        projection = projection_from(params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    if projection is not None:
+        fetch_kwargs = projection.narrow(base_fields, **fetch_kwargs)
+    verses = stream(**fetch_kwargs)
+    first = next(verses, None)
+    lines = itertools.chain([first], verses) if first is not None else iter(())
+    response = StreamingHttpResponse(_ndjson(lines, projection), content_type="application/x-ndjson")
+    patch_cache_control(response, public=True, max_age=MAX_AGES["text"])
+    response["X-Accel-Buffering"] = "no"  # let nginx pass lines through as they are written
+    return response
 
 
 @api_view(["GET"])
+@authentication_classes([])
+@_known(chapter_id="chapter")
+def verses_stream(request, chapter_id):
+    """Every verse of a chapter as NDJSON, written in order as upstream pages arrive."""
+    return _stream(
+        functools.partial(stream_verses, chapter_id),
+        request.GET,
+        VERSE_FIELDS,
+        translations=request.GET.get("translations", "131"),
+        audio=int(request.GET.get("audio", 1)),
+        words=request.GET.get("words", "false").lower() == "true",
+        tajweed=request.GET.get("tajweed", "false").lower() == "true",
+    )
+
+
+@api_view(["GET"])
+@authentication_classes([])
+@_known(juz_number="juz")
+def verses_by_juz_stream(request, juz_number):
+    """Every verse of a juz as NDJSON, written in order as upstream pages arrive."""
+    return _stream(
+        functools.partial(stream_verses_by_juz, juz_number),
+        request.GET,
+        VERSE_FIELDS,
+        translations=request.GET.get("translations", "131"),
+        tajweed=request.GET.get("tajweed", "false").lower() == "true",
+    )
+
+
+@conditional("resources")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
 def translations(request):
     """List available translations."""
     language = request.GET.get("language", "en")
@@ -79,44 +208,99 @@ def translations(request):
     return Response(data)
 
 
-@api_view(["GET"])
+@conditional("resources")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
 def recitations(request):
     """List available reciters."""
     data = get_recitations()
     return Response(data)
 
 
-@api_view(["GET"])
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
 def juzs(request):
     """List 30 Juz."""
     data = get_juzs()
     return Response(data)
 
 
-@api_view(["GET"])
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
+@_known(verse_key="verse")
 def verse_by_key(request, verse_key):
     """Get single verse by key (e.g. 1:1)."""
-    data = get_verse_by_key(
-        verse_key,
+    data, error = _project(
+        request.GET,
+        functools.partial(get_verse_by_key, verse_key),
+        VERSE_FIELDS,
         translations=request.GET.get("translations", "131"),
     )
-    return Response(data)
+    return error or Response(data)
 
 
-@api_view(["GET"])
+@conditional("text")
+@api_view(["GET", "HEAD", "POST"])
+@authentication_classes([])
+def verses_batch(request):
+    """Many verses in one request: ?keys=1:1,2:255-257 or POST {"keys": [...]}; results keep request order."""
+    if request.method == "POST":
+        if not isinstance(request.data, dict):
+            return Response({"error": "body must be an object"}, status=400)
+        specs = request.data.get("keys") or []
+        params = request.data
+    else:
+        specs = request.GET.get("keys", "").split(",")
+        params = request.GET
+    if isinstance(specs, str):
+        specs = specs.split(",")
+    if not isinstance(specs, list) or not all(isinstance(spec, str) for spec in specs):
+        return Response({"error": "keys must be verse key strings"}, status=400)
+    try:
+        keys = expand_verse_keys(specs)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    if not keys:
+        return Response({"error": "keys required"}, status=400)
+    try:
+        audio = int(params.get("audio", 1))
+    except (TypeError, ValueError):
+        return Response({"error": "audio must be a recitation id"}, status=400)
+    data, error = _project(
+        params,
+        functools.partial(get_verses_batch, keys),
+        VERSE_FIELDS,
+        translations=params.get("translations", "131"),
+        audio=audio,
+        words=str(params.get("words", "false")).lower() == "true",
+    )
+    return error or Response(data)
+
+
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
+@_known(page_number="page")
 def verses_by_page(request, page_number):
     """Get verses by Mushaf page (1-604)."""
-    data = get_verses_by_page(
-        page_number,
+    data, error = _project(
+        request.GET,
+        functools.partial(get_verses_by_page, page_number),
+        PAGE_FIELDS,
         translations=request.GET.get("translations", "131"),
         per_page=int(request.GET.get("per_page", 20)),
         audio=int(request.GET.get("audio", 1)),
         words=request.GET.get("words", "false").lower() == "true",
+        tajweed=True,
     )
-    return Response(data)
+    return error or Response(data)
 
 
-@api_view(["GET"])
+@conditional("search")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
 def search(request):
     """Full-text search across the Quran."""
     q = request.GET.get("q", "").strip()
@@ -131,23 +315,153 @@ def search(request):
     return Response(data)
 
 
-@api_view(["GET"])
+@conditional("resources")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
 def tafsirs(request):
     """List available tafsirs."""
     data = get_tafsirs()
     return Response(data)
 
 
-@api_view(["GET"])
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
 def tafsir_verse(request, tafsir_id):
     """Get tafsir for verse(s)."""
     verse_key = request.GET.get("verse_key")
     chapter_number = request.GET.get("chapter_number")
     if not verse_key and not chapter_number:
         return Response({"error": "verse_key or chapter_number required"}, status=400)
+    if verse_key and navigation.parse_verse_key(verse_key) is None:
+        return Response({"error": "Invalid verse_key"}, status=400)
+    if chapter_number and not navigation.is_valid("chapter", chapter_number):
+        return Response({"error": "Invalid chapter_number"}, status=400)
     data = get_tafsir_by_verse(
         tafsir_id,
         verse_key=verse_key,
         chapter_number=int(chapter_number) if chapter_number else None,
     )
     return Response(data)
+
+
+@conditional("text")
+@api_view(["GET", "HEAD"])
+@authentication_classes([])
+def navigation_locate(request):
+    """
+    Where ?verse_key= sits (chapter, juz, page, hizb, rub el hizb), or the first and last verse of one
+    ?chapter=, ?juz=, ?page=, ?hizb= or ?rub=. Answered from the local navigation index.
+    """
+    given = [name for name in ("verse_key", *navigation.SIZES) if request.GET.get(name)]
+    if len(given) != 1:
+        return Response({"error": "Give one of verse_key, chapter, juz, page, hizb or rub"}, status=400)
+    name = given[0]
+    try:
+        if name == "verse_key":
+            verse_id = navigation.parse_verse_key(request.GET[name])
+            if verse_id is None:
+                raise ValueError(name)
+            return Response(navigation.locate_verse(verse_id))
+        return Response(navigation.locate(name, request.GET[name]))
+    except ValueError:
+        return Response({"error": "Not found"}, status=404)
+    except navigation.IndexUnavailable:
+        return Response({"error": "Page, hizb and rub lookups are not available yet"}, status=503)
+
+
+def metrics(request):
+    """
+    Prometheus metrics for all workers, for `Authorization: Bearer <METRICS_TOKEN>`. Without METRICS_TOKEN
+    the endpoint is closed (open to anyone only with DEBUG on, for local development).
+    """
+    token = os.getenv("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied, token):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _FileRange:
+    """Bytes [start, start + length) of an open file. Gunicorn sendfile()s it via fileno() from the current offset."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self._file = file
+        self._remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def _byte_range(header, size):
+    """(start, end) inclusive for a single-range `Range` header, None to send the whole file, or "unsatisfiable"."""
+    match = _RANGE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None  # absent, malformed or multi-range: a 200 with the whole file is always allowed
+    first, last = match.groups()
+    if not first:  # suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+@require_safe
+def audio(request, path):
+    """
+    Recitation audio from the Quran.com CDN via the disk cache: /api/audio/<verse audio.url or word audio_url>.
+    Supports single byte ranges for seeking; playing a verse from the start prefetches the next verses.
+    A plain Django view: DRF content negotiation would reject the Accept headers audio elements send.
+    """
+    if not audio_cache.is_valid_path(path):
+        return JsonResponse({"error": "Not found"}, status=404)
+    try:
+        file = audio_cache.open_file(path)
+    except audio_cache.FileTooLarge:
+        return JsonResponse({"error": "Upstream error"}, status=502)
+    except requests.HTTPError as exc:
+        if exc.response is not None and exc.response.status_code == 404:
+            return JsonResponse({"error": "Not found"}, status=404)
+        return JsonResponse({"error": "Upstream error"}, status=502)
+    except requests.RequestException:  # includes UpstreamUnavailable
+        return JsonResponse({"error": "Audio is temporarily unavailable"}, status=503)
+
+    size = os.fstat(file.fileno()).st_size
+    byte_range = _byte_range(request.headers.get("Range", ""), size)
+    if byte_range == "unsatisfiable":
+        file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    content_type = audio_cache.content_type(path)
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(_FileRange(file, start, end - start + 1), status=206, content_type=content_type)
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    patch_cache_control(response, public=True, max_age=MAX_AGES["text"])
+    if byte_range is None or byte_range[0] == 0:
+        audio_cache.prefetch_after(path)
+    return response
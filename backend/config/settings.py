@@ -62,6 +62,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -162,7 +163,7 @@ if not CORS_ALLOWED_ORIGINS:
     ]
 CORS_ALLOW_CREDENTIALS = True  # Required for OAuth session cookies
 
-# Cache - for API responses (chapters rarely change)
+# Cache - L2 for quran_client responses (api/services/response_cache.py keeps an in-process L1)
 # Set REDIS_URL env (e.g. redis://localhost:6379/1) for Redis
 _redis_url = os.getenv('REDIS_URL')
 if _redis_url:
@@ -177,16 +178,26 @@ else:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-            'OPTIONS': {'MAX_ENTRIES': 100},
+            'OPTIONS': {'MAX_ENTRIES': 5000},
         }
     }
 
 # REST Framework - JWT auth for users app
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'EXCEPTION_HANDLER': 'api.exceptions.exception_handler',
 }
 
 # Static files for production
@@ -0,0 +1,117 @@
+"""
+JWT authentication that resolves the token's user from the Django cache instead of querying the
+users table on every request. Only what the checks need is cached - the active flag and the md5 of
+the password hash that revoke claims are compared with - never the row itself; views get a
+CachedUser with the id, which loads the row only if something reads another attribute. Entries are
+keyed by user id and dropped when the user is saved or deleted (password change, deactivation); a
+short TTL bounds staleness in workers that do not share the cache (LocMemCache) or for updates that
+bypass signals (QuerySet.update). With JWT_TOKEN_USER=1 views get a TokenUser built from the claims.
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from dotenv import load_dotenv  # type: ignore
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+load_dotenv()
+
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+JWT_TOKEN_USER = os.getenv("JWT_TOKEN_USER", "0").lower() in ("1", "true", "yes")
+KEY_PREFIX = "auth:v2"
+
+
+def _key(user_id):
+    return f"{KEY_PREFIX}:state:{user_id}"
+
+
+def _state(user):
+    return {
+        "is_active": user.is_active,
+        "password": get_md5_hash_password(user.password) if api_settings.CHECK_REVOKE_TOKEN else None,
+    }
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
+
+
+class CachedUser:
+    """The authenticated user as far as the cache knows it; other attributes load the row (once)."""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_model, user_id, is_active):
+        self.pk = self.id = user_id
+        self.is_active = is_active
+        self._user_model = user_model
+        self._row = None
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set in __init__
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._row is None:
+            self._row = self._user_model.objects.get(**{api_settings.USER_ID_FIELD: self.pk})
+        return getattr(self._row, name)
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return f"user {self.pk}"
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        state = cache.get(_key(user_id))
+        if state is None:
+            state = _state(self._load(user_id))
+            cache.set(_key(user_id), state, AUTH_USER_CACHE_TTL)
+        self._check(validated_token, state)
+        if JWT_TOKEN_USER:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        # Claims carry the id as a string; views compare and filter with the field's own type
+        user_id = self.user_model._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id)
+        return CachedUser(self.user_model, user_id, state["is_active"])
+
+    def _load(self, user_id):
+        try:
+            return self.user_model.objects.get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+    @staticmethod
+    def _check(validated_token, state):
+        """The checks JWTAuthentication.get_user makes on the user row, against the cached state."""
+        if api_settings.CHECK_USER_IS_ACTIVE and not state["is_active"]:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state["password"]:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+
+def _user_changed(sender, instance, **kwargs):
+    user_id = getattr(instance, api_settings.USER_ID_FIELD)
+    # After commit, so a concurrent request cannot re-cache the old row in between
+    transaction.on_commit(lambda: invalidate(user_id))
+
+
+def connect_signals():
+    user_model = get_user_model()
+    post_save.connect(_user_changed, sender=user_model, dispatch_uid="users.authentication.saved")
+    post_delete.connect(_user_changed, sender=user_model, dispatch_uid="users.authentication.deleted")
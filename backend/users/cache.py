@@ -0,0 +1,71 @@
+"""
+Per-user bookmark list cache. Each user has a version counter; writes bump it (after commit), and
+cached pages plus their ETag are keyed by it, so a bump invalidates them without deleting anything.
+Needs a cache shared by all workers (Redis): with per-process LocMemCache a bump would not reach
+the other workers, so "auto" leaves it off there.
+"""
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from dotenv import load_dotenv  # type: ignore
+
+load_dotenv()
+
+# "auto" (on when the cache backend is shared across workers), "on" or "off"
+BOOKMARK_CACHE = os.getenv("BOOKMARK_CACHE", "auto")
+BOOKMARK_CACHE_TTL = int(os.getenv("BOOKMARK_CACHE_TTL", str(60 * 60 * 24)))
+KEY_PREFIX = "bm:v1"
+
+
+def enabled():
+    if BOOKMARK_CACHE == "auto":
+        return "LocMemCache" not in settings.CACHES["default"]["BACKEND"]
+    return BOOKMARK_CACHE == "on"
+
+
+def _version_key(user_id):
+    return f"{KEY_PREFIX}:version:{user_id}"
+
+
+def version(user_id):
+    """Current list version. A lost counter restarts from the clock, never from a value already used."""
+    key = _version_key(user_id)
+    current = cache.get(key)
+    if current is None:
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        current = cache.get(key)
+    return current
+
+
+def bump(user_id):
+    """Invalidate the user's cached lists once the surrounding transaction (if any) commits."""
+    if not enabled():
+        return
+
+    def _bump():
+        try:
+            cache.incr(_version_key(user_id))
+        except ValueError:  # counter missing: start a fresh one
+            version(user_id)
+
+    transaction.on_commit(_bump)
+
+
+def _digest(user_id, current, url):
+    return hashlib.sha1(f"{user_id}:{current}:{url}".encode()).hexdigest()
+
+
+def etag(user_id, current, url):
+    return f'"{_digest(user_id, current, url)}"'
+
+
+def get_page(user_id, current, url):
+    return cache.get(f"{KEY_PREFIX}:list:{_digest(user_id, current, url)}")
+
+
+def set_page(user_id, current, url, data):
+    cache.set(f"{KEY_PREFIX}:list:{_digest(user_id, current, url)}", data, timeout=BOOKMARK_CACHE_TTL)
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookmarkDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verse_key', models.CharField(max_length=20)),
+                ('deleted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bookmark',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', '-created_at'], name='bookmark_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', 'updated_at'], name='bookmark_user_updated'),
+        ),
+        migrations.AddField(
+            model_name='bookmarkdeletion',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookmark_deletions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bookmarkdeletion',
+            index=models.Index(fields=['user', 'deleted_at'], name='bookmark_deletion_user_deleted'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='bookmarkdeletion',
+            unique_together={('user', 'verse_key')},
+        ),
+    ]
@@ -9,7 +9,24 @@ class Bookmark(models.Model):
     verse_number = models.PositiveIntegerField()
     text_preview = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ["user", "verse_key"]
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="bookmark_user_created"),
+            models.Index(fields=["user", "updated_at"], name="bookmark_user_updated"),
+        ]
+
+
+class BookmarkDeletion(models.Model):
+    """Tombstone for a deleted bookmark, so `since=` delta sync can tell clients to drop it."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="bookmark_deletions")
+    verse_key = models.CharField(max_length=20)
+    deleted_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["user", "verse_key"]
+        indexes = [models.Index(fields=["user", "deleted_at"], name="bookmark_deletion_user_deleted")]
@@ -5,5 +5,17 @@ from .models import Bookmark
 class BookmarkSerializer(serializers.ModelSerializer):
     class Meta:
         model = Bookmark
-        fields = ["id", "verse_key", "chapter_id", "verse_number", "text_preview", "created_at"]
-        read_only_fields = ["created_at"]
+        fields = ["id", "verse_key", "chapter_id", "verse_number", "text_preview", "created_at", "updated_at"]
+        read_only_fields = ["created_at", "updated_at"]
+
+
+class BookmarkUpsertSerializer(serializers.Serializer):
+    """One item of a bulk upsert (no uniqueness validator: existing bookmarks are updated)."""
+
+    verse_key = serializers.RegexField(r"^\d{1,3}:\d{1,3}$", max_length=20)
+    chapter_id = serializers.IntegerField(min_value=1, max_value=114)
+    verse_number = serializers.IntegerField(min_value=1)
+    text_preview = serializers.CharField(required=False, allow_blank=True, default="", trim_whitespace=False)
+
+    def validate_text_preview(self, value):
+        return value[:200]
@@ -1,3 +1,169 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users import authentication, cache as bookmark_cache, views
+from users.authentication import CachedJWTAuthentication
+from users.models import Bookmark, BookmarkDeletion
+
+User = get_user_model()
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("reader", password="secret-pass-1")
+        self.token = CachedJWTAuthentication().get_validated_token(str(AccessToken.for_user(self.user)))
+
+    def test_user_is_resolved_from_the_cache_after_the_first_request(self):
+        with self.assertNumQueries(1):
+            first = CachedJWTAuthentication().get_user(self.token)
+        with self.assertNumQueries(0):
+            second = CachedJWTAuthentication().get_user(self.token)
+        self.assertEqual(first.pk, self.user.pk)
+        self.assertEqual(second.pk, self.user.pk)
+        self.assertTrue(second.is_authenticated)
+
+    def test_only_auth_state_is_cached(self):
+        CachedJWTAuthentication().get_user(self.token)
+        state = cache.get(authentication._key(self.user.pk))
+        self.assertEqual(set(state), {"is_active", "password"})
+        self.assertNotIn(self.user.password, repr(state))
+
+    def test_other_attributes_load_the_row_once(self):
+        CachedJWTAuthentication().get_user(self.token)
+        user = CachedJWTAuthentication().get_user(self.token)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, "reader")
+            self.assertEqual(user.email, "")
+
+    def test_deactivation_drops_the_cached_state(self):
+        CachedJWTAuthentication().get_user(self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            CachedJWTAuthentication().get_user(self.token)
+
+
+class BookmarkTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("reader", password="secret-pass-1")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _bookmark(self, verse_key, **fields):
+        chapter, number = verse_key.split(":")
+        return Bookmark.objects.create(
+            user=self.user, verse_key=verse_key, chapter_id=int(chapter), verse_number=int(number), **fields
+        )
+
+    @staticmethod
+    def _item(verse_key, preview=""):
+        chapter, number = verse_key.split(":")
+        return {"verse_key": verse_key, "chapter_id": int(chapter), "verse_number": int(number), "text_preview": preview}
+
+
+class BookmarkBulkTests(BookmarkTestCase):
+    def test_upserts_and_deletes_in_one_request(self):
+        self._bookmark("1:1", text_preview="old")
+        self._bookmark("1:2")
+        response = self.client.post("/api/users/bookmarks/bulk/", {
+            "upsert": [self._item("1:1", "new"), self._item("2:255"), self._item("2:255", "last wins")],
+            "delete": ["1:2", "1:2", "3:1"],
+        }, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"upserted": 2, "deleted": 1})
+        previews = dict(Bookmark.objects.filter(user=self.user).values_list("verse_key", "text_preview"))
+        self.assertEqual(previews, {"1:1": "new", "2:255": "last wins"})
+        self.assertEqual(
+            set(BookmarkDeletion.objects.filter(user=self.user).values_list("verse_key", flat=True)), {"1:2", "3:1"}
+        )
+
+    def test_failure_rolls_back_the_whole_request(self):
+        self._bookmark("1:2")
+        with mock.patch.object(views, "_record_deletions", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                self.client.post("/api/users/bookmarks/bulk/", {
+                    "upsert": [self._item("2:255")], "delete": ["1:2"],
+                }, format="json")
+        self.assertEqual(list(Bookmark.objects.values_list("verse_key", flat=True)), ["1:2"])
+
+    def test_invalid_items_change_nothing(self):
+        response = self.client.post("/api/users/bookmarks/bulk/", {
+            "upsert": [self._item("2:255"), {"verse_key": "2:256"}],
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Bookmark.objects.exists())
+
+
+class BookmarkSyncTests(BookmarkTestCase):
+    def test_since_returns_changes_and_tombstones(self):
+        self._bookmark("1:1")
+        self._bookmark("1:2")
+        since = self.client.get("/api/users/bookmarks/", {"since": "2000-01-01T00:00:00Z"}).data["server_time"]
+        self.assertEqual(self.client.delete("/api/users/bookmarks/1:1/").status_code, 204)
+        self.client.post("/api/users/bookmarks/create/", self._item("2:255"), format="json")
+
+        data = self.client.get("/api/users/bookmarks/", {"since": since}).data
+        self.assertEqual([b["verse_key"] for b in data["results"]], ["2:255"])
+        self.assertEqual(data["deleted"], ["1:1"])
+
+        # Bookmarking a deleted verse again drops its tombstone
+        self.client.post("/api/users/bookmarks/create/", self._item("1:1"), format="json")
+        data = self.client.get("/api/users/bookmarks/", {"since": since}).data
+        self.assertEqual(data["deleted"], [])
+
+    def test_since_must_be_a_timestamp(self):
+        self.assertEqual(self.client.get("/api/users/bookmarks/", {"since": "yesterday"}).status_code, 400)
+
+
+class BookmarkPaginationTests(BookmarkTestCase):
+    def test_cursor_pages_are_stable_across_inserts(self):
+        now = timezone.now()
+        for minutes, key in enumerate(["1:1", "1:2", "1:3", "1:4", "1:5"]):
+            Bookmark.objects.filter(pk=self._bookmark(key).pk).update(created_at=now - timedelta(minutes=10 - minutes))
+        first = self.client.get("/api/users/bookmarks/", {"limit": 2}).data
+        self.assertEqual([b["verse_key"] for b in first["results"]], ["1:5", "1:4"])
+
+        self._bookmark("2:255")  # newer than everything: must not shift the following pages
+        seen = [b["verse_key"] for b in first["results"]]
+        url = first["next"]
+        while url:
+            page = self.client.get(url).data
+            seen += [b["verse_key"] for b in page["results"]]
+            url = page["next"]
+        self.assertEqual(seen, ["1:5", "1:4", "1:3", "1:2", "1:1"])
+
+
+class BookmarkCacheTests(BookmarkTestCase):
+    def setUp(self):
+        super().setUp()
+        patch = mock.patch.object(bookmark_cache, "BOOKMARK_CACHE", "on")
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_matching_etag_gets_304_until_the_list_changes(self):
+        self._bookmark("1:1")
+        first = self.client.get("/api/users/bookmarks/")
+        self.assertEqual(first.status_code, 200)
+        etag = first["ETag"]
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/users/bookmarks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/users/bookmarks/create/", self._item("2:255"), format="json")
+        changed = self.client.get("/api/users/bookmarks/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual([b["verse_key"] for b in changed.data["results"]], ["2:255", "1:1"])
@@ -7,5 +7,6 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view()),
     path("bookmarks/", views.bookmark_list),
     path("bookmarks/create/", views.bookmark_create),
+    path("bookmarks/bulk/", views.bookmark_bulk),
     path("bookmarks/<str:verse_key>/", views.bookmark_delete),
 ]
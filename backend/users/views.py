@@ -1,18 +1,92 @@
-from rest_framework import status
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers, status
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Bookmark
-from .serializers import BookmarkSerializer
+from . import cache as bookmark_cache
+from .models import Bookmark, BookmarkDeletion
+from .serializers import BookmarkSerializer, BookmarkUpsertSerializer
+
+# Upserts + deletes accepted by one bulk request
+MAX_BULK_BOOKMARKS = 1000
+
+
+class BookmarkCursorPagination(CursorPagination):
+    """Keyset pagination on created_at (served by the (user, -created_at) index); ?limit= sets the page size."""
+
+    ordering = "-created_at"
+    page_size = 100
+    page_size_query_param = "limit"
+    max_page_size = 500
+
+
+def _record_deletions(user_id, verse_keys):
+    """Upsert tombstones in one statement (no read-then-write, which SQLite serializes badly)."""
+    BookmarkDeletion.objects.bulk_create(
+        [BookmarkDeletion(user_id=user_id, verse_key=key) for key in verse_keys],
+        update_conflicts=True,
+        unique_fields=["user", "verse_key"],
+        update_fields=["deleted_at"],
+    )
+
+
+def _bookmark_changes(request, since):
+    """Delta sync: bookmarks created or updated after `since`, verse keys deleted after it, and the next `since`."""
+    since_dt = parse_datetime(since.replace(" ", "+"))  # an unencoded "+00:00" arrives as " 00:00"
+    if since_dt is None:
+        return Response({"error": "since must be an ISO 8601 timestamp"}, status=status.HTTP_400_BAD_REQUEST)
+    if timezone.is_naive(since_dt):
+        since_dt = timezone.make_aware(since_dt, dt_timezone.utc)
+    # Taken before reading, so a change committed meanwhile is returned again next time rather than missed
+    server_time = timezone.now()
+    changed = Bookmark.objects.filter(user_id=request.user.pk, updated_at__gt=since_dt).order_by("updated_at")
+    deleted = BookmarkDeletion.objects.filter(user_id=request.user.pk, deleted_at__gt=since_dt).values_list(
+        "verse_key", flat=True
+    )
+    return Response({
+        "results": BookmarkSerializer(changed, many=True).data,
+        "deleted": list(deleted),
+        "server_time": serializers.DateTimeField().to_representation(server_time),
+    })
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def bookmark_list(request):
-    bookmarks = Bookmark.objects.filter(user=request.user)
-    serializer = BookmarkSerializer(bookmarks, many=True)
-    return Response(serializer.data)
+    """Newest first, cursor-paginated (?limit=, then follow `next`). ?since=<time> returns only what changed after it."""
+    since = request.GET.get("since")
+    if since:
+        return _bookmark_changes(request, since)
+    if not bookmark_cache.enabled():
+        return _bookmark_page(request)
+    # Pages and their ETag are keyed by the user's list version: a 304 or a cache hit costs no query
+    user_id, url = request.user.pk, request.build_absolute_uri()
+    version = bookmark_cache.version(user_id)
+    etag = bookmark_cache.etag(user_id, version, url)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        data = bookmark_cache.get_page(user_id, version, url)
+        if data is None:
+            data = _bookmark_page(request).data
+            bookmark_cache.set_page(user_id, version, url, data)
+        response = Response(data)
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization", "Cookie"])
+    return response
+
+
+def _bookmark_page(request):
+    paginator = BookmarkCursorPagination()
+    page = paginator.paginate_queryset(Bookmark.objects.filter(user_id=request.user.pk), request)
+    return paginator.get_paginated_response(BookmarkSerializer(page, many=True).data)
 
 
 @api_view(["POST"])
@@ -27,7 +101,7 @@ def bookmark_create(request):
         return Response({"error": "verse_key, chapter_id, verse_number required"}, status=status.HTTP_400_BAD_REQUEST)
 
     bookmark, created = Bookmark.objects.get_or_create(
-        user=request.user,
+        user_id=request.user.pk,
         verse_key=verse_key,
         defaults={
             "chapter_id": chapter_id,
@@ -35,15 +109,64 @@ def bookmark_create(request):
             "text_preview": text_preview,
         },
     )
+    if created:
+        BookmarkDeletion.objects.filter(user_id=request.user.pk, verse_key=verse_key).delete()
+        bookmark_cache.bump(request.user.pk)
     if not created:
         return Response(BookmarkSerializer(bookmark).data, status=status.HTTP_200_OK)
     return Response(BookmarkSerializer(bookmark).data, status=status.HTTP_201_CREATED)
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bookmark_bulk(request):
+    """
+    Upsert and delete many bookmarks in one transaction:
+    {"upsert": [{"verse_key", "chapter_id", "verse_number", "text_preview"}, ...], "delete": ["2:255", ...]}.
+    Deletes apply after upserts; a key upserted twice keeps its last item.
+    """
+    upsert = request.data.get("upsert") or []
+    delete = request.data.get("delete") or []
+    if not isinstance(upsert, list) or not isinstance(delete, list) or not all(isinstance(k, str) for k in delete):
+        return Response(
+            {"error": "upsert must be a list of bookmarks and delete a list of verse keys"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(upsert) + len(delete) > MAX_BULK_BOOKMARKS:
+        return Response(
+            {"error": f"At most {MAX_BULK_BOOKMARKS} bookmarks per request"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    serializer = BookmarkUpsertSerializer(data=upsert, many=True)
+    serializer.is_valid(raise_exception=True)
+    # One row per key: Postgres rejects an upsert that touches the same row twice
+    items = {item["verse_key"]: item for item in serializer.validated_data}
+    delete = list(dict.fromkeys(delete))
+
+    with transaction.atomic():
+        if items:
+            Bookmark.objects.bulk_create(
+                [Bookmark(user_id=request.user.pk, **item) for item in items.values()],
+                update_conflicts=True,
+                unique_fields=["user", "verse_key"],
+                update_fields=["chapter_id", "verse_number", "text_preview", "updated_at"],
+            )
+            BookmarkDeletion.objects.filter(user_id=request.user.pk, verse_key__in=list(items)).delete()
+        deleted = 0
+        if delete:
+            deleted, _ = Bookmark.objects.filter(user_id=request.user.pk, verse_key__in=delete).delete()
+            _record_deletions(request.user.pk, delete)
+        if items or deleted:
+            bookmark_cache.bump(request.user.pk)
+    return Response({"upserted": len(items), "deleted": deleted})
+
+
 @api_view(["DELETE"])
 @permission_classes([IsAuthenticated])
 def bookmark_delete(request, verse_key):
-    deleted, _ = Bookmark.objects.filter(user=request.user, verse_key=verse_key).delete()
+    deleted, _ = Bookmark.objects.filter(user_id=request.user.pk, verse_key=verse_key).delete()
+    if deleted:
+        _record_deletions(request.user.pk, [verse_key])
+        bookmark_cache.bump(request.user.pk)
     if deleted:
         return Response(status=status.HTTP_204_NO_CONTENT)
     return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -30,4 +30,7 @@ python manage.py collectstatic --noinput
 echo "==> Restart Gunicorn (if systemd service exists)"
 sudo systemctl restart quran-reading 2>/dev/null || echo "  (skipped - run: sudo systemctl restart quran-reading)"
 
+echo "==> Warm response cache in the background (exits at once unless REDIS_URL shares it with Gunicorn)"
+(cd backend && nohup python manage.py warm_cache > warm_cache.log 2>&1 &)
+
 echo "==> Deployment complete!"
@@ -67,4 +67,5 @@ export const getTafsirForVerse = (tafsirId, verseKey) =>
 export const getTafsirForChapter = (tafsirId, chapterNumber) =>
   api.get(`/tafsirs/${tafsirId}/`, { params: { chapter_number: chapterNumber } }).then((r) => r.data);
 
-export const AUDIO_BASE = 'https://verses.quran.com/';
+// Recitation files go through the backend's caching audio proxy (it mirrors https://verses.quran.com/)
+export const AUDIO_BASE = `${API_BASE}/audio/`;